@@ -0,0 +1,75 @@
+"""Benchmark fill-mode processing: crop-before-resize vs. the old resize-then-crop path.
+
+Usage:
+    python benchmarks/bench_fill_crop.py [--size 7000x5000] [--target 1920x1080] [--scale 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.image_processor import ImageProcessor
+
+def make_test_image(width, height):
+    """Create a deterministic RGB test image with gradients and edges"""
+    img = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (img, img.rotate(90).resize((width, height)), img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, width, max(1, width // 40)):
+        draw.line([(i, 0), (width - i, height)], fill=(255, 255, 255), width=3)
+    return img
+
+def resize_then_crop(processor, img, scale_factor, target_resolution):
+    """The previous pipeline: resample the whole image, then crop the centre"""
+    new_size = (int(img.size[0] * scale_factor), int(img.size[1] * scale_factor))
+    resized = img.resize(new_size, Image.Resampling.LANCZOS)
+    crop_box = processor.calculate_crop_box(img, target_resolution[0], target_resolution[1], scale_factor)
+    return resized.crop(crop_box)
+
+def time_call(func, repeat):
+    """Return the best wall time over several runs and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(7000, 5000))
+    parser.add_argument('--target', type=parse_size, default=(1920, 1080))
+    parser.add_argument('--scale', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = ImageProcessor()
+    img = make_test_image(*args.size)
+
+    old_time, old_img = time_call(
+        lambda: resize_then_crop(processor, img, args.scale, args.target), args.repeat)
+    new_time, new_img = time_call(
+        lambda: processor.process_image(img, args.scale, target_resolution=args.target, fill_mode=True),
+        args.repeat)
+
+    diff = ImageChops.difference(old_img, new_img)
+    max_diff = max(high for _, high in diff.getextrema())
+    mean_diff = sum(ImageStat.Stat(diff).mean) / len(diff.getbands())
+
+    print(f"source {args.size[0]}x{args.size[1]}, scale {args.scale}, target {args.target[0]}x{args.target[1]}")
+    print(f"resize-then-crop: {old_time * 1000:8.1f} ms")
+    print(f"crop-then-resize: {new_time * 1000:8.1f} ms  ({old_time / new_time:.1f}x faster)")
+    print(f"pixel difference: max {max_diff}, mean {mean_diff:.4f}")
+
+if __name__ == "__main__":
+    main()
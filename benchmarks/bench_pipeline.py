@@ -0,0 +1,275 @@
+"""Benchmark the conversion pipeline stage by stage on the synthetic TIFF corpus.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--scale 1.0] [--large] [--only NAME ...] [--output results.json]
+    python benchmarks/bench_pipeline.py --baseline old.json [--threshold 10]
+    python benchmarks/bench_pipeline.py --compare old.json new.json [--threshold 10]
+
+Writes the corpus from tiff_corpus.py and times each stage on every case:
+decode (open and load every page), estimate (estimate_png_size_range), preview
+(create_preview_with_crop), crop (one crop box move: process_crop_preview on
+a resolution pyramid, best of --repeat once the pyramid levels exist),
+process (process_image), save (save_image) and
+convert (batch_engine.convert_file end to end, streaming pages above the
+threshold). Every stage runs in a fresh process, so its peak RSS is not
+inflated by earlier stages; the peak includes the decoded input. Reports
+the best time over --repeat runs, throughput in megapixels per second, peak
+RSS and output size, and can write them as JSON. Comparing two result files
+flags every stage that got slower than --threshold percent and exits with
+status 1 if any did.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import PIL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.batch_engine import convert_file, get_save_kwargs
+from core.image_processor import DEFAULT_RESAMPLE_METHOD, ImageProcessor
+from core.quantization import DEFAULT_QUANTIZE_METHOD
+from core.preview_pyramid import ImagePyramid
+from core.streaming import open_image
+from tiff_corpus import get_cases, write_case
+
+STAGES = ("decode", "estimate", "preview", "crop", "process", "save", "convert")
+RESULTS_VERSION = 1
+# Changes smaller than this many seconds are timer noise, whatever the percentage
+NOISE_SECONDS = 0.005
+
+DEFAULT_SETTINGS = {
+    'scale_factor': 0.5,
+    'target_resolution': None,
+    'fill_mode': False,
+    'optimize': True,
+    'color_mode': "auto",
+    'dither_method': None,
+    'tone_mapping': "auto",
+    'window': None,
+    'quantize_method': DEFAULT_QUANTIZE_METHOD,
+    'palette_scope': "file",
+    'filter_method': "auto",
+    'resample_method': DEFAULT_RESAMPLE_METHOD,
+    'interlace': False,
+    'chunk_optimize': False,
+    'compression_preset': "smallest"
+}
+ESTIMATE_KEYS = ('target_resolution', 'fill_mode', 'color_mode', 'dither_method', 'interlace', 'filter_method',
+                 'compression_preset', 'tone_mapping', 'window', 'quantize_method', 'resample_method')
+
+def time_call(func, repeat):
+    """Return the best wall time over several runs and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MB, or None where it cannot be read"""
+    # Linux keeps ru_maxrss across exec, so a spawned child would report the parent's peak;
+    # VmHWM belongs to the new address space
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def load_pages(path):
+    """Decode every page of a TIFF and return the megapixels decoded"""
+    pixels = 0
+    with open_image(path) as img:
+        for page_index in range(getattr(img, 'n_frames', 1)):
+            img.seek(page_index)
+            img.load()
+            pixels += img.size[0] * img.size[1]
+    return pixels / 1e6
+
+def load_first_page(path):
+    with open_image(path) as img:
+        img.load()
+        return img.copy()
+
+def run_stage(path, stage, settings, repeat, work_folder):
+    """Time one stage on one corpus file; runs in its own process"""
+    processor = ImageProcessor()
+    output_bytes = None
+    if stage == "decode":
+        seconds, megapixels = time_call(lambda: load_pages(path), repeat)
+    elif stage == "convert":
+        output_path = os.path.join(work_folder, f"{stage}-{os.getpid()}.png")
+        seconds, result = time_call(lambda: convert_file(path, output_path, settings), repeat)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        output_bytes = result['bytes']
+        with open_image(path) as img:
+            megapixels = img.size[0] * img.size[1] * getattr(img, 'n_frames', 1) / 1e6
+    else:
+        img = load_first_page(path)
+        megapixels = img.size[0] * img.size[1] / 1e6
+        if stage == "estimate":
+            kwargs = {key: settings[key] for key in ESTIMATE_KEYS}
+            seconds, estimate = time_call(lambda: processor.estimate_png_size_range(
+                img, settings['optimize'], settings['scale_factor'], **kwargs), repeat)
+            output_bytes = estimate['estimate']
+        elif stage == "preview":
+            crop_box = (img.size[0] // 4, img.size[1] // 4, img.size[0] * 3 // 4, img.size[1] * 3 // 4)
+            seconds, _ = time_call(lambda: processor.create_preview_with_crop(img, crop_box), repeat)
+        elif stage == "crop":
+            pyramid = ImagePyramid(img)
+            crop_box = (img.size[0] / 4, img.size[1] / 4, img.size[0] * 3 / 4, img.size[1] * 3 / 4)
+            seconds, _ = time_call(lambda: processor.process_crop_preview(pyramid, crop_box, **settings), repeat)
+        elif stage == "process":
+            seconds, _ = time_call(lambda: processor.process_image(img, **settings), repeat)
+        else:
+            processed = processor.process_image(img, **settings)
+            del img
+            megapixels = processed.size[0] * processed.size[1] / 1e6
+            output_path = os.path.join(work_folder, f"{stage}-{os.getpid()}.png")
+            seconds, stats = time_call(
+                lambda: processor.save_image(processed, output_path, **get_save_kwargs(settings)), repeat)
+            output_bytes = stats['bytes']
+    return {
+        'seconds': seconds,
+        'megapixels': megapixels,
+        'mp_per_s': megapixels / seconds if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes
+    }
+
+def run_benchmarks(args, settings):
+    """Write the corpus and time every stage of every case; returns the result rows"""
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        for case in get_cases(args.large, args.only):
+            path = write_case(folder, case, args.scale)
+            with open_image(path) as img:
+                size = img.size
+            for stage in args.stages:
+                # A fresh process per stage, so each peak RSS is the stage's own
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    try:
+                        row = executor.submit(run_stage, path, stage, settings, args.repeat, folder).result()
+                    except Exception as e:
+                        row = {'error': str(e)}
+                row = dict({'case': case['name'], 'stage': stage, 'mode': case['mode'],
+                            'compression': case['compression'], 'tiled': bool(case['tile']),
+                            'pages': case['pages'], 'size': list(size)}, **row)
+                print_row(row)
+                rows.append(row)
+    return rows
+
+def format_optional(value, fmt, width):
+    return format(value, fmt).rjust(width) if value is not None else "-".rjust(width)
+
+def print_row(row):
+    if 'error' in row:
+        print(f"{row['case']:20s} {row['stage']:9s} error: {row['error']}")
+        return
+    print(f"{row['case']:20s} {row['stage']:9s} {row['seconds'] * 1000:9.1f} ms  "
+          f"{format_optional(row['mp_per_s'], '.1f', 7)} MP/s  "
+          f"{format_optional(row['peak_rss_mb'], '.0f', 6)} MB peak  "
+          f"{format_optional(row['output_bytes'], 'd', 10)} bytes")
+
+def compare_results(baseline, current, threshold):
+    """Print stage-by-stage changes between two result files; return the number of slowdowns"""
+    old_rows = {(row['case'], row['stage']): row for row in baseline['results'] if 'error' not in row}
+    slowdowns = 0
+    print(f"{'case':20s} {'stage':9s} {'before':>10s} {'after':>10s} {'change':>8s}  {'size':>8s}  {'peak RSS':>8s}")
+    for row in current['results']:
+        old = old_rows.get((row['case'], row['stage']))
+        if old is None or 'error' in row:
+            continue
+        change = (row['seconds'] - old['seconds']) / old['seconds'] * 100
+        slower = change > threshold and row['seconds'] - old['seconds'] > NOISE_SECONDS
+        slowdowns += slower
+        size_change = relative_change(old.get('output_bytes'), row.get('output_bytes'))
+        rss_change = relative_change(old.get('peak_rss_mb'), row.get('peak_rss_mb'))
+        print(f"{row['case']:20s} {row['stage']:9s} {old['seconds'] * 1000:8.1f}ms {row['seconds'] * 1000:8.1f}ms "
+              f"{change:+7.1f}%  {size_change:>8s}  {rss_change:>8s}{'  SLOWER' if slower else ''}")
+    for key in ('environment', 'corpus_scale', 'settings'):
+        if baseline.get(key) != current.get(key):
+            print(f"Note: the runs differ in '{key}'; timings may not be comparable")
+    print(f"{slowdowns} stage(s) slower than {threshold:g}%")
+    return slowdowns
+
+def relative_change(old, new):
+    if not old or new is None:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every corpus case's size")
+    parser.add_argument('--large', action='store_true', help="Include the cases above the streaming threshold")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="Benchmark only the named corpus cases")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--output-scale', type=float, default=50, help="Output scale in percent (default: 50)")
+    parser.add_argument('--color-mode', default="auto")
+    parser.add_argument('--compression', default="smallest", choices=["fastest", "balanced", "smallest", "archival"])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare this run against an earlier results file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Compare two results files without running anything")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="Percentage slowdown that is flagged (default: 10)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare_results(baseline, current, args.threshold) else 0)
+
+    settings = dict(DEFAULT_SETTINGS, scale_factor=args.output_scale / 100, color_mode=args.color_mode,
+                    compression_preset=args.compression)
+    results = {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'corpus_scale': args.scale,
+        'repeat': args.repeat,
+        'settings': settings,
+        'results': run_benchmarks(args, settings)
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        sys.exit(1 if compare_results(baseline, results, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark PNG row filter strategies: output size against encode time.
+
+Usage:
+    python benchmarks/bench_png_filters.py [--size 2000x1500] [--compression smallest]
+
+Encodes photo-like RGB, grayscale and palette test images with Pillow's own
+filtering ("auto") and with each filter strategy of png_optimizer.encode_png,
+and reports encode time, throughput and PNG size relative to Pillow.
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.image_processor import ImageProcessor
+from core.png_optimizer import FILTER_STRATEGIES
+
+def make_test_images(width, height):
+    """Create deterministic RGB, L and P test images with fractal detail, gradients and soft edges"""
+    detail = Image.effect_mandelbrot((width, height), (-2, -1.5, 1, 1.5), 100)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    rgb = Image.merge('RGB', (detail, gradient, detail.filter(ImageFilter.GaussianBlur(5))))
+    return {
+        'RGB': rgb,
+        'L': rgb.convert('L'),
+        'P': rgb.quantize(256)
+    }
+
+def time_call(func, repeat):
+    """Return the best wall time over several runs and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(2000, 1500))
+    parser.add_argument('--compression', default="smallest", choices=["fastest", "balanced", "smallest"])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = ImageProcessor()
+    megapixels = args.size[0] * args.size[1] / 1e6
+    print(f"source {args.size[0]}x{args.size[1]}, compression {args.compression}")
+    for mode, img in make_test_images(*args.size).items():
+        print(f"\n{mode}")
+        baseline = None
+        for strategy in FILTER_STRATEGIES:
+            # brute-force is an order of magnitude slower; one run is representative
+            repeat = 1 if strategy == "brute-force" else args.repeat
+            elapsed, png = time_call(
+                lambda: processor.encode(img, True, False, strategy, args.compression), repeat)
+            baseline = baseline or len(png)
+            print(f"{strategy:12s} {elapsed * 1000:9.1f} ms  {megapixels / elapsed:7.2f} MP/s  "
+                  f"{len(png):9d} bytes  ({len(png) / baseline * 100:5.1f}% of auto)")
+
+if __name__ == "__main__":
+    main()
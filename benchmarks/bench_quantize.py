@@ -0,0 +1,73 @@
+"""Benchmark palette (P) conversion: whole-image adaptive convert() vs. sampled palettes.
+
+Usage:
+    python benchmarks/bench_quantize.py [--size 4000x3000] [--dither NONE]
+
+Reports conversion time, optimized PNG size and mean absolute error for the
+old convert("P", palette=ADAPTIVE) and for each available quantization method.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.image_processor import ImageProcessor
+from core.quantization import available_methods
+
+def make_test_image(width, height):
+    """Create a deterministic RGB test image with fractal detail, gradients and soft edges"""
+    detail = Image.effect_mandelbrot((width, height), (-2, -1.5, 1, 1.5), 100)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    return Image.merge('RGB', (detail, gradient, detail.filter(ImageFilter.GaussianBlur(5))))
+
+def time_call(func, repeat):
+    """Return the best wall time over several runs and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def png_size(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    return buffer.tell()
+
+def mean_error(img, source):
+    return ImageStat.Stat(ImageChops.difference(img.convert('RGB'), source).convert('L')).mean[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(4000, 3000))
+    parser.add_argument('--dither', default="NONE", choices=["NONE", "FLOYDSTEINBERG"])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = ImageProcessor()
+    img = make_test_image(*args.size)
+
+    print(f"source {args.size[0]}x{args.size[1]} RGB, dither {args.dither}")
+    old_time, old_img = time_call(
+        lambda: img.convert("P", palette=Image.Palette.ADAPTIVE, colors=256), args.repeat)
+    print(f"{'adaptive convert':18s} {old_time * 1000:8.1f} ms  {png_size(old_img):9d} bytes  "
+          f"error {mean_error(old_img, img):.2f}")
+    for method in available_methods():
+        new_time, new_img = time_call(
+            lambda: processor.convert_color_mode(img, "P", args.dither, quantize_method=method), args.repeat)
+        print(f"{method:18s} {new_time * 1000:8.1f} ms  {png_size(new_img):9d} bytes  "
+              f"error {mean_error(new_img, img):.2f}  ({old_time / new_time:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare PNG size estimates with real save_image output on synthetic images.
+
+Reports the estimate, its confidence band, the actual encoded size and the time
+taken, next to the old width x height x bytes-per-pixel x 0.8 heuristic.
+
+Usage:
+    python benchmarks/bench_size_estimate.py [--size 6000x4000]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.image_processor import ImageProcessor
+
+def make_images(width, height):
+    """Build a small corpus of content types with very different compressibility"""
+    rng = random.Random(1234)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    photo_like = Image.merge('RGB', (
+        gradient,
+        Image.effect_noise((width, height), 40).filter(ImageFilter.GaussianBlur(3)),
+        gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM)))
+
+    document = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(document)
+    for y in range(40, height - 40, 28):
+        x = 40
+        while x < width - 200:
+            word = rng.randint(20, 120)
+            draw.rectangle([x, y, x + word, y + 14], fill=rng.randint(0, 60))
+            x += word + rng.randint(10, 25)
+
+    noisy_scan = Image.merge('RGB', [Image.effect_noise((width, height), 25 + i * 5) for i in range(3)])
+    return {
+        'gradient-L': gradient,
+        'photo-RGB': photo_like,
+        'document-L': document,
+        'noisy-scan-RGB': noisy_scan
+    }
+
+def heuristic_size(img, scale_factor, optimize=True):
+    """The previous estimator, kept here for comparison"""
+    bytes_per_pixel = 4 if img.mode in ('RGBA', 'LA') else 3 if img.mode == 'RGB' else 1
+    raw = int(img.size[0] * scale_factor) * int(img.size[1] * scale_factor) * bytes_per_pixel
+    return max(raw * (0.8 if optimize else 1.0), 1024)
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(6000, 4000))
+    parser.add_argument('--scale', type=float, default=1.0)
+    args = parser.parse_args()
+
+    processor = ImageProcessor()
+    fmt = processor.format_size
+    print(f"{'image':<16}{'actual':>12}{'estimate':>12}{'band':>26}{'err':>8}{'time':>10}{'old err':>10}")
+    for name, img in make_images(*args.size).items():
+        for color_mode in ("auto", "P"):
+            start = time.perf_counter()
+            result = processor.estimate_png_size_range(img, True, args.scale, color_mode=color_mode)
+            elapsed = time.perf_counter() - start
+
+            processed = processor.process_image(img, args.scale, color_mode=color_mode)
+            buffer = io.BytesIO()
+            processed.save(buffer, **processor.get_save_params(True))
+            actual = buffer.tell()
+
+            error = (result['estimate'] - actual) / actual * 100
+            old_error = (heuristic_size(img, args.scale) - actual) / actual * 100
+            band = f"{fmt(result['low'])} - {fmt(result['high'])}"
+            label = f"{name}/{color_mode}"
+            print(f"{label:<16}{fmt(actual):>12}{fmt(result['estimate']):>12}{band:>26}"
+                  f"{error:>7.1f}%{elapsed * 1000:>8.1f}ms{old_error:>9.0f}%")
+
+if __name__ == "__main__":
+    main()
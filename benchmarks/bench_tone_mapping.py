@@ -0,0 +1,78 @@
+"""Benchmark 16-bit and float tone mapping against a plain Pillow convert().
+
+Usage:
+    python benchmarks/bench_tone_mapping.py [--size 6000x4000] [--bits 12]
+
+Times the clipping convert('L') the converter used before, the windowed
+conversion on whichever backend is available (NumPy when installed), the
+Pillow point() fallback, and the automatic percentile window. Also reports
+how many gray levels survive each conversion.
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core import tone_mapping
+
+def make_test_image(width, height, bits):
+    """Create a deterministic I;16 image using the low bits of the 16-bit range, like camera data"""
+    # Resampling the float gradient keeps fractional values, so every level of the bit depth occurs
+    ramp = Image.linear_gradient('L').convert('F').resize((width, height), Image.Resampling.BILINEAR)
+    scale = ((1 << bits) - 1) / 255
+    return ramp.point(lambda v: v * scale).convert('I').convert('I;16')
+
+def time_call(func, repeat):
+    """Return the best wall time over several runs and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def gray_levels(img):
+    return sum(1 for count in img.histogram() if count)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=parse_size, default=(6000, 4000))
+    parser.add_argument('--bits', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    img = make_test_image(args.size[0], args.size[1], args.bits)
+    img.load()
+    megapixels = img.size[0] * img.size[1] / 1e6
+    backend = "numpy" if tone_mapping.np is not None else "pillow"
+
+    window_time, window = time_call(lambda: tone_mapping.compute_window(img), args.repeat)
+    convert_time, converted = time_call(lambda: img.convert('L'), args.repeat)
+    mapped_time, mapped = time_call(lambda: tone_mapping.apply_window(img, window), args.repeat)
+    pillow_time, _ = time_call(lambda: tone_mapping._apply_window_pillow(img, window[0], 255 / (window[1] - window[0]), 8),
+                               args.repeat)
+    wide_time, wide = time_call(lambda: tone_mapping.apply_window(img, window, 16), args.repeat)
+
+    print(f"source {args.size[0]}x{args.size[1]} I;16, {args.bits}-bit data, backend {backend}")
+    print(f"auto window:           {window_time * 1000:8.1f} ms  -> {window[0]:.1f} to {window[1]:.1f}")
+    print(f"convert('L') (clips):  {convert_time * 1000:8.1f} ms  {megapixels / convert_time:7.1f} MP/s  "
+          f"{gray_levels(converted)} gray levels")
+    print(f"window -> L ({backend}):  {mapped_time * 1000:8.1f} ms  {megapixels / mapped_time:7.1f} MP/s  "
+          f"{gray_levels(mapped)} gray levels")
+    if backend != "pillow":
+        print(f"window -> L (pillow):  {pillow_time * 1000:8.1f} ms  {megapixels / pillow_time:7.1f} MP/s")
+    print(f"window -> I;16:        {wide_time * 1000:8.1f} ms  {megapixels / wide_time:7.1f} MP/s  "
+          f"range {wide.getextrema()}")
+
+if __name__ == "__main__":
+    main()
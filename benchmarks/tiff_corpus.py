@@ -0,0 +1,164 @@
+"""Deterministic synthetic TIFF corpus for the pipeline benchmarks.
+
+Usage:
+    python benchmarks/tiff_corpus.py OUTPUT_FOLDER [--scale 1.0] [--large] [--only NAME ...]
+
+Each case fixes a mode (and with it the bit depth), a compression, a strip or
+tile layout, a page count and a size. Pages are built from Pillow's fractal
+and gradient generators plus seeded noise, so the same case always produces
+the same pixels. Pillow writes striped files; tiled files are written
+here, since Pillow cannot write tiles.
+"""
+import argparse
+import os
+import random
+import struct
+import zlib
+
+from PIL import Image, ImageFilter
+
+# name, mode, compression, tile size (None for strips), pages, size
+CASES = [
+    ("rgb-raw", "RGB", "raw", None, 1, (3000, 2000)),
+    ("rgb-deflate", "RGB", "tiff_deflate", None, 1, (3000, 2000)),
+    ("rgb-lzw", "RGB", "tiff_lzw", None, 1, (3000, 2000)),
+    ("rgb-jpeg", "RGB", "jpeg", None, 1, (3000, 2000)),
+    ("rgba-deflate", "RGBA", "tiff_deflate", None, 1, (2000, 1500)),
+    ("l-packbits", "L", "packbits", None, 1, (3000, 2000)),
+    ("bilevel-group4", "1", "group4", None, 1, (5000, 3500)),
+    ("p-deflate", "P", "tiff_deflate", None, 1, (3000, 2000)),
+    ("l16-deflate", "I;16", "tiff_deflate", None, 1, (3000, 2000)),
+    ("i32-raw", "I", "raw", None, 1, (2000, 1500)),
+    ("f32-raw", "F", "raw", None, 1, (2000, 1500)),
+    ("rgb-raw-tiled", "RGB", "raw", (256, 256), 1, (3000, 2000)),
+    ("l16-deflate-tiled", "I;16", "tiff_deflate", (256, 256), 1, (3000, 2000)),
+    ("rgb-deflate-4pages", "RGB", "tiff_deflate", None, 4, (2000, 1500)),
+]
+
+# Above the default streaming threshold, so they go through the band-by-band path
+LARGE_CASES = [
+    ("rgb-raw-large", "RGB", "raw", None, 1, (12000, 9000)),
+    ("l-deflate-large", "L", "tiff_deflate", None, 1, (14000, 10000)),
+]
+
+# TIFF tag values for the tiled writer: mode -> (photometric, bits per sample, samples, sample format)
+_TILED_LAYOUTS = {
+    "L": (1, 8, 1, 1),
+    "RGB": (2, 8, 3, 1),
+    "I;16": (1, 16, 1, 1),
+}
+_TIFF_COMPRESSION = {"raw": 1, "tiff_deflate": 8}
+
+def get_cases(large=False, only=None):
+    """Return the corpus cases as dicts, optionally with the large cases or only the named ones"""
+    cases = CASES + (LARGE_CASES if large else [])
+    keys = ('name', 'mode', 'compression', 'tile', 'pages', 'size')
+    cases = [dict(zip(keys, case)) for case in cases]
+    if only:
+        cases = [case for case in cases if case['name'] in only]
+    return cases
+
+def scale_size(size, scale):
+    return max(16, int(size[0] * scale)), max(16, int(size[1] * scale))
+
+def make_page(mode, size, seed=0):
+    """Create a deterministic page in mode with fractal detail, gradients and sensor-like noise"""
+    width, height = size
+    # Each page looks at a different part of the fractal
+    left = -2 + 0.1 * seed
+    detail = Image.effect_mandelbrot((width, height), (left, -1.5, left + 3, 1.5), 100)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    # effect_noise is not seeded, so the noise comes from a seeded generator
+    noise = Image.frombytes('L', size, random.Random(seed).randbytes(width * height))
+    if mode == "1":
+        return detail.point(lambda v: 255 if v > 128 else 0).convert('1', dither=Image.Dither.NONE)
+    if mode in ("I;16", "I", "F"):
+        # 12-bit camera-like data in the low bits of the range
+        ramp = Image.blend(gradient, detail, 0.5).convert('F').resize((width, height), Image.Resampling.BILINEAR)
+        img = ramp.point(lambda v: v * 4095 / 255)
+        return img if mode == "F" else img.convert('I').convert(mode) if mode == "I;16" else img.convert('I')
+    rgb = Image.merge('RGB', (detail, gradient, Image.blend(detail.filter(ImageFilter.GaussianBlur(5)), noise, 0.1)))
+    if mode == "RGBA":
+        return Image.merge('RGBA', rgb.split() + (gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT),))
+    if mode == "P":
+        return rgb.quantize(256)
+    return rgb.convert(mode)
+
+def write_tiled_tiff(path, img, tile_size, compression="raw"):
+    """Write a single-page little-endian tiled TIFF (L, RGB or I;16; raw or Deflate)"""
+    photometric, bits, samples, sample_format = _TILED_LAYOUTS[img.mode]
+    tile_width, tile_height = tile_size
+    across = -(-img.size[0] // tile_width)
+    down = -(-img.size[1] // tile_height)
+    rawmode = 'I;16' if img.mode == "I;16" else img.mode
+    tiles = []
+    for row in range(down):
+        for col in range(across):
+            # Edge tiles are padded to the full tile size
+            tile = Image.new(img.mode, tile_size)
+            tile.paste(img.crop((col * tile_width, row * tile_height,
+                                 (col + 1) * tile_width, (row + 1) * tile_height)), (0, 0))
+            data = tile.tobytes('raw', rawmode)
+            tiles.append(zlib.compress(data, 6) if compression == "tiff_deflate" else data)
+
+    entries = [
+        (256, 4, [img.size[0]]), (257, 4, [img.size[1]]), (258, 3, [bits] * samples),
+        (259, 3, [_TIFF_COMPRESSION[compression]]), (262, 3, [photometric]), (277, 3, [samples]),
+        (284, 3, [1]), (322, 3, [tile_width]), (323, 3, [tile_height]),
+        (324, 4, None), (325, 4, [len(tile) for tile in tiles]), (339, 3, [sample_format] * samples),
+    ]
+    ifd_size = 2 + 12 * len(entries) + 4
+    # Values that do not fit in an entry are stored after the IFD, then the tiles follow
+    extra_offset = 8 + ifd_size
+    extra_sizes = [(4 if field_type == 4 else 2) * (len(tiles) if tag == 324 else len(values))
+                   for tag, field_type, values in entries]
+    extra_total = sum(size for size in extra_sizes if size > 4)
+    tile_offset = extra_offset + extra_total
+    offsets = []
+    for tile in tiles:
+        offsets.append(tile_offset)
+        tile_offset += len(tile)
+
+    ifd = struct.pack('<H', len(entries))
+    extra = b''
+    for (tag, field_type, values), size in zip(entries, extra_sizes):
+        values = offsets if tag == 324 else values
+        packed = struct.pack(f"<{len(values)}{'I' if field_type == 4 else 'H'}", *values)
+        if size > 4:
+            ifd += struct.pack('<HHII', tag, field_type, len(values), extra_offset + len(extra))
+            extra += packed
+        else:
+            ifd += struct.pack('<HHI', tag, field_type, len(values)) + packed.ljust(4, b'\0')
+    ifd += struct.pack('<I', 0)
+    with open(path, 'wb') as f:
+        f.write(b'II*\0' + struct.pack('<I', 8) + ifd + extra)
+        for tile in tiles:
+            f.write(tile)
+
+def write_case(folder, case, scale=1.0):
+    """Write one corpus case to folder and return its path"""
+    path = os.path.join(folder, f"{case['name']}.tif")
+    size = scale_size(case['size'], scale)
+    pages = [make_page(case['mode'], size, seed) for seed in range(case['pages'])]
+    if case['tile']:
+        write_tiled_tiff(path, pages[0], case['tile'], case['compression'])
+    else:
+        pages[0].save(path, compression=case['compression'], save_all=len(pages) > 1, append_images=pages[1:])
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output_folder')
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every case's size (default: 1.0)")
+    parser.add_argument('--large', action='store_true', help="Also write the cases above the streaming threshold")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="Write only the named cases")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_folder, exist_ok=True)
+    for case in get_cases(args.large, args.only):
+        path = write_case(args.output_folder, case, args.scale)
+        print(f"{case['name']:20s} {case['mode']:5s} {case['compression']:13s} "
+              f"{'tiled' if case['tile'] else 'strips':6s} {case['pages']} page(s)  {os.path.getsize(path):11d} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Headless command-line entry point for bulk TIFF to PNG conversion.
+
+Usage (from the src directory, or with src on PYTHONPATH):
+    python -m cli INPUT [INPUT ...] -o OUTPUT_FOLDER [options]
+
+This module never imports tkinter, so it can run on display-less servers.
+"""
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+from core.image_processor import DEFAULT_RESAMPLE_METHOD, RESAMPLE_METHODS, ImageProcessor
+from core.batch_engine import BatchConverter, default_worker_count, get_mirrored_output_folder
+from core.streaming import DEFAULT_MEMORY_BUDGET_MB, DEFAULT_STREAMING_THRESHOLD_MP
+from core.file_scanner import TIFF_EXTENSIONS, iter_tiff_files
+from core.manifest import BatchManifest, settings_fingerprint
+from core.metrics import METRICS_FORMATS, MetricsWriter
+from core.png_optimizer import FILTER_STRATEGIES
+from core.quantization import DEFAULT_QUANTIZE_METHOD, available_methods
+from core.tone_mapping import TONE_MAPPING_MODES, window_is_valid
+
+def parse_resolution(value):
+    """Parse a WIDTHxHEIGHT string into a (width, height) tuple"""
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid resolution '{value}', expected WIDTHxHEIGHT")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"invalid resolution '{value}', dimensions must be positive")
+    return (width, height)
+
+def parse_window(value):
+    """Parse a LOW:HIGH string into a (low, high) window"""
+    try:
+        window = tuple(float(part) for part in value.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid window '{value}', expected LOW:HIGH")
+    if not window_is_valid(window):
+        raise argparse.ArgumentTypeError(f"invalid window '{value}', LOW must be less than HIGH")
+    return window
+
+def build_parser(standard_resolutions, compression_presets):
+    """Build the argument parser for the CLI"""
+    presets = [name for name, res in standard_resolutions.items() if res]
+    parser = argparse.ArgumentParser(
+        prog="tiff2png",
+        description="Convert TIFF images to PNG without starting the GUI."
+    )
+    parser.add_argument('inputs', nargs='+',
+                        help="TIFF files, glob patterns or directories to convert")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Output folder (created if missing)")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="Also convert TIFFs in subfolders of input directories; "
+                             "the output folder mirrors the input subfolders")
+    parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                        help="Only convert files in input directories matching this glob "
+                             "(matched against the relative path and the file name; repeatable)")
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                        help="Skip files and folders in input directories matching this glob (repeatable)")
+    parser.add_argument('--root-name',
+                        help="Name outputs {root}_{i:02d}.png like batch mode "
+                             "(default: keep each input's file name)")
+    parser.add_argument('--scale', type=float, default=100,
+                        help="Resolution scale in percent, 10-100 (default: 100)")
+    res_group = parser.add_mutually_exclusive_group()
+    res_group.add_argument('--preset', choices=presets,
+                           help="Standard resolution preset")
+    res_group.add_argument('--resolution', type=parse_resolution,
+                           help="Manual output resolution as WIDTHxHEIGHT")
+    parser.add_argument('--fill', action='store_true',
+                        help="Fill mode: crop to the exact target resolution")
+    parser.add_argument('--color-mode', default="auto",
+                        choices=["auto", "RGB", "RGBA", "L", "I;16", "P"],
+                        help="Output color mode (default: auto)")
+    parser.add_argument('--dither', default="auto",
+                        choices=["auto", "NONE", "FLOYDSTEINBERG"],
+                        help="Dithering method for palette conversion (default: auto)")
+    parser.add_argument('--tone-mapping', default="auto", choices=list(TONE_MAPPING_MODES),
+                        help="How 16-bit, 32-bit and float images map to the output range: auto keeps "
+                             "16-bit data and otherwise stretches the 0.5-99.5 percentiles, window uses "
+                             "--window, none clips (default: auto)")
+    parser.add_argument('--window', type=parse_window, metavar='LOW:HIGH',
+                        help="Input values mapped to black and white; implies --tone-mapping window")
+    parser.add_argument('--quantize', dest='quantize_method', default=DEFAULT_QUANTIZE_METHOD,
+                        choices=list(available_methods()),
+                        help=f"How palette (P) output builds its colors (default: {DEFAULT_QUANTIZE_METHOD})")
+    parser.add_argument('--shared-palette', action='store_true',
+                        help="P mode: build one palette from a sample of all inputs and use it for every file")
+    parser.add_argument('--filter', dest='filter_method', default="auto",
+                        choices=list(FILTER_STRATEGIES),
+                        help="PNG row filter strategy; auto leaves it to Pillow (default: auto)")
+    parser.add_argument('--resample', dest='resample_method', default=DEFAULT_RESAMPLE_METHOD,
+                        choices=list(RESAMPLE_METHODS),
+                        help=f"Resampling kernel used when scaling (default: {DEFAULT_RESAMPLE_METHOD})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Skip files the output folder's manifest shows were already "
+                             "converted with the same settings and have not changed")
+    parser.add_argument('--no-optimize', dest='optimize', action='store_false',
+                        help="Disable PNG optimization")
+    parser.add_argument('--interlace', action='store_true',
+                        help="Write interlaced PNGs")
+    parser.add_argument('--optimize-chunks', dest='chunk_optimize', action='store_true',
+                        help="Post-process each PNG: strip ancillary chunks, merge IDAT chunks and "
+                             "keep the best of several row filter strategies (slower)")
+    parser.add_argument('--compression', dest='compression_preset', default="smallest",
+                        choices=list(compression_presets),
+                        help="Compression preset (default: smallest)")
+    parser.add_argument('-j', '--workers', type=int, default=default_worker_count(),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET_MB, metavar='MB',
+                        help="Approximate peak memory per worker when streaming very large images "
+                             f"(default: {DEFAULT_MEMORY_BUDGET_MB})")
+    parser.add_argument('--stream-threshold', type=int, default=DEFAULT_STREAMING_THRESHOLD_MP, metavar='MP',
+                        help="Convert pages larger than this many megapixels band by band "
+                             f"(default: {DEFAULT_STREAMING_THRESHOLD_MP})")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="Time each pipeline stage and write one record per file to FILE "
+                             "(.csv or .jsonl) as files complete")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Log every converted file")
+    return parser
+
+def iter_input_files(inputs, recursive=False, include=None, exclude=None, skip_dirs=()):
+    """Expand files, glob patterns and directories into (path, input_root) pairs as they are found.
+
+    input_root is the directory input a file was found under (None otherwise),
+    so its subfolder can be mirrored in the output. Duplicates, including the
+    same file reached through another path or a symlink, are skipped.
+    """
+    seen = set()
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            found = ((Path(p), path) for p in iter_tiff_files(path, recursive, include, exclude, skip_dirs))
+        elif glob.has_magic(entry):
+            found = ((Path(p), None) for p in glob.iglob(entry, recursive=True)
+                     if p.lower().endswith(TIFF_EXTENSIONS))
+        else:
+            found = [(path, None)]
+        for file_path, input_root in found:
+            key = os.path.normcase(os.path.realpath(file_path))
+            if key not in seen:
+                seen.add(key)
+                yield file_path, input_root
+
+def collect_input_files(inputs, recursive=False, include=None, exclude=None, skip_dirs=()):
+    """Return a sorted list of (path, input_root) pairs for the given inputs"""
+    return sorted(iter_input_files(inputs, recursive, include, exclude, skip_dirs), key=lambda item: item[0])
+
+def get_conversion_settings(args, standard_resolutions):
+    """Build a settings dict matching TIFFtoPNGConverter.get_conversion_settings"""
+    if args.resolution:
+        target_resolution = args.resolution
+    elif args.preset:
+        target_resolution = standard_resolutions[args.preset]
+    else:
+        target_resolution = None
+    return {
+        'scale_factor': args.scale / 100,
+        'target_resolution': target_resolution,
+        'fill_mode': args.fill,
+        'optimize': args.optimize,
+        'color_mode': args.color_mode,
+        'dither_method': args.dither,
+        'tone_mapping': "window" if args.window else args.tone_mapping,
+        'window': args.window,
+        'quantize_method': args.quantize_method,
+        'palette_scope': "batch" if args.shared_palette else "file",
+        'filter_method': args.filter_method,
+        'resample_method': args.resample_method,
+        'interlace': args.interlace,
+        'chunk_optimize': args.chunk_optimize,
+        'compression_preset': args.compression_preset
+    }
+
+def iter_jobs(input_files, output_folder, root_name=None, manifest=None, collisions=None):
+    """Pair (path, input_root) items with output paths using batch or per-file naming.
+
+    With a manifest, batch-named files keep the output path they were given
+    before and new files are numbered around the names already taken.
+    Per-file names collide when two inputs share a stem (scan.tif and
+    scan.tiff); the later input is not converted and (path, output path,
+    earlier path) is appended to collisions instead.
+    """
+    taken = manifest.output_paths() if manifest and root_name else set()
+    claimed = {}  # per-file output path -> input path
+    index = 0
+    for file_path, input_root in input_files:
+        recorded = manifest.get_output_path(file_path) if manifest and root_name else None
+        if recorded:
+            yield file_path, Path(recorded)
+            continue
+        folder = Path(output_folder)
+        if input_root is not None:
+            folder = get_mirrored_output_folder(output_folder, file_path, input_root)
+        if not root_name:
+            output_path = folder / f"{file_path.stem}.png"
+            key = os.path.normcase(os.path.abspath(output_path))
+            if key in claimed:
+                if collisions is not None:
+                    collisions.append((file_path, output_path, claimed[key]))
+                continue
+            claimed[key] = file_path
+            yield file_path, output_path
+            continue
+        while True:
+            index += 1
+            output_path = folder / f"{root_name}_{index:02d}.png"
+            if os.path.normcase(os.path.abspath(output_path)) not in taken:
+                break
+        yield file_path, output_path
+
+def main(argv=None):
+    """Run the CLI and return the process exit code"""
+    image_processor = ImageProcessor()
+    parser = build_parser(image_processor.standard_resolutions, image_processor.compression_presets)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger('TIFFtoPNG')
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    if not 10 <= args.scale <= 100:
+        parser.error("--scale must be between 10 and 100")
+    if args.metrics and not args.metrics.lower().endswith(METRICS_FORMATS):
+        parser.error(f"--metrics must end in {' or '.join(METRICS_FORMATS)}")
+
+    scan_options = {'recursive': args.recursive, 'include': args.include, 'exclude': args.exclude,
+                    'skip_dirs': [args.output]}
+    shared_palette = args.shared_palette and args.color_mode == "P"
+    if args.root_name or shared_palette:
+        # Numbered names and the shared palette need the complete, sorted list up front
+        input_files = collect_input_files(args.inputs, **scan_options)
+        if not input_files:
+            logger.error("No TIFF files found")
+            return 2
+        logger.info(f"Found {len(input_files)} TIFF files")
+    else:
+        # Per-file names let conversion start while directories are still being scanned
+        input_files = iter_input_files(args.inputs, **scan_options)
+
+    settings = get_conversion_settings(args, image_processor.standard_resolutions)
+    os.makedirs(args.output, exist_ok=True)
+
+    # Content hashes let --incremental skip touched but unchanged files; other runs skip the extra read
+    converter = BatchConverter(max_workers=args.workers, hash_inputs=args.incremental,
+                               memory_budget_mb=args.memory_budget, streaming_threshold_mp=args.stream_threshold,
+                               collect_metrics=bool(args.metrics))
+    if shared_palette:
+        logger.info("Building shared palette")
+        settings['palette'] = converter.build_shared_palette([path for path, _ in input_files], settings)
+    manifest = BatchManifest(args.output)
+    fingerprint = settings_fingerprint(settings)
+    collisions = []
+    jobs = iter_jobs(input_files, args.output, args.root_name, manifest, collisions)
+    if args.incremental:
+        jobs = manifest.pending_jobs(jobs, fingerprint)
+    logger.info(f"Starting conversion with {converter.max_workers} worker(s)")
+    logger.debug(f"Conversion settings: {settings}")
+
+    successful = 0
+    failed = 0
+    total_bytes = 0
+    total_saved = 0
+    total_seconds = 0.0
+    metrics_writer = MetricsWriter(args.metrics) if args.metrics else None
+    try:
+        for result in converter.convert(jobs, settings):
+            if metrics_writer:
+                metrics_writer.write(result['metrics'])
+            total_bytes += result['bytes']
+            total_saved += result['bytes_saved']
+            total_seconds += result['seconds']
+            if result['success']:
+                successful += 1
+                manifest.record(result, fingerprint)
+                pages = f", {result['pages']} pages" if result['pages'] > 1 else ""
+                if result['streamed_pages']:
+                    pages += ", streamed"
+                if result['bytes_saved']:
+                    pages += f", {image_processor.format_size(result['bytes_saved'])} saved by chunk optimization"
+                logger.debug(f"Successfully converted: {result['input_path']} -> {result['output_path']} "
+                             f"({image_processor.format_size(result['bytes'])}{pages}, "
+                             f"saved in {result['seconds']:.2f}s)")
+            else:
+                failed += 1
+                logger.error(f"Failed to convert {result['input_path']}: {result['error']}")
+            for warning in result['warnings']:
+                logger.warning(f"{result['input_path']}: {warning}")
+    finally:
+        if metrics_writer:
+            metrics_writer.close()
+            logger.info(f"Stage timings written to {args.metrics}")
+
+    for file_path, output_path, earlier_path in collisions:
+        logger.error(f"Not converted {file_path}: {output_path} is already written from {earlier_path} "
+                     "(use --root-name for numbered names)")
+    failed += len(collisions)
+
+    if manifest.skipped:
+        logger.info(f"{manifest.skipped} up-to-date files skipped")
+    if not successful and not failed and not manifest.skipped:
+        logger.error("No TIFF files found")
+        return 2
+    if successful:
+        logger.info(f"'{args.compression_preset}' preset: {image_processor.format_size(total_bytes)} written, "
+                    f"{total_seconds:.2f}s total save time")
+        if total_saved:
+            logger.info(f"Chunk optimization saved {image_processor.format_size(total_saved)}")
+    if failed:
+        logger.warning(f"Conversion completed with {failed} failures: {successful} files converted")
+        return 1
+    logger.info(f"Conversion completed successfully: {successful} files converted")
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,302 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+import os
+from PIL import Image
+
+from core.image_processor import ImageProcessor
+from core.job_queue import JobCancelled
+from core.manifest import hash_file
+from core.metrics import StageTimer
+from core.quantization import DEFAULT_QUANTIZE_METHOD, build_palette
+from core.streaming import (DEFAULT_MEMORY_BUDGET_MB, DEFAULT_STREAMING_THRESHOLD_MP, StripReader,
+                            fits_in_memory, get_unstreamed_settings, open_image, read_reduced, sample_band,
+                            should_stream, stream_convert)
+
+def default_worker_count():
+    """Return the default number of worker processes for batch conversion"""
+    return os.cpu_count() or 1
+
+def get_save_kwargs(settings):
+    """Extract the save_image keyword arguments from conversion settings"""
+    return {
+        'optimize': settings.get('optimize', True),
+        'interlace': settings.get('interlace', False),
+        'filter_method': settings.get('filter_method', 'auto'),
+        'compression_preset': settings.get('compression_preset', 'smallest'),
+        'chunk_optimize': settings.get('chunk_optimize', False)
+    }
+
+def get_page_output_path(output_path, page_index):
+    """Return the output path for one page of a multi-page TIFF ({stem}_p01.png, ...)"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_p{page_index+1:02d}{output_path.suffix}")
+
+def get_mirrored_output_folder(output_folder, input_path, input_root):
+    """Return the output folder for input_path that mirrors its subfolder under input_root"""
+    relative = os.path.relpath(os.path.dirname(os.path.abspath(input_path)), os.path.abspath(input_root))
+    if relative == os.curdir or relative.startswith(os.pardir):
+        return Path(output_folder)
+    return Path(output_folder) / relative
+
+def sample_page(processor, img, input_path, page_index, settings,
+                streaming_threshold_mp=DEFAULT_STREAMING_THRESHOLD_MP, max_side=512):
+    """Return a small RGB copy of the current page for building a palette.
+
+    Pages above the streaming threshold are sampled band by band; None is
+    returned if such a page cannot be read in bands.
+    """
+    if should_stream(img, streaming_threshold_mp):
+        reader = StripReader.open(input_path, page_index)
+        if reader is None:
+            return None
+        sample = read_reduced(reader, sample_band, max_side)
+    else:
+        scale = min(1.0, max_side / max(img.size))
+        sample = img.resize((max(1, int(img.size[0] * scale)), max(1, int(img.size[1] * scale))),
+                            Image.Resampling.NEAREST)
+    return processor.convert_color_mode(sample, "RGB", tone_mapping=settings.get('tone_mapping', 'auto'),
+                                        window=settings.get('window'))
+
+def build_document_palette(processor, img, input_path, settings,
+                           streaming_threshold_mp=DEFAULT_STREAMING_THRESHOLD_MP):
+    """Build one palette from every page of a multi-page file, or return None"""
+    samples = []
+    for page_index in range(getattr(img, 'n_frames', 1)):
+        img.seek(page_index)
+        sample = sample_page(processor, img, input_path, page_index, settings, streaming_threshold_mp)
+        if sample is not None:
+            samples.append(sample)
+    if not samples:
+        return None
+    return build_palette(samples, method=settings.get('quantize_method', DEFAULT_QUANTIZE_METHOD))
+
+def convert_file(input_path, output_path, settings, hash_input=False,
+                 memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, streaming_threshold_mp=DEFAULT_STREAMING_THRESHOLD_MP,
+                 collect_metrics=False):
+    """Convert a single file and return a result dict (runs inside a worker process).
+
+    Multi-page TIFFs are converted one page at a time, writing one PNG per page.
+    A failing page is recorded in 'page_errors' without stopping the others.
+    The source's size and mtime are added for the batch manifest, and with
+    hash_input its content hash too (which reads the whole file once more).
+    Pages above streaming_threshold_mp megapixels are converted band by band
+    within memory_budget_mb when their layout allows.
+    Streamed pages cannot be interlaced, row-filtered by strategy or
+    chunk-optimized, so a page that asks for any of these is decoded whole
+    when it fits the budget; otherwise it is streamed and 'warnings' names
+    the settings that were ignored.
+    Palette output shares one palette across all pages unless settings
+    already carry one (e.g. a batch palette). With collect_metrics, per-stage
+    timings and pixel and byte counts are added as 'metrics' (see core.metrics).
+    """
+    processor = ImageProcessor()
+    if collect_metrics:
+        processor.timer = StageTimer()
+    result = {
+        'input_path': str(input_path),
+        'output_path': str(output_path),
+        'success': False,
+        'error': None,
+        'bytes': 0,
+        'bytes_saved': 0,
+        'seconds': 0.0,
+        'compression_preset': settings.get('compression_preset', 'smallest'),
+        'pages': 0,
+        'output_paths': [],
+        'page_errors': [],
+        'warnings': [],
+        'streamed_pages': 0
+    }
+    try:
+        # Stat before reading so a file modified mid-conversion looks changed next time
+        stat = os.stat(input_path)
+        result['source_size'] = stat.st_size
+        result['source_mtime_ns'] = stat.st_mtime_ns
+        if hash_input:
+            result['content_hash'] = hash_file(input_path)
+        # Mirrored subfolders may not exist yet
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        # Opening reads only the header; oversized pages are checked before decoding
+        with open_image(input_path) as img:
+            page_count = getattr(img, 'n_frames', 1)
+            result['pages'] = page_count
+            if page_count > 1 and settings.get('color_mode') == "P" and settings.get('palette') is None:
+                settings = dict(settings, palette=build_document_palette(processor, img, input_path, settings,
+                                                                         streaming_threshold_mp))
+            for page_index in range(page_count):
+                if page_count == 1:
+                    page_path = output_path
+                else:
+                    page_path = get_page_output_path(output_path, page_index)
+                try:
+                    # Seeking decodes only this page; the previous one is released
+                    img.seek(page_index)
+                    save_stats = None
+                    ignored = []
+                    if should_stream(img, streaming_threshold_mp):
+                        ignored = get_unstreamed_settings(processor, settings)
+                        if not ignored or not fits_in_memory(processor, img, settings, memory_budget_mb):
+                            reader = StripReader.open(input_path, page_index)
+                            if reader:
+                                save_stats = stream_convert(processor, reader, page_path, settings,
+                                                            memory_budget_mb)
+                    if save_stats:
+                        result['streamed_pages'] += 1
+                        if ignored:
+                            page = f"page {page_index+1} " if page_count > 1 else ""
+                            result['warnings'].append(f"{page}streamed in bands to stay within the memory "
+                                                      f"budget, ignoring {', '.join(ignored)}")
+                    else:
+                        with processor.timer.stage("decode"):
+                            img.load()
+                        processed_img = processor.process_image(img, **settings)
+                        save_stats = processor.save_image(processed_img, page_path, **get_save_kwargs(settings))
+                    result['bytes'] += save_stats['bytes']
+                    result['bytes_saved'] += save_stats.get('bytes_saved', 0)
+                    result['seconds'] += save_stats['seconds']
+                    result['output_paths'].append(str(page_path))
+                    processor.timer.add_pixels(img.size[0] * img.size[1], get_output_pixels(processor, img, settings))
+                except Exception as e:
+                    if page_count == 1:
+                        raise
+                    result['page_errors'].append(f"page {page_index+1}: {str(e)}")
+        if result['page_errors']:
+            result['error'] = (f"{len(result['page_errors'])} of {result['pages']} pages failed: "
+                               + "; ".join(result['page_errors']))
+        else:
+            result['success'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    if collect_metrics:
+        result['metrics'] = processor.timer.record(result, result.get('source_size', get_file_size(input_path)))
+    return result
+
+def get_output_pixels(processor, img, settings):
+    width, height = processor.get_output_size(img.size, settings.get('scale_factor', 1.0),
+                                              settings.get('target_resolution'), settings.get('fill_mode', False))
+    return width * height
+
+def get_file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+class BatchConverter:
+    def __init__(self, max_workers=None, hash_inputs=False,
+                 memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, streaming_threshold_mp=DEFAULT_STREAMING_THRESHOLD_MP,
+                 collect_metrics=False):
+        self.max_workers = max(1, int(max_workers or default_worker_count()))
+        self.hash_inputs = hash_inputs
+        self.collect_metrics = collect_metrics
+        self.memory_budget_mb = memory_budget_mb
+        self.streaming_threshold_mp = streaming_threshold_mp
+
+    def get_file_options(self):
+        """Return the convert_file keyword arguments for this converter"""
+        return {
+            'hash_input': self.hash_inputs,
+            'memory_budget_mb': self.memory_budget_mb,
+            'streaming_threshold_mp': self.streaming_threshold_mp,
+            'collect_metrics': self.collect_metrics
+        }
+
+    def build_shared_palette(self, input_paths, settings, sample_files=16):
+        """Build one palette for a batch from the first pages of up to sample_files files.
+
+        The files are spread evenly over input_paths. Files that cannot be read
+        are left out; they fail again, with an error, when converted.
+        """
+        input_paths = list(input_paths)
+        step = max(1.0, len(input_paths) / sample_files)
+        processor = ImageProcessor()
+        samples = []
+        for index in range(min(sample_files, len(input_paths))):
+            input_path = input_paths[int(index * step)]
+            try:
+                with open_image(input_path) as img:
+                    sample = sample_page(processor, img, input_path, 0, settings, self.streaming_threshold_mp)
+            except Exception:
+                continue
+            if sample is not None:
+                samples.append(sample)
+        if not samples:
+            return None
+        return build_palette(samples, method=settings.get('quantize_method', DEFAULT_QUANTIZE_METHOD))
+
+    def build_jobs(self, input_files, output_folder, root_name, input_root=None, manifest=None):
+        """Pair each input file with its deterministic output path.
+
+        With input_root, files in subfolders of it are written to the matching
+        subfolders of output_folder. With a BatchManifest, files converted
+        before keep their recorded output path and new files are numbered
+        around the names already taken, so adding files never renames or
+        overwrites earlier outputs.
+        """
+        jobs = []
+        taken = manifest.output_paths() if manifest else set()
+        index = 0
+        for file_path in input_files:
+            recorded = manifest.get_output_path(file_path) if manifest else None
+            if recorded:
+                jobs.append((Path(file_path), Path(recorded)))
+                continue
+            folder = Path(output_folder)
+            if input_root:
+                folder = get_mirrored_output_folder(output_folder, file_path, input_root)
+            while True:
+                index += 1
+                output_path = folder / f"{root_name}_{index:02d}.png"
+                if os.path.normcase(os.path.abspath(output_path)) not in taken:
+                    break
+            jobs.append((Path(file_path), output_path))
+        return jobs
+
+    def convert(self, jobs, settings, control=None):
+        """Convert (input_path, output_path) jobs, yielding each result as it completes.
+
+        jobs may be a list or any iterable, e.g. a generator fed by a directory
+        scan; jobs are pulled from it only as workers become free.
+        If a JobControl is given, no new files are started while it is paused and
+        JobCancelled is raised once it is cancelled.
+        """
+        job_count = len(jobs) if hasattr(jobs, '__len__') else None
+        if job_count == 0:
+            return
+        # A single worker runs in-process to avoid pool start-up cost
+        if self.max_workers == 1 or job_count == 1:
+            for input_path, output_path in jobs:
+                if control:
+                    control.checkpoint()
+                yield convert_file(input_path, output_path, settings, **self.get_file_options())
+            return
+
+        workers = min(self.max_workers, job_count or self.max_workers)
+        pending_jobs = iter(jobs)
+        exhausted = False
+        in_flight = set()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                while in_flight or not exhausted:
+                    if control and control.cancelled:
+                        raise JobCancelled()
+                    # Keep a short backlog per worker so pause and cancel take effect quickly
+                    while not exhausted and len(in_flight) < workers * 2 and not (control and control.paused):
+                        job = next(pending_jobs, None)
+                        if job is None:
+                            exhausted = True
+                        else:
+                            in_flight.add(executor.submit(convert_file, job[0], job[1], settings,
+                                                                   **self.get_file_options()))
+                    if not in_flight:
+                        if exhausted:
+                            break
+                        # Paused with nothing running: wait here until resumed or cancelled
+                        control.checkpoint()
+                        continue
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
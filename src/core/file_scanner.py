@@ -0,0 +1,50 @@
+from fnmatch import fnmatchcase
+import os
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+def split_patterns(text):
+    """Split a ';'-separated pattern string such as '*scan*;raw/*' into a list"""
+    return [pattern.strip() for pattern in (text or '').split(';') if pattern.strip()]
+
+def matches_any(relative_path, patterns):
+    """Return True if relative_path or its file name matches one of the glob patterns.
+
+    Matching is case-insensitive and uses '/' as the separator on every platform.
+    """
+    relative_path = relative_path.lower()
+    name = relative_path.rsplit('/', 1)[-1]
+    for pattern in patterns:
+        pattern = pattern.lower().replace('\\', '/')
+        if fnmatchcase(name, pattern) or fnmatchcase(relative_path, pattern):
+            return True
+    return False
+
+def iter_tiff_files(folder, recursive=False, include=None, exclude=None, skip_dirs=()):
+    """Yield the paths of TIFF files under folder as the directories are read.
+
+    The tree is walked once with os.scandir, so callers can show the first
+    files of a huge folder without waiting for the whole listing. Extensions
+    match case-insensitively (.tif, .TIF, .Tiff, ...). include and exclude are
+    glob patterns tested against each path relative to folder and against its
+    file name; an excluded folder is not descended into. Folders in skip_dirs
+    (e.g. the output folder) and symlinked folders are never walked.
+    """
+    skip = {os.path.normcase(os.path.abspath(path)) for path in skip_dirs}
+    pending = [(os.fspath(folder), '')]
+    while pending:
+        directory, prefix = pending.pop()
+        subdirectories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative_path = prefix + entry.name
+                if exclude and matches_any(relative_path, exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.normcase(os.path.abspath(entry.path)) not in skip:
+                        subdirectories.append((entry.path, relative_path + '/'))
+                elif entry.name.lower().endswith(TIFF_EXTENSIONS) and entry.is_file():
+                    if not include or matches_any(relative_path, include):
+                        yield entry.path
+        # Visit subfolders in name order, depth first
+        pending.extend(sorted(subdirectories, reverse=True))
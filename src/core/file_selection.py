@@ -0,0 +1,35 @@
+from itertools import compress
+
+class FileSelection:
+    """Checked/unchecked state for a batch, one byte per file index.
+
+    A bytearray keeps 100k files at ~100 KB, where one tk.BooleanVar per file
+    would cost a Tcl variable each and make select-all walk every one of them.
+    """
+    def __init__(self, count=0, selected=True):
+        self._flags = bytearray([1 if selected else 0]) * count
+
+    def __len__(self):
+        return len(self._flags)
+
+    def __getitem__(self, index):
+        return bool(self._flags[index])
+
+    def __setitem__(self, index, selected):
+        self._flags[index] = 1 if selected else 0
+
+    def extend(self, count, selected=True):
+        """Add count new files to the end of the selection"""
+        self._flags.extend(bytes([1 if selected else 0]) * count)
+
+    def set_all(self, selected):
+        """Select or deselect every file"""
+        self._flags[:] = bytes([1 if selected else 0]) * len(self._flags)
+
+    def count(self):
+        """Return the number of selected files"""
+        return len(self._flags) - self._flags.count(0)
+
+    def filter(self, items):
+        """Return the items whose index is selected"""
+        return list(compress(items, self._flags))
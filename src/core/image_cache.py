@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import os
+import threading
+
+from core.streaming import open_image
+
+# Bytes per band for modes whose samples are wider than 8 bits
+WIDE_MODE_BYTES = {
+    'I': 4,
+    'F': 4,
+    'I;16': 2,
+    'I;16L': 2,
+    'I;16B': 2,
+    'I;16N': 2
+}
+
+def estimate_image_bytes(img):
+    """Estimate the decoded size of an image in memory"""
+    bytes_per_sample = WIDE_MODE_BYTES.get(img.mode, 1)
+    return img.size[0] * img.size[1] * len(img.getbands()) * bytes_per_sample
+
+class ImageCache:
+    """LRU cache of decoded images keyed on path, mtime and file size"""
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (image, size in bytes)
+        self._lock = threading.Lock()
+
+    def make_key(self, path):
+        """Build the cache key for a file from its resolved path, mtime and size"""
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path, loader=None, variant=None):
+        """Return the decoded image for path, decoding it on a cache miss.
+
+        loader(path), if given, decodes the image instead of a full load (e.g.
+        a reduced copy of an oversized page); variant tells its results apart
+        from full decodes in the cache. Cached images are shared, so callers
+        must not modify them in place.
+        """
+        key = self.make_key(path) + ((variant,) if variant is not None else ())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Decode outside the lock so other readers are not blocked
+        if loader:
+            img = loader(path)
+        else:
+            # The caller decides what is too large to decode (see streaming.should_stream)
+            img = open_image(path)
+            img.load()
+        self.put(key, img)
+        return img
+
+    def put(self, key, img):
+        """Store a decoded image and evict least recently used entries over budget"""
+        size = estimate_image_bytes(img)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            # Drop stale entries for the same path (file was modified); other variants of
+            # the same file version stay
+            for stale_key in [k for k in self._entries if k[0] == key[0] and k[:3] != key[:3]]:
+                self.current_bytes -= self._entries.pop(stale_key)[1]
+            self._entries[key] = (img, size)
+            self.current_bytes += size
+            # Always keep the newest entry, even if it exceeds the budget on its own
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        """Remove all cached images"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return a dict of cache statistics"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
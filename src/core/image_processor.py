@@ -1,9 +1,31 @@
 from PIL import Image, ImageDraw
 import os
+import io
 import math
+import random
+import time
+import zlib
+from core.metrics import NULL_TIMER
+from core.png_optimizer import DEFAULT_TIME_BUDGET, FILTER_STRATEGIES, encode_png, optimize_png
+from core.quantization import DEFAULT_QUANTIZE_METHOD, apply_palette, build_palette
+from core.tone_mapping import apply_window, compute_window, is_high_bit_depth, to_16bit, window_is_valid
+
+RESAMPLE_METHODS = ("NEAREST", "BOX", "BILINEAR", "HAMMING", "BICUBIC", "LANCZOS")
+DEFAULT_RESAMPLE_METHOD = "LANCZOS"
+
+# Size estimate: the number of bands to leave time for within the time budget, the sample
+# its own palette is built from for palette output and how far that palette can move the
+# size, and the bytes of a band's size that are rounding and deflate bookkeeping
+MIN_ESTIMATE_BANDS = 8
+ESTIMATE_PALETTE_PIXELS = 16 * 1024
+ESTIMATED_PALETTE_SPREAD = 0.4
+ESTIMATE_BAND_BYTES_BELOW = 16
+ESTIMATE_BAND_BYTES_ABOVE = 2
 
 class ImageProcessor:
     def __init__(self):
+        # Replaced by a metrics.StageTimer while a conversion is being timed
+        self.timer = NULL_TIMER
         self.standard_resolutions = {
             "Custom": None,
             "4K (3840x2160)": (3840, 2160),
@@ -13,6 +35,14 @@ class ImageProcessor:
             "SVGA (800x600)": (800, 600),
             "VGA (640x480)": (640, 480)
         }
+        # Compression presets: zlib level, Pillow optimize flag and zlib strategies to try
+        self.compression_presets = {
+            "fastest": {'compress_level': 1, 'optimize': False, 'strategies': (zlib.Z_RLE,)},
+            "balanced": {'compress_level': 6, 'optimize': False, 'strategies': (zlib.Z_FILTERED,)},
+            "smallest": {'compress_level': 9, 'optimize': True, 'strategies': (zlib.Z_FILTERED,)},
+            "archival": {'compress_level': 9, 'optimize': True,
+                         'strategies': (zlib.Z_FILTERED, zlib.Z_DEFAULT_STRATEGY, zlib.Z_RLE)}
+        }
 
     def format_size(self, size_bytes):
         """Convert size in bytes to human readable format"""
@@ -24,31 +54,154 @@ class ImageProcessor:
         s = round(size_bytes / p, 2)
         return f"{s} {size_name[i]}"
 
-    def estimate_png_size(self, img, optimize, scale_factor=1.0):
-        """Estimate PNG file size based on image properties and compression settings"""
-        # Calculate scaled dimensions
-        width, height = img.size
-        scaled_width = int(width * scale_factor)
-        scaled_height = int(height * scale_factor)
-        
-        # Base estimation on scaled dimensions and color depth
-        if img.mode in ('RGBA', 'LA'):
-            bytes_per_pixel = 4
-        elif img.mode == 'RGB':
-            bytes_per_pixel = 3
-        else:
-            bytes_per_pixel = 1
-        
-        # Calculate raw size with scaling
-        raw_size = scaled_width * scaled_height * bytes_per_pixel
-        
-        # Apply optimization factor
-        if optimize:
-            estimated_size = raw_size * 0.8  # 20% reduction with optimization
-        else:
-            estimated_size = raw_size
-        
-        return max(estimated_size, 1024)  # Minimum 1KB
+    def estimate_png_size(self, img, optimize, scale_factor=1.0, **settings):
+        """Estimate PNG file size based on image content and compression settings"""
+        return self.estimate_png_size_range(img, optimize, scale_factor, **settings)['estimate']
+
+    def estimate_png_size_range(self, img, optimize, scale_factor=1.0, target_resolution=None,
+                                fill_mode=False, color_mode="auto", dither_method=None,
+                                interlace=False, filter_method="auto", compression_preset="smallest",
+                                tone_mapping="auto", window=None, quantize_method=DEFAULT_QUANTIZE_METHOD,
+                                palette=None, resample_method=DEFAULT_RESAMPLE_METHOD,
+                                sample_pixels=256 * 1024,
+                                band_rows=8, time_budget=0.05):
+        """Estimate PNG file size by compressing sampled row bands of the output.
+
+        Bands of full output rows spread down the image are resampled from the
+        source, converted to the output color mode and encoded with the real save
+        parameters. Each band is encoded after the same number of rows above it
+        and only the bytes it adds are counted, so it is measured with the row
+        costs and compression context it has inside the whole image. The mean
+        compressed bytes per pixel is extrapolated to the full output. Bands are
+        visited in shuffled order and sampling stops once time_budget (seconds) is
+        spent. Returns a dict with 'estimate', 'low' and 'high' (an approximate 95%
+        band) in bytes.
+        """
+        out_width, out_height = self.get_output_size(img.size, scale_factor, target_resolution, fill_mode)
+        # Bands must share the source's window, not pick their own from local contrast
+        window = self.get_tone_window(img, color_mode, tone_mapping, window)
+        tone_mapping = "window" if window else "none"
+        encode_args = (optimize, interlace, filter_method, compression_preset)
+        resample = Image.Resampling[resample_method]
+        out_pixels = out_width * out_height
+
+        # Map output coordinates back to the source image
+        scaled_width = max(1, int(img.size[0] * scale_factor))
+        scaled_height = max(1, int(img.size[1] * scale_factor))
+        offset_x, offset_y = 0, 0
+        if target_resolution and fill_mode:
+            offset_x, offset_y = self.calculate_crop_box(img, out_width, out_height, scale_factor)[:2]
+        ratio_x = img.size[0] / scaled_width
+        ratio_y = img.size[1] / scaled_height
+
+        def resample_region(left, top, right, bottom):
+            size = (right - left, bottom - top)
+            box = ((left + offset_x) * ratio_x, (top + offset_y) * ratio_y,
+                   (right + offset_x) * ratio_x, (bottom + offset_y) * ratio_y)
+            if scale_factor == 1.0:
+                return img.crop(tuple(int(v) for v in box))
+            if box[0] >= 0 and box[1] >= 0 and box[2] <= img.size[0] and box[3] <= img.size[1]:
+                # Same resampling as process_image so edge and gray-level statistics match
+                return img.resize(size, resample, box=box)
+            return img.crop(tuple(int(v) for v in box)).resize(size, resample)
+
+        start = time.perf_counter()
+        # Palette output uses one palette for the whole image, so build it up front instead of
+        # letting every band pick its own colors. It comes from short pieces of output rows at
+        # random positions (evenly spaced rows can all land between the lines of a text page)
+        # and is much smaller than the conversion's sample, since median cut time grows with
+        # the sample.
+        estimated_palette = color_mode == "P" and palette is None
+        if estimated_palette:
+            side = math.isqrt(ESTIMATE_PALETTE_PIXELS)
+            piece_width = min(side, out_width)
+            rng = random.Random(0)
+            pieces = []
+            for _ in range(side):
+                x, y = rng.randrange(out_width - piece_width + 1), rng.randrange(out_height)
+                piece = resample_region(x, y, x + piece_width, y + 1)
+                pieces.append(apply_window(piece, window) if window else piece)
+            palette = build_palette(pieces, method=quantize_method, sample_pixels=ESTIMATE_PALETTE_PIXELS)
+        # Median cut on a small sample picks a somewhat different palette than the conversion
+        palette_spread = ESTIMATED_PALETTE_SPREAD if estimated_palette else 0
+
+        # Small outputs are cheap enough to encode exactly
+        if out_pixels <= sample_pixels:
+            processed = self.process_image(img, scale_factor, target_resolution, fill_mode,
+                                           color_mode, dither_method, tone_mapping=tone_mapping,
+                                           window=window, quantize_method=quantize_method, palette=palette,
+                                           resample_method=resample_method)
+            size = len(self.encode(processed, *encode_args))
+            return {'estimate': size, 'low': int(size * (1 - palette_spread)),
+                    'high': int(size * (1 + palette_spread))}
+
+        def convert(rows_img):
+            return self.convert_color_mode(rows_img, color_mode, dither_method, tone_mapping, window,
+                                           quantize_method, palette)
+
+        rows = min(band_rows, max(1, out_height // 2))
+        band_count = max(1, min(out_height // (rows * 2), sample_pixels // (out_width * rows)))
+        positions = [rows + int((out_height - rows * 2) * (index + 0.5) / band_count) for index in range(band_count)]
+        random.Random(0).shuffle(positions)
+
+        # Time one row first (zlib level 9 can crawl on smooth noise) and make the bands only
+        # as high as leaves time for about MIN_ESTIMATE_BANDS of them
+        probe = convert(resample_region(0, positions[0], out_width, positions[0] + 1))
+        # Fixed PNG structure (signature, IHDR, palette, IEND) is paid once, not per band
+        overhead = len(self.encode(probe.crop((0, 0, 1, 1)), *encode_args))
+        probe_start = time.perf_counter()
+        self.encode(probe, *encode_args)
+        seconds_per_row = time.perf_counter() - probe_start
+        remaining = time_budget - (time.perf_counter() - start)
+        height = max(1, min(rows, int(remaining / MIN_ESTIMATE_BANDS / 3 / seconds_per_row)))
+
+        samples = []
+        for y in positions:
+            if len(samples) >= 2 and time.perf_counter() - start > time_budget:
+                break
+            # Encode the rows above the band, then both, and count only the bytes the band adds
+            band = convert(resample_region(0, y - height, out_width, y + height))
+            context = len(self.encode(band.crop((0, 0, out_width, height)), *encode_args))
+            samples.append(max(0, len(self.encode(band, *encode_args)) - context) / (out_width * height))
+
+        mean = sum(samples) / len(samples)
+        variance = sum((sample - mean) ** 2 for sample in samples) / max(1, len(samples) - 1)
+        std_error = math.sqrt(variance / len(samples))
+        # Widen the band by 10% for what a few rows of context cannot show the encoder
+        spread = 1.96 * std_error + (0.1 + palette_spread) * mean
+        # A band's size is whole bytes and includes a few bytes of deflate bookkeeping that very
+        # compressible content (flat areas, bilevel palettes) spreads over far more rows in the
+        # whole image, so the band reaches further down than up
+        band_pixels = out_width * height
+        return {
+            'estimate': int(mean * out_pixels + overhead),
+            'low': int(max(0, mean - spread - ESTIMATE_BAND_BYTES_BELOW / band_pixels) * out_pixels + overhead),
+            'high': int((mean + spread + ESTIMATE_BAND_BYTES_ABOVE / band_pixels) * out_pixels + overhead)
+        }
+
+    def encode(self, img, optimize=True, interlace=False, filter_method="auto", compression_preset="smallest",
+               strategy=None):
+        """Return the image encoded as PNG bytes.
+
+        A filter_method other than "auto" filters the rows with that PNG filter
+        strategy (see png_optimizer.encode_png). Interlaced images, and modes
+        encode_png cannot pack, fall back to Pillow's own filter choice.
+        """
+        save_params = self.get_save_params(optimize, interlace, filter_method, compression_preset, strategy)
+        if filter_method in FILTER_STRATEGIES and filter_method != "auto" and not interlace:
+            png = encode_png(img, filter_method, save_params['compress_level'], save_params['compress_type'],
+                             save_params['optimize'])
+            if png is not None:
+                return png
+        buffer = io.BytesIO()
+        img.save(buffer, **save_params)
+        return buffer.getvalue()
+
+    def get_output_size(self, img_size, scale_factor, target_resolution=None, fill_mode=False):
+        """Return the output dimensions for the given settings"""
+        if target_resolution and fill_mode:
+            return tuple(target_resolution)
+        return (int(img_size[0] * scale_factor), int(img_size[1] * scale_factor))
 
     def calculate_crop_box(self, img, target_width, target_height, scale_factor):
         """Calculate crop box for fill mode"""
@@ -63,6 +216,19 @@ class ImageProcessor:
         
         return (left, top, right, bottom)
 
+    def calculate_source_box(self, source_size, scaled_size, crop_box):
+        """Map a crop box in scaled coordinates back to source image coordinates.
+
+        Returns None if the crop box extends past the scaled image bounds.
+        """
+        left, top, right, bottom = crop_box
+        scaled_width, scaled_height = scaled_size
+        if left < 0 or top < 0 or right > scaled_width or bottom > scaled_height:
+            return None
+        x_ratio = source_size[0] / scaled_width
+        y_ratio = source_size[1] / scaled_height
+        return (left * x_ratio, top * y_ratio, right * x_ratio, bottom * y_ratio)
+
     def create_preview_with_crop(self, img, crop_box=None, preview_size=(400, 400)):
         """Create a preview image with optional crop box overlay"""
         try:
@@ -87,7 +253,8 @@ class ImageProcessor:
                 right = int(right * scale_factor)
                 bottom = int(bottom * scale_factor)
                 
-                # Draw the crop box
+                # Draw the crop box; palette and grayscale images have no red to draw with
+                preview_img = preview_img.convert('RGBA')
                 draw = ImageDraw.Draw(preview_img)
                 draw.rectangle([left, top, right, bottom], outline='red', width=2)
                 
@@ -97,7 +264,7 @@ class ImageProcessor:
                 # Draw overlay everywhere except the crop box
                 draw.rectangle([0, 0, preview_img.size[0], preview_img.size[1]], fill=(0, 0, 0, 128))
                 draw.rectangle([left, top, right, bottom], fill=(0, 0, 0, 0))
-                preview_img = Image.alpha_composite(preview_img.convert('RGBA'), overlay)
+                preview_img = Image.alpha_composite(preview_img, overlay)
             
             return preview_img
             
@@ -106,56 +273,240 @@ class ImageProcessor:
 
     def process_image(self, img, scale_factor, target_resolution=None, fill_mode=False,
                      color_mode="auto", dither_method=None, optimize=True, interlace=False,
-                     filter_method="auto"):
+                     filter_method="auto", compression_preset="smallest", tone_mapping="auto", window=None,
+                     quantize_method=DEFAULT_QUANTIZE_METHOD, palette=None, palette_scope="file",
+                     chunk_optimize=False, resample_method=DEFAULT_RESAMPLE_METHOD):
         """Process an image according to the specified settings"""
         try:
+            resample = Image.Resampling[resample_method]
             # Calculate new dimensions
             new_width = int(img.size[0] * scale_factor)
             new_height = int(img.size[1] * scale_factor)
             
-            # Resize image if scaling is needed
-            if scale_factor != 1.0:
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Apply cropping if fill mode is enabled and a target resolution is specified
             if target_resolution and fill_mode:
+                # Work out the crop in scaled coordinates, then resample only that region
                 target_width, target_height = target_resolution
                 crop_box = self.calculate_crop_box(img, target_width, target_height, scale_factor)
-                img = img.crop(crop_box)
+                source_box = self.calculate_source_box(img.size, (new_width, new_height), crop_box)
+                with self.timer.stage("resize"):
+                    if scale_factor == 1.0:
+                        img = img.crop(crop_box)
+                    elif source_box:
+                        img = img.resize((target_width, target_height), resample,
+                                         box=source_box)
+                    else:
+                        # Crop extends past the image edges: resize fully and let crop pad
+                        img = img.resize((new_width, new_height), resample)
+                        img = img.crop(crop_box)
+            elif scale_factor != 1.0:
+                # Resize image if scaling is needed
+                with self.timer.stage("resize"):
+                    img = img.resize((new_width, new_height), resample)
             
             # Apply color mode conversion if needed
-            if color_mode != "auto":
-                if color_mode == "P":
-                    # Convert to palette mode with dithering
-                    img = img.convert("P", 
-                                    palette=Image.Palette.ADAPTIVE,
-                                    colors=256,
-                                    dither=dither_method)
-                else:
-                    img = img.convert(color_mode)
+            with self.timer.stage("convert"):
+                img = self.convert_color_mode(img, color_mode, dither_method, tone_mapping, window,
+                                              quantize_method, palette)
             
             return img
             
         except Exception as e:
             raise Exception(f"Error processing image: {str(e)}")
 
-    def save_image(self, img, output_path, optimize=True, interlace=False, filter_method="auto"):
-        """Save an image with the specified settings"""
+    def convert_color_mode(self, img, color_mode="auto", dither_method=None, tone_mapping="auto", window=None,
+                           quantize_method=DEFAULT_QUANTIZE_METHOD, palette=None):
+        """Convert an image to the requested output color mode.
+
+        16-bit, 32-bit and float images are window/level scaled first (see
+        get_tone_window) instead of being clipped by Pillow's convert().
+        Palette output maps onto palette (a flat RGB list) when one is given,
+        such as a palette shared by a document or batch; otherwise one is
+        built from a sample of the image with quantize_method.
+        """
+        window = self.get_tone_window(img, color_mode, tone_mapping, window)
+        if window:
+            keep_16bit = color_mode in ("auto", "I;16")
+            img = apply_window(img, window, 16 if keep_16bit else 8)
+            if keep_16bit or color_mode == "L":
+                return img
+        if color_mode == "auto":
+            return img
+        if color_mode == "I;16":
+            if img.mode == "I;16":
+                return img
+            if is_high_bit_depth(img.mode):
+                return img.convert("I").convert("I;16")
+            return to_16bit(img)
+        if color_mode == "P":
+            if palette is None:
+                palette = build_palette([img], method=quantize_method)
+            return apply_palette(img, palette, dither_method)
+        return img.convert(color_mode)
+
+    def get_tone_window(self, img, color_mode="auto", tone_mapping="auto", window=None, sample=None):
+        """Return the (low, high) window to scale a high bit depth image by, or None.
+
+        "auto" keeps 16-bit data as it is when the output stays 16-bit and
+        otherwise takes the window from percentiles of the image; "window" uses
+        the given window; "none" leaves Pillow's clipping conversion in place.
+        sample, if given, is called for the image to take the percentiles from
+        instead (img then only needs a mode).
+        """
+        if tone_mapping == "none" or not is_high_bit_depth(img.mode):
+            return None
+        if tone_mapping == "window" and window_is_valid(window):
+            return tuple(window)
+        if img.mode.startswith("I;16") and color_mode in ("auto", "I;16"):
+            return None
+        return compute_window(sample() if sample else img)
+
+    def get_proxy_factor(self, img_size, scale_factor, target_resolution=None, fill_mode=False,
+                         preview_size=(400, 400), oversample=2):
+        """Return the factor by which the output can shrink and still cover the preview box"""
+        if target_resolution and fill_mode:
+            out_width, out_height = target_resolution
+        else:
+            out_width = int(img_size[0] * scale_factor)
+            out_height = int(img_size[1] * scale_factor)
+        if out_width <= 0 or out_height <= 0:
+            return 1.0
+        return min(1.0,
+                   preview_size[0] * oversample / out_width,
+                   preview_size[1] * oversample / out_height)
+
+    def create_proxy(self, img, scale_factor, target_resolution=None, fill_mode=False, factor=1.0,
+                     resample_method=DEFAULT_RESAMPLE_METHOD):
+        """Create a downsampled proxy of the scaled output, shrunk by factor.
+
+        In fill mode only the crop region is resampled when it lies inside the image.
+        Pillow reduces in integer steps first (reducing_gap) so this stays cheap.
+        """
+        if target_resolution and fill_mode:
+            new_size = (int(img.size[0] * scale_factor), int(img.size[1] * scale_factor))
+            crop_box = self.calculate_crop_box(img, target_resolution[0], target_resolution[1], scale_factor)
+            source_box = self.calculate_source_box(img.size, new_size, crop_box)
+            if source_box:
+                proxy_size = self.get_proxy_target(target_resolution, factor)
+                return img.resize(proxy_size, Image.Resampling[resample_method], box=source_box, reducing_gap=2.0)
+        proxy_width = max(1, int(img.size[0] * scale_factor * factor))
+        proxy_height = max(1, int(img.size[1] * scale_factor * factor))
+        return img.resize((proxy_width, proxy_height), Image.Resampling[resample_method], reducing_gap=2.0)
+
+    def get_proxy_target(self, target_resolution, factor):
+        """Shrink a target resolution by the proxy factor"""
+        return (max(1, round(target_resolution[0] * factor)),
+                max(1, round(target_resolution[1] * factor)))
+
+    def process_preview(self, img, scale_factor, target_resolution=None, fill_mode=False,
+                        preview_size=(400, 400), proxy=None, **settings):
+        """Run the processing pipeline on a proxy sized for the preview box.
+
+        The proxy is the scaled output shrunk to about twice the preview size, so
+        the scale factor becomes 1.0 and the target resolution shrinks to match.
+        A precomputed proxy (from create_proxy) can be passed in to skip resampling.
+        """
+        factor = self.get_proxy_factor(img.size, scale_factor, target_resolution, fill_mode, preview_size)
+        if factor >= 1.0:
+            return self.process_image(img, scale_factor, target_resolution, fill_mode, **settings)
+        if proxy is None:
+            proxy = self.create_proxy(img, scale_factor, target_resolution, fill_mode, factor,
+                                      settings.get('resample_method', DEFAULT_RESAMPLE_METHOD))
+        if target_resolution and fill_mode:
+            target_resolution = self.get_proxy_target(target_resolution, factor)
+        return self.process_image(proxy, 1.0, target_resolution, fill_mode, **settings)
+
+    def process_crop_preview(self, pyramid, crop_box, scale_factor, target_resolution=None, fill_mode=False,
+                             preview_size=(400, 400), **settings):
+        """Run the processing pipeline on crop_box of a source, rendered at preview size.
+
+        crop_box is in source coordinates and may be fractional. In fill mode
+        it maps onto the target resolution, otherwise it is scaled by
+        scale_factor. The region is resampled from the coarsest level of
+        pyramid (a preview_pyramid.ImagePyramid) that covers the preview size,
+        then color converted like the full output.
+        """
+        left, top, right, bottom = crop_box
+        if target_resolution and fill_mode:
+            out_width, out_height = target_resolution
+        else:
+            out_width = (right - left) * scale_factor
+            out_height = (bottom - top) * scale_factor
+        factor = min(1.0, preview_size[0] / out_width, preview_size[1] / out_height)
+        size = (max(1, round(out_width * factor)), max(1, round(out_height * factor)))
+        region = pyramid.render_region(crop_box, size, settings.get('resample_method', DEFAULT_RESAMPLE_METHOD))
+        return self.process_image(region, 1.0, **settings)
+
+    def get_save_params(self, optimize=True, interlace=False, filter_method="auto",
+                        compression_preset="smallest", strategy=None):
+        """Build the Pillow PNG save parameters for the given settings.
+
+        The Optimize setting can only switch optimization off; the preset decides
+        whether it is used. strategy overrides the preset's first zlib strategy.
+        Pillow has no filter parameter; encode() applies filter_method itself.
+        """
+        preset = self.compression_presets[compression_preset]
+        save_params = {
+            'format': 'PNG',
+            'optimize': optimize and preset['optimize'],
+            'compress_level': preset['compress_level'],
+            'compress_type': preset['strategies'][0] if strategy is None else strategy,
+            'interlace': interlace
+        }
+        return save_params
+
+    def save_image(self, img, output_path, optimize=True, interlace=False, filter_method="auto",
+                   compression_preset="smallest", chunk_optimize=False, chunk_time_budget=DEFAULT_TIME_BUDGET):
+        """Save an image with the specified settings.
+
+        The PNG is written to a temporary file next to output_path and renamed
+        into place, so an interrupted save never leaves a truncated file under
+        the final name. With chunk_optimize the encoded PNG is post-processed by
+        optimize_png within chunk_time_budget seconds. Returns a dict with the
+        preset used, bytes written, bytes saved by the post-pass and seconds taken.
+        """
+        temp_path = f"{output_path}.{os.getpid()}.tmp"
         try:
-            # Prepare save parameters
-            save_params = {
-                'format': 'PNG',
-                'optimize': optimize,
-                'compress_level': 9,  # Always use maximum compression
-                'interlace': interlace
-            }
-            
-            # Add filter method if specified
-            if filter_method != "auto":
-                save_params['filter'] = filter_method
+            start = time.perf_counter()
+            preset = self.compression_presets[compression_preset]
+            strategies = preset['strategies']
+            bytes_saved = 0
+            timer = self.timer
+            with open(temp_path, 'wb') as f:
+                # Pillow can write straight to the file, except when encode and write are timed apart
+                if (len(strategies) == 1 and not chunk_optimize and filter_method not in FILTER_STRATEGIES[1:]
+                        and not timer.enabled):
+                    save_params = self.get_save_params(optimize, interlace, filter_method, compression_preset)
+                    img.save(f, **save_params)
+                    f.flush()
+                    os.fsync(f.fileno())
+                else:
+                    # Encode with each zlib strategy in memory and keep the smallest result
+                    best = None
+                    with timer.stage("encode"):
+                        for strategy in strategies:
+                            png = self.encode(img, optimize, interlace, filter_method, compression_preset, strategy)
+                            if best is None or len(png) < len(best[0]):
+                                best = (png, strategy)
+                    png = best[0]
+                    if chunk_optimize:
+                        with timer.stage("optimize"):
+                            png, optimize_stats = optimize_png(png, preset['compress_level'], best[1],
+                                                               chunk_time_budget)
+                        bytes_saved = optimize_stats['bytes_before'] - optimize_stats['bytes_after']
+                    with timer.stage("write"):
+                        f.write(png)
+                        f.flush()
+                        os.fsync(f.fileno())
+            os.replace(temp_path, output_path)
             
-            # Save the image
-            img.save(output_path, **save_params)
+            return {
+                'compression_preset': compression_preset,
+                'bytes': os.path.getsize(output_path),
+                'bytes_saved': bytes_saved,
+                'seconds': time.perf_counter() - start
+            }
             
         except Exception as e:
-            raise Exception(f"Error saving image: {str(e)}") 
\ No newline at end of file
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise Exception(f"Error saving image: {str(e)}")
@@ -0,0 +1,127 @@
+import queue
+import threading
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled"""
+
+class JobControl:
+    """Cancel and pause flags shared between a running job and the UI"""
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        """Request cancellation (also releases a paused job so it can stop)"""
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        """Pause the job at its next checkpoint"""
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        """Resume a paused job"""
+        self._running.set()
+
+    def checkpoint(self):
+        """Block while paused and raise JobCancelled if the job was cancelled"""
+        self._running.wait()
+        if self.cancelled:
+            raise JobCancelled()
+
+class Job:
+    def __init__(self, func, args, kwargs, on_done=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.control = JobControl()
+
+class JobQueue:
+    """Runs conversion jobs one at a time on a background thread.
+
+    Jobs are called as func(control, *args, **kwargs) and should call
+    control.checkpoint() between units of work. on_done(result, error) is
+    invoked through dispatch, which the UI sets to marshal onto its own thread.
+    """
+    def __init__(self, dispatch=None):
+        self.dispatch = dispatch or (lambda callback: callback())
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._current = None
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, name="ConversionWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, on_done=None, **kwargs):
+        """Queue a job and return its JobControl"""
+        job = Job(func, args, kwargs, on_done)
+        with self._lock:
+            self._pending += 1
+        self._queue.put(job)
+        return job.control
+
+    def is_busy(self):
+        """Return True while a job is running or waiting to run"""
+        with self._lock:
+            return self._pending > 0
+
+    def current_control(self):
+        """Return the JobControl of the running job, or None"""
+        with self._lock:
+            return self._current.control if self._current else None
+
+    def cancel(self):
+        """Cancel the running job and discard queued ones"""
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.control.cancel()
+            self._finish(job, None, JobCancelled())
+        control = self.current_control()
+        if control:
+            control.cancel()
+
+    def pause(self):
+        control = self.current_control()
+        if control:
+            control.pause()
+
+    def resume(self):
+        control = self.current_control()
+        if control:
+            control.resume()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._current = job
+            result = None
+            error = None
+            try:
+                job.control.checkpoint()
+                result = job.func(job.control, *job.args, **job.kwargs)
+            except Exception as e:
+                error = e
+            with self._lock:
+                self._current = None
+            self._finish(job, result, error)
+
+    def _finish(self, job, result, error):
+        with self._lock:
+            self._pending -= 1
+        if job.on_done:
+            self.dispatch(lambda: job.on_done(result, error))
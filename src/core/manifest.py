@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_NAME = '.tiff2png-manifest.jsonl'
+
+def settings_fingerprint(settings):
+    """Return a short stable hash of conversion settings"""
+    encoded = json.dumps(settings, sort_keys=True, default=list)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return a hex digest of the file's contents"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+class BatchManifest:
+    """JSON-lines record of the files converted into an output folder.
+
+    Each successful conversion appends one line with the source path, size,
+    mtime, content hash, settings fingerprint and output paths; a later line
+    for the same source replaces the earlier one. Appending keeps the file
+    valid if a batch is interrupted, and a torn last line is ignored on load.
+    """
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.records = {}  # normalized source path -> record
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        line_count = 0
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    line_count += 1
+                    try:
+                        record = json.loads(line)
+                        self.records[_key(record['source'])] = record
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            return
+        # Rewrite the file once superseded lines dominate it
+        if line_count > 2 * len(self.records) + 100:
+            self._compact()
+
+    def _compact(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in self.records.values():
+                f.write(json.dumps(record) + '\n')
+        os.replace(temp_path, self.path)
+
+    def get_output_path(self, source):
+        """Return the output path recorded for source, or None"""
+        record = self.records.get(_key(source))
+        return record['output'] if record else None
+
+    def output_paths(self):
+        """Return the set of normalized output paths claimed by recorded sources"""
+        return {_key(record['output']) for record in self.records.values()}
+
+    def is_up_to_date(self, source, output_path, fingerprint):
+        """Return True if source was converted to output_path with these settings and has not changed.
+
+        Size and mtime are compared first; the content hash is only computed
+        when they differ, so touched-but-identical files are still skipped.
+        A record made without a hash cannot vouch for a touched file.
+        """
+        record = self.records.get(_key(source))
+        if (not record or record['settings'] != fingerprint
+                or _key(record['output']) != _key(output_path)
+                or not all(os.path.exists(path) for path in record['outputs'])):
+            return False
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return False
+        if stat.st_size == record['size'] and stat.st_mtime_ns == record['mtime_ns']:
+            return True
+        if stat.st_size != record['size'] or not record.get('hash') or hash_file(source) != record['hash']:
+            return False
+        self._append(dict(record, mtime_ns=stat.st_mtime_ns))
+        return True
+
+    def pending_jobs(self, jobs, fingerprint):
+        """Yield the (input_path, output_path) jobs that need converting, counting the rest in skipped"""
+        for input_path, output_path in jobs:
+            if self.is_up_to_date(input_path, output_path, fingerprint):
+                self.skipped += 1
+            else:
+                yield input_path, output_path
+
+    def record(self, result, fingerprint):
+        """Record a successful convert_file result; its content hash is kept if it has one"""
+        self._append({
+            'source': os.path.abspath(result['input_path']),
+            'size': result['source_size'],
+            'mtime_ns': result['source_mtime_ns'],
+            'hash': result.get('content_hash'),
+            'settings': fingerprint,
+            'output': os.path.abspath(result['output_path']),
+            'outputs': [os.path.abspath(path) for path in result['output_paths']]
+        })
+
+    def _append(self, record):
+        with self._lock:
+            self.records[_key(record['source'])] = record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+
+JOURNAL_NAME = '.tiff2png-batch.json'
+
+class BatchJournal:
+    """Checkpoint of the batch currently being converted into an output folder.
+
+    The job list and settings are written before the first file starts and the
+    journal is removed once the batch runs to the end. A journal left behind
+    means the batch was cancelled or the app died; the manifest then tells
+    which of its jobs already finished, so resuming redoes none of them.
+    """
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, JOURNAL_NAME)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def save(self, jobs, settings):
+        """Atomically write the batch's (input_path, output_path) jobs and settings"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'settings': settings,
+                'jobs': [[os.path.abspath(input_path), os.path.abspath(output_path)]
+                         for input_path, output_path in jobs]
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def load(self):
+        """Return (jobs, settings) of the interrupted batch, or None if there is none"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        settings = data['settings']
+        # JSON turns tuples into lists; conversion settings expect a tuple resolution
+        if settings.get('target_resolution'):
+            settings['target_resolution'] = tuple(settings['target_resolution'])
+        return [tuple(job) for job in data['jobs']], settings
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
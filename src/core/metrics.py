@@ -0,0 +1,125 @@
+"""Per-stage timing of the conversion pipeline.
+
+convert_file() gives its ImageProcessor a StageTimer when metrics are
+requested; the pipeline wraps each stage (decode, resize, convert, encode,
+optimize, write) in timer.stage(name), and the per-file totals travel back
+to the UI or CLI in the result dict. Without metrics the processor keeps
+NULL_TIMER, whose stage() returns one shared no-op context manager, so the
+instrumentation costs a method call per stage and page.
+
+Records are flat dicts (see METRIC_FIELDS) that MetricsWriter appends to a
+CSV or JSON-lines file as files complete.
+"""
+import contextlib
+import csv
+import json
+import os
+import time
+
+STAGES = ("decode", "resize", "convert", "encode", "optimize", "write")
+METRIC_FIELDS = (
+    'input_path', 'output_path', 'success', 'pages', 'streamed_pages', 'pixels_in', 'pixels_out',
+    'bytes_in', 'bytes_out', 'seconds'
+) + tuple(f"{stage}_seconds" for stage in STAGES)
+METRICS_FORMATS = (".csv", ".jsonl")
+
+class StageTimer:
+    """Accumulates seconds per pipeline stage, and pixel counts, for one file"""
+    enabled = True
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.pixels_in = 0
+        self.pixels_out = 0
+        self.start = time.perf_counter()
+
+    def stage(self, name):
+        """Return a context manager that adds the time spent inside it to stage name"""
+        return _TimedStage(self, name)
+
+    def add_pixels(self, pixels_in, pixels_out):
+        self.pixels_in += pixels_in
+        self.pixels_out += pixels_out
+
+    def record(self, result, bytes_in=None):
+        """Return the metrics record for a convert_file result dict"""
+        record = {
+            'input_path': result['input_path'],
+            'output_path': result['output_path'],
+            'success': result['success'],
+            'pages': result['pages'],
+            'streamed_pages': result['streamed_pages'],
+            'pixels_in': self.pixels_in,
+            'pixels_out': self.pixels_out,
+            'bytes_in': bytes_in,
+            'bytes_out': result['bytes'],
+            'seconds': round(time.perf_counter() - self.start, 6)
+        }
+        for stage, seconds in self.seconds.items():
+            record[f"{stage}_seconds"] = round(seconds, 6)
+        return record
+
+class _TimedStage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timer.seconds[self.name] += time.perf_counter() - self.start
+
+class NullTimer:
+    """Stand-in for StageTimer when metrics are off"""
+    enabled = False
+    _stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def add_pixels(self, pixels_in, pixels_out):
+        pass
+
+NULL_TIMER = NullTimer()
+
+class MetricsWriter:
+    """Writes metrics records to a CSV or JSON-lines file, chosen by its extension.
+
+    Each record is flushed as it is written, so a dashboard tailing the file
+    sees files as they complete.
+    """
+    def __init__(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in METRICS_FORMATS:
+            raise ValueError(f"Metrics file must end in {' or '.join(METRICS_FORMATS)}: {path}")
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.csv = None
+        if extension == ".csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=METRIC_FIELDS, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv:
+            self.csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def export_metrics(records, path):
+    """Write a list of metrics records to path (.csv or .jsonl)"""
+    with MetricsWriter(path) as writer:
+        for record in records:
+            writer.write(record)
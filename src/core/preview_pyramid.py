@@ -0,0 +1,85 @@
+"""Multi-resolution pyramid of a source image for fast region previews.
+
+Moving the crop box asks for a different region of the same source again
+and again. Resampling that region from the full-resolution image costs time
+in proportion to the region's source pixels, so a large crop on a big TIFF
+is slow to preview. The pyramid keeps halved copies of the source, built
+lazily and adding at most a third to the source's memory, and resamples
+each region from the coarsest level that still has at least as many pixels
+as the output. A region preview then costs about the same whatever the crop
+size.
+"""
+from PIL import Image
+
+from core.image_processor import DEFAULT_RESAMPLE_METHOD
+
+# Image.reduce() does not take these modes; they are halved with resize() instead
+_NO_REDUCE_MODES = ("1", "P", "I;16", "I;16L", "I;16B", "I;16N")
+
+class ImagePyramid:
+    """Lazily built halving pyramid over a source image"""
+    def __init__(self, img, min_side=32):
+        self.source = img
+        self.min_side = min_side
+        self.levels = [img]  # levels[n] is the source halved n times
+
+    def get_level(self, scale):
+        """Return the coarsest level that is at least scale times the source size"""
+        index = 0
+        while 0.5 ** (index + 1) >= scale:
+            if index + 1 == len(self.levels) and not self._add_level():
+                break
+            index += 1
+        return self.levels[index]
+
+    def _add_level(self):
+        previous = self.levels[-1]
+        width, height = previous.size[0] // 2, previous.size[1] // 2
+        if min(width, height) < self.min_side:
+            return False
+        if previous.mode in _NO_REDUCE_MODES:
+            # Pillow falls back to NEAREST for bilevel and palette images
+            level = previous.resize((width, height), Image.Resampling.BOX)
+        else:
+            level = previous.reduce(2)
+        self.levels.append(level)
+        return True
+
+    def render_region(self, box, size, resample_method=DEFAULT_RESAMPLE_METHOD):
+        """Resample box (source coordinates, may be fractional) to size.
+
+        Parts of the box outside the source come out black, as process_image
+        pads a fill crop that extends past the image edges.
+        """
+        left, top, right, bottom = box
+        box_width, box_height = right - left, bottom - top
+        if box_width <= 0 or box_height <= 0:
+            raise ValueError(f"Empty region: {box}")
+        x_scale = size[0] / box_width
+        y_scale = size[1] / box_height
+        source_width, source_height = self.source.size
+        inside = (max(0, left), max(0, top), min(source_width, right), min(source_height, bottom))
+        if inside[0] >= inside[2] or inside[1] >= inside[3]:
+            return self._blank(size)
+
+        # Output pixels covered by the part of the box inside the source
+        out_box = (round((inside[0] - left) * x_scale), round((inside[1] - top) * y_scale),
+                   round((inside[2] - left) * x_scale), round((inside[3] - top) * y_scale))
+        out_size = (max(1, out_box[2] - out_box[0]), max(1, out_box[3] - out_box[1]))
+        level = self.get_level(max(x_scale, y_scale))
+        x_ratio = level.size[0] / source_width
+        y_ratio = level.size[1] / source_height
+        level_box = (inside[0] * x_ratio, inside[1] * y_ratio, inside[2] * x_ratio, inside[3] * y_ratio)
+        region = level.resize(out_size, Image.Resampling[resample_method], box=level_box)
+        if out_size == tuple(size):
+            return region
+        padded = self._blank(size)
+        padded.paste(region, out_box[:2])
+        return padded
+
+    def _blank(self, size):
+        # Palette images pad with index 0 and keep their palette, as crop() does
+        canvas = Image.new(self.source.mode, size)
+        if self.source.mode in ("P", "PA"):
+            canvas.putpalette(self.source.getpalette())
+        return canvas
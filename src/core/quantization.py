@@ -0,0 +1,75 @@
+"""Palette building and mapping for the P (palette) color mode.
+
+Quantizing a whole scan with convert("P", palette=ADAPTIVE) runs median cut
+over every pixel and gives each image, and each page of a document, its own
+palette. Here the palette is built from a bounded sample of pixels (from one
+image, all pages of a document or a sample of a whole batch) and stored as a
+flat RGB list, so it can travel through batch settings, the journal and the
+manifest fingerprint. Mapping uses Pillow's quantize(palette=...), which finds
+each color's nearest palette entry through a lazily filled RGB lookup table.
+"""
+import math
+
+from PIL import Image, features
+
+QUANTIZE_METHODS = ("median-cut", "k-means", "libimagequant")
+PALETTE_SCOPES = ("file", "batch")
+DEFAULT_QUANTIZE_METHOD = "median-cut"
+
+# Pixels sampled to build a palette; k-means iterates over its sample, so it gets fewer
+SAMPLE_PIXELS = {"median-cut": 256 * 1024, "k-means": 64 * 1024, "libimagequant": 256 * 1024}
+SAMPLE_WIDTH = 512
+KMEANS_ITERATIONS = 3
+
+def available_methods():
+    """Return the quantization methods this Pillow build supports"""
+    return tuple(method for method in QUANTIZE_METHODS
+                 if method != "libimagequant" or features.check_feature('libimagequant'))
+
+def get_dither(dither_method):
+    """Map the dither setting onto Pillow's dither constants.
+
+    "auto" does not dither, like the adaptive conversion used before: dithered
+    noise makes palette PNGs several times larger.
+    """
+    if dither_method == "FLOYDSTEINBERG":
+        return Image.Dither.FLOYDSTEINBERG
+    return Image.Dither.NONE
+
+def build_palette(images, colors=256, method=DEFAULT_QUANTIZE_METHOD, sample_pixels=None):
+    """Build one palette from a list of images and return it as a flat RGB list.
+
+    Each image is nearest-neighbour sampled to an equal share of a fixed-width
+    montage; nearest-neighbour sampling keeps the noise and color spread intact
+    and the aspect ratio does not matter for the color distribution.
+    A sample_pixels below the method's own shrinks the montage's width and
+    height alike, so a small sample still spans the rows of each image.
+    """
+    if method not in available_methods():
+        raise ValueError(f"Quantization method '{method}' is not available in this Pillow build")
+    width = SAMPLE_WIDTH
+    if sample_pixels is not None and sample_pixels < SAMPLE_PIXELS[method]:
+        width = max(1, int(SAMPLE_WIDTH * math.sqrt(sample_pixels / SAMPLE_PIXELS[method])))
+    rows = max(1, (sample_pixels or SAMPLE_PIXELS[method]) // width // len(images))
+    montage = Image.new('RGB', (width, rows * len(images)))
+    for index, img in enumerate(images):
+        sample = img.resize((width, rows), Image.Resampling.NEAREST)
+        montage.paste(sample.convert('RGB'), (0, index * rows))
+    if method == "libimagequant":
+        quantized = montage.quantize(colors, method=Image.Quantize.LIBIMAGEQUANT)
+    else:
+        kmeans = KMEANS_ITERATIONS if method == "k-means" else 0
+        quantized = montage.quantize(colors, method=Image.Quantize.MEDIANCUT, kmeans=kmeans)
+    return quantized.getpalette()[:colors * 3]
+
+def palette_image(palette):
+    """Return a 1x1 P image carrying palette, for quantize(palette=...)"""
+    img = Image.new('P', (1, 1))
+    img.putpalette(palette)
+    return img
+
+def apply_palette(img, palette, dither_method=None):
+    """Map an image onto palette (a flat RGB list) with the given dither setting"""
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img.quantize(palette=palette_image(palette), dither=get_dither(dither_method))
@@ -0,0 +1,418 @@
+"""Memory-bounded conversion of very large TIFF pages.
+
+The normal pipeline decodes a whole page, resizes it and hands it to Pillow's
+PNG encoder, which needs a few copies of the full image in memory. For
+oversized pages this module instead decodes horizontal bands of strips (or
+tile rows), resamples each band into a slice of output rows and streams the
+rows into a single zlib stream inside the PNG, so peak memory is set by the
+budget rather than by the image size.
+"""
+from contextlib import contextmanager
+import io
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from PIL import Image
+from core.image_processor import DEFAULT_RESAMPLE_METHOD
+from core.png_optimizer import PNG_SIGNATURE, pack_chunk, read_chunks
+from core.quantization import DEFAULT_QUANTIZE_METHOD, build_palette
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+DEFAULT_STREAMING_THRESHOLD_MP = 100
+
+# TIFF tags used to locate strips and tiles
+COMPRESSION = 259
+FILL_ORDER = 266
+STRIP_OFFSETS = 273
+ORIENTATION = 274
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIGURATION = 284
+PREDICTOR = 317
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+TILE_BYTE_COUNTS = 325
+
+# Compression tag values StripReader can decode: none, PackBits, Deflate and old-style Deflate
+_CODECS = {1: 'raw', 32773: 'packbits', 8: 'deflate', 32946: 'deflate'}
+
+IDAT_SIZE = 256 * 1024
+
+_pixel_limit_lock = threading.Lock()
+
+@contextmanager
+def unlimited_pixels():
+    """Temporarily lift Pillow's decompression-bomb limit while opening a page header.
+
+    Bands are still checked against the limit when they are decoded.
+    """
+    with _pixel_limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            yield
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+def open_image(path):
+    """Open an image without the decompression-bomb check (nothing is decoded yet)"""
+    with unlimited_pixels():
+        return Image.open(path)
+
+def should_stream(img, threshold_mp=DEFAULT_STREAMING_THRESHOLD_MP):
+    """Return True if the current page is large enough to need the streaming path"""
+    return threshold_mp is not None and img.size[0] * img.size[1] > threshold_mp * 1000000
+
+def bytes_per_pixel(mode):
+    """Return the decoded size of one pixel in mode"""
+    return len(Image.new(mode, (8, 1)).tobytes()) / 8
+
+def get_unstreamed_settings(processor, settings):
+    """Return the names of requested settings that a streamed page cannot honour"""
+    ignored = []
+    if settings.get('interlace'):
+        ignored.append("interlacing")
+    if settings.get('filter_method', 'auto') != 'auto':
+        ignored.append(f"the '{settings['filter_method']}' row filter")
+    if settings.get('chunk_optimize'):
+        ignored.append("chunk optimization")
+    preset_name = settings.get('compression_preset', 'smallest')
+    preset = processor.compression_presets.get(preset_name)
+    if preset and len(preset['strategies']) > 1:
+        ignored.append(f"the extra zlib strategies of the '{preset_name}' preset")
+    return ignored
+
+def fits_in_memory(processor, img, settings, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """Return True if the page, decoded whole, and about three copies of its output fit the budget"""
+    out_width, out_height = processor.get_output_size(img.size, settings.get('scale_factor', 1.0),
+                                                      settings.get('target_resolution'),
+                                                      settings.get('fill_mode', False))
+    pixel_bytes = bytes_per_pixel(img.mode)
+    needed = img.size[0] * img.size[1] * pixel_bytes + out_width * out_height * max(4, pixel_bytes) * 3
+    return needed <= memory_budget_mb * 1024 * 1024
+
+def _file_rawmode(rawmode, little_endian):
+    # The libtiff tile descriptor uses native byte order; raw strip data keeps the file's
+    if rawmode == 'I;16N':
+        return 'I;16' if little_endian else 'I;16B'
+    if rawmode.endswith(';16N'):
+        return rawmode[:-1] + ('L' if little_endian else 'B')
+    return rawmode
+
+class StripReader:
+    """Decodes row bands of one TIFF page without loading the whole page.
+
+    Strips or tiles are located from the page's offset and byte count tags
+    and read straight from the file, so only the ones covering a band are
+    read. Uncompressed, PackBits and Deflate (without a predictor) data is
+    decoded with Image.frombytes. Use StripReader.open(), which returns
+    None for layouts it cannot stream (e.g. LZW or JPEG compression), so
+    callers can fall back to a full decode.
+    """
+    def __init__(self, path, page_index, img):
+        self.path = path
+        self.page_index = page_index
+        self.size = img.size
+        self.mode = img.mode
+        self.info = dict(img.info)
+        self.palette = img.palette.copy() if img.mode in ('P', 'PA') and img.palette else None
+        self._codec = _CODECS[img.tag_v2.get(COMPRESSION, 1)]
+        # Pillow's rawmode for the page, in the file's byte order
+        self._rawmode = _file_rawmode(img.tile[0][3][0], img.tag_v2.prefix == b'II')
+        width, height = img.size
+        if TILE_OFFSETS in img.tag_v2:
+            piece_width = img.tag_v2[TILE_WIDTH]
+            piece_height = img.tag_v2[TILE_LENGTH]
+            offsets = img.tag_v2[TILE_OFFSETS]
+            counts = img.tag_v2[TILE_BYTE_COUNTS]
+            across = -(-width // piece_width)
+            self._pieces = [((i % across) * piece_width, (i // across) * piece_height, piece_width, piece_height,
+                             offset, count)
+                            for i, (offset, count) in enumerate(zip(offsets, counts))]
+        else:
+            piece_width = width
+            piece_height = min(img.tag_v2.get(ROWS_PER_STRIP, height), height)
+            offsets = img.tag_v2[STRIP_OFFSETS]
+            counts = img.tag_v2[STRIP_BYTE_COUNTS]
+            # The last strip holds only the rows that are left
+            self._pieces = [(0, i * piece_height, width, min(piece_height, height - i * piece_height), offset, count)
+                            for i, (offset, count) in enumerate(zip(offsets, counts))]
+        self.band_height = piece_height
+
+    @classmethod
+    def open(cls, path, page_index=0):
+        """Return a reader for the page, or None if it cannot be decoded in bands"""
+        with open_image(path) as img:
+            img.seek(page_index)
+            if getattr(img, 'format', None) != 'TIFF' or img.tag_v2.get(ORIENTATION, 1) != 1:
+                return None
+            compression = img.tag_v2.get(COMPRESSION, 1)
+            streamable = (compression in _CODECS
+                          and img.tag_v2.get(PREDICTOR, 1) == 1
+                          and img.tag_v2.get(PLANAR_CONFIGURATION, 1) == 1
+                          and img.tag_v2.get(FILL_ORDER, 1) == 1
+                          and (STRIP_OFFSETS in img.tag_v2 or TILE_OFFSETS in img.tag_v2)
+                          # Pillow's packbits decoder does not take bilevel data
+                          and not (img.mode == '1' and compression != 1))
+            return cls(path, page_index, img) if streamable else None
+
+    def read_rows(self, top, bottom):
+        """Decode rows [top, bottom) of the page into an image"""
+        pieces = [piece for piece in self._pieces if piece[1] < bottom and piece[1] + piece[3] > top]
+        band_top = min(piece[1] for piece in pieces)
+        band_bottom = min(self.size[1], max(piece[1] + piece[3] for piece in pieces))
+        band = Image.new(self.mode, (self.size[0], band_bottom - band_top))
+        with open(self.path, 'rb') as f:
+            for left, piece_top, width, height, offset, count in pieces:
+                f.seek(offset)
+                # Edge tiles are padded to the full tile size; paste clips them to the page
+                band.paste(self._decode(f.read(count), (width, height)), (left, piece_top - band_top))
+        if band_top != top or band_bottom != bottom:
+            band = band.crop((0, top - band_top, self.size[0], bottom - band_top))
+        if self.palette is not None:
+            band.putpalette(self.palette)
+        return band
+
+    def _decode(self, data, size):
+        if self._codec == 'deflate':
+            data = zlib.decompress(data)
+        return Image.frombytes(self.mode, size, data, 'packbits' if self._codec == 'packbits' else 'raw',
+                               self._rawmode)
+
+class StreamingPNGWriter:
+    """Writes a PNG one slice of rows at a time.
+
+    Each slice is run through Pillow's PNG encoder at compression level 0 to
+    get its adaptively filtered scanlines, with the previous slice's last row
+    prepended so the first row's filter sees its real predecessor. The
+    filtered rows then go through one shared zlib stream into IDAT chunks.
+    Interlacing is not supported.
+    """
+    def __init__(self, output_path, size, compress_level=9, strategy=zlib.Z_DEFAULT_STRATEGY):
+        self.output_path = output_path
+        self.size = size
+        self.temp_path = f"{output_path}.{os.getpid()}.tmp"
+        self.compressor = zlib.compressobj(compress_level, zlib.DEFLATED, 15, 9, strategy)
+        self.file = open(self.temp_path, 'wb')
+        self.pending = bytearray()
+        self.previous_row = None
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        """Append an image slice of the full output width"""
+        if self.previous_row is not None:
+            slice_img = Image.new(rows.mode, (rows.size[0], rows.size[1] + 1))
+            if rows.mode == 'P':
+                slice_img.putpalette(rows.getpalette())
+            slice_img.paste(self.previous_row, (0, 0))
+            slice_img.paste(rows, (0, 1))
+        else:
+            slice_img = rows
+        buffer = io.BytesIO()
+        slice_img.save(buffer, format='PNG', compress_level=0)
+        chunks = read_chunks(buffer.getvalue())
+        filtered = zlib.decompress(b''.join(data for chunk_type, data in chunks if chunk_type == b'IDAT'))
+        if self.previous_row is None:
+            self._write_header(chunks)
+        else:
+            filtered = filtered[len(filtered) // slice_img.size[1]:]
+        self.previous_row = rows.crop((0, rows.size[1] - 1, rows.size[0], rows.size[1]))
+        self.rows_written += rows.size[1]
+        self.pending += self.compressor.compress(filtered)
+        while len(self.pending) >= IDAT_SIZE:
+            self._write_chunk(b'IDAT', bytes(self.pending[:IDAT_SIZE]))
+            del self.pending[:IDAT_SIZE]
+
+    def close(self):
+        """Finish the PNG and rename it into place"""
+        self.pending += self.compressor.flush()
+        if self.pending:
+            self._write_chunk(b'IDAT', bytes(self.pending))
+        self._write_chunk(b'IEND', b'')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.temp_path, self.output_path)
+
+    def abort(self):
+        """Discard a partly written PNG"""
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def _write_header(self, chunks):
+        self.file.write(PNG_SIGNATURE)
+        for chunk_type, data in chunks:
+            if chunk_type == b'IHDR':
+                # The first slice's header, with the full output height
+                data = struct.pack('>II', self.size[0], self.size[1]) + data[8:]
+                self._write_chunk(chunk_type, data)
+            elif chunk_type not in (b'IDAT', b'IEND'):
+                # Palette, transparency and color metadata
+                self._write_chunk(chunk_type, data)
+
+    def _write_chunk(self, chunk_type, data):
+        self.file.write(pack_chunk(chunk_type, data))
+
+class _Sized:
+    # calculate_crop_box only needs .size
+    def __init__(self, size):
+        self.size = size
+
+def get_streaming_geometry(processor, size, scale_factor, target_resolution=None, fill_mode=False):
+    """Return (output size, source box) for streaming, or None if the settings need a full decode.
+
+    This mirrors process_image: fill mode resamples only the crop region. A
+    fill crop that extends past the image edges is padded by process_image,
+    which the streaming path does not reproduce.
+    """
+    out_size = processor.get_output_size(size, scale_factor, target_resolution, fill_mode)
+    if out_size[0] <= 0 or out_size[1] <= 0:
+        return None
+    if target_resolution and fill_mode:
+        scaled_size = (int(size[0] * scale_factor), int(size[1] * scale_factor))
+        crop_box = processor.calculate_crop_box(_Sized(size), out_size[0], out_size[1], scale_factor)
+        source_box = processor.calculate_source_box(size, scaled_size, crop_box)
+        if source_box is None:
+            return None
+        return out_size, source_box
+    return out_size, (0, 0, size[0], size[1])
+
+def stream_convert(processor, reader, output_path, settings, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """Convert one page band by band and write it as a PNG; returns save stats like save_image.
+
+    Returns None if the settings cannot be streamed, in which case nothing is written.
+    Stage times are added to processor.timer.
+    """
+    geometry = get_streaming_geometry(processor, reader.size, settings.get('scale_factor', 1.0),
+                                      settings.get('target_resolution'), settings.get('fill_mode', False))
+    if geometry is None:
+        return None
+    (out_width, out_height), (box_left, box_top, box_right, box_bottom) = geometry
+    start = time.perf_counter()
+    ratio_y = (box_bottom - box_top) / out_height
+    # Lanczos reads 3 source pixels either side, scaled up when downsampling
+    margin = math.ceil(3 * max(1.0, ratio_y)) + 1
+
+    # Budget: the decoded band (plus its crop copy) and about three copies of the output slice
+    color_mode = settings.get('color_mode', 'auto')
+    source_row_bytes = reader.size[0] * bytes_per_pixel(reader.mode) * 2
+    output_row_bytes = out_width * max(4, bytes_per_pixel(reader.mode)) * 3
+    budget = memory_budget_mb * 1024 * 1024 - (2 * margin + reader.band_height) * source_row_bytes
+    slice_rows = int(budget / (ratio_y * source_row_bytes + output_row_bytes))
+    slice_rows = max(1, min(out_height, slice_rows))
+
+    # Slices must share one window; "auto" takes it from a reduced copy of the whole page
+    window = processor.get_tone_window(reader, color_mode, settings.get('tone_mapping', 'auto'),
+                                       settings.get('window'), sample=lambda: read_reduced(reader, sample_band))
+    tone_mapping = "window" if window else "none"
+
+    quantize_method = settings.get('quantize_method', DEFAULT_QUANTIZE_METHOD)
+    palette = settings.get('palette')
+    if color_mode == "P" and palette is None:
+        palette = build_stream_palette(reader, processor, window, quantize_method)
+
+    save_params = processor.get_save_params(settings.get('optimize', True), False,
+                                            settings.get('filter_method', 'auto'),
+                                            settings.get('compression_preset', 'smallest'))
+    resample = Image.Resampling[settings.get('resample_method', DEFAULT_RESAMPLE_METHOD)]
+    timer = processor.timer
+    writer = StreamingPNGWriter(output_path, (out_width, out_height),
+                                save_params['compress_level'], save_params['compress_type'])
+    try:
+        for out_top in range(0, out_height, slice_rows):
+            out_bottom = min(out_height, out_top + slice_rows)
+            source_top = box_top + out_top * ratio_y
+            source_bottom = box_top + out_bottom * ratio_y
+            band_top = max(0, int(source_top) - margin)
+            band_bottom = min(reader.size[1], math.ceil(source_bottom) + margin)
+            with timer.stage("decode"):
+                band = reader.read_rows(band_top, band_bottom)
+            with timer.stage("resize"):
+                rows = band.resize((out_width, out_bottom - out_top), resample,
+                                   box=(box_left, source_top - band_top, box_right, source_bottom - band_top))
+            del band
+            with timer.stage("convert"):
+                rows = processor.convert_color_mode(rows, color_mode, settings.get('dither_method'),
+                                                    tone_mapping, window, quantize_method, palette)
+            # Filtering and compression; full IDAT chunks are written out as they fill
+            with timer.stage("encode"):
+                writer.write_rows(rows)
+        with timer.stage("write"):
+            writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return {
+        'compression_preset': settings.get('compression_preset', 'smallest'),
+        'bytes': os.path.getsize(output_path),
+        'seconds': time.perf_counter() - start
+    }
+
+def read_reduced(reader, reduce_band, max_side=512):
+    """Read the page band by band into a copy whose longer side is about max_side.
+
+    reduce_band(band, factor) shrinks each band by the integer factor.
+    """
+    factor = max(1, math.ceil(max(reader.size) / max_side))
+    rows_per_band = max(reader.band_height, factor * 64)
+    parts = []
+    for top in range(0, reader.size[1], rows_per_band):
+        band = reader.read_rows(top, min(reader.size[1], top + rows_per_band))
+        parts.append(reduce_band(band, factor))
+    reduced = Image.new(parts[0].mode, (parts[0].size[0], sum(part.size[1] for part in parts)))
+    y = 0
+    for part in parts:
+        reduced.paste(part, (0, y))
+        y += part.size[1]
+    return reduced
+
+def load_reduced(path, max_side=2048, page_index=0):
+    """Return a copy of a page whose longer side is about max_side, for previews of oversized pages.
+
+    Pages StripReader can read are reduced band by band, so the page is
+    never decoded whole; others (e.g. LZW or JPEG) are decoded once and
+    reduced. The returned image's info['source_size'] holds the page size
+    (see get_source_size).
+    """
+    reader = StripReader.open(path, page_index)
+    if reader is not None:
+        reduced = read_reduced(reader, box_band, max_side)
+        source_size = reader.size
+    else:
+        with open_image(path) as img:
+            img.seek(page_index)
+            img.load()
+            source_size = img.size
+            reduced = box_band(img, max(1, math.ceil(max(img.size) / max_side)))
+    reduced.info['source_size'] = source_size
+    return reduced
+
+def get_source_size(img):
+    """Return the size of the page img was loaded from, which differs for a reduced copy"""
+    return tuple(img.info.get('source_size', img.size))
+
+def box_band(band, factor):
+    """Shrink a band by factor, averaging where the mode allows"""
+    if factor == 1:
+        return band.copy()
+    # Bilevel and palette images fall back to nearest-neighbour sampling
+    return band.resize((max(1, band.size[0] // factor), max(1, math.ceil(band.size[1] / factor))),
+                       Image.Resampling.BOX)
+
+def sample_band(band, factor):
+    """Shrink a band by factor with nearest-neighbour sampling, which keeps the value distribution"""
+    return band.resize((max(1, band.size[0] // factor), max(1, math.ceil(band.size[1] / factor))),
+                       Image.Resampling.NEAREST)
+
+def build_stream_palette(reader, processor, window=None, quantize_method=DEFAULT_QUANTIZE_METHOD, max_side=512):
+    """Build one palette for the whole page from a reduced copy read band by band"""
+    tone_mapping = "window" if window else "none"
+    def reduce_band(band, factor):
+        return processor.convert_color_mode(band, "RGB", tone_mapping=tone_mapping, window=window).reduce(factor)
+    thumbnail = read_reduced(reader, reduce_band, max_side)
+    return build_palette([thumbnail], method=quantize_method)
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import os
+import threading
+from PIL import Image
+
+# TIFF NewSubfileType tag and its "reduced-resolution version of another image" bit
+NEW_SUBFILE_TYPE = 254
+REDUCED_RESOLUTION = 0x1
+
+def default_cache_dir():
+    """Return the per-user folder for the on-disk thumbnail cache"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(Path.home(), '.cache')
+    return os.path.join(base, 'tiff2png', 'thumbnails')
+
+def find_reduced_frame(img, size):
+    """Return the index of the smallest embedded reduced-resolution frame that still covers size.
+
+    Scanner and pyramid TIFFs often store preview images as extra IFDs flagged
+    as reduced-resolution. Seeking only reads the IFD header, not pixel data.
+    """
+    best_index = None
+    best_area = None
+    page_count = getattr(img, 'n_frames', 1)
+    if page_count == 1 or not hasattr(img, 'tag_v2'):
+        return None
+    for index in range(1, page_count):
+        img.seek(index)
+        if not img.tag_v2.get(NEW_SUBFILE_TYPE, 0) & REDUCED_RESOLUTION:
+            continue
+        width, height = img.size
+        if width >= size[0] or height >= size[1]:
+            area = width * height
+            if best_area is None or area < best_area:
+                best_index, best_area = index, area
+    img.seek(0)
+    return best_index
+
+def decode_thumbnail(path, size):
+    """Decode a thumbnail using the cheapest reduction the file offers"""
+    with Image.open(path) as img:
+        # JPEG sources can decode at 1/2, 1/4 or 1/8 scale directly
+        img.draft('RGB', size)
+        reduced_index = find_reduced_frame(img, size)
+        if reduced_index is not None:
+            img.seek(reduced_index)
+        # thumbnail() applies Image.reduce for large integer factors before resampling
+        img.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        if img.mode not in ('RGB', 'RGBA', 'L'):
+            return img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        return img.copy()
+
+class ThumbnailCache:
+    """In-memory LRU plus on-disk cache of thumbnails keyed on path, mtime and size"""
+    def __init__(self, cache_dir=None, max_entries=1024):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # (path, thumbnail size) -> image
+        self._lock = threading.Lock()
+
+    def get(self, path, size):
+        """Return a thumbnail for path that fits within size.
+
+        Memory hits do not touch the source file; call clear_memory() to force
+        files to be re-checked (e.g. when a folder is reloaded).
+        """
+        memory_key = (os.path.abspath(path), tuple(size))
+        with self._lock:
+            thumb = self._memory.get(memory_key)
+            if thumb is not None:
+                self._memory.move_to_end(memory_key)
+                return thumb
+
+        disk_path = self._disk_path(path, size)
+        thumb = self._load_from_disk(disk_path)
+        if thumb is None:
+            thumb = decode_thumbnail(path, size)
+            self._save_to_disk(thumb, disk_path)
+
+        with self._lock:
+            self._memory[memory_key] = thumb
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return thumb
+
+    def contains(self, path, size):
+        """Return True if a thumbnail is already held in memory"""
+        with self._lock:
+            return (os.path.abspath(path), tuple(size)) in self._memory
+
+    def clear_memory(self):
+        """Drop in-memory thumbnails so the next lookup re-validates against the files"""
+        with self._lock:
+            self._memory.clear()
+
+    def _disk_path(self, path, size):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.png")
+
+    def _load_from_disk(self, disk_path):
+        try:
+            with Image.open(disk_path) as img:
+                img.load()
+                return img
+        except (OSError, ValueError):
+            return None
+
+    def _save_to_disk(self, thumb, disk_path):
+        # The disk cache is best effort; a read-only or full disk just skips it
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            temp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            thumb.save(temp_path, format='PNG', compress_level=1)
+            os.replace(temp_path, disk_path)
+        except OSError:
+            pass
+
+class ThumbnailLoader:
+    """Produces thumbnails on a background thread pool.
+
+    Requests for the same file share one future. cancel_except() drops queued
+    requests that are no longer wanted, e.g. for pages the user has left.
+    """
+    def __init__(self, cache, max_workers=None):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1),
+                                           thread_name_prefix="ThumbnailLoader")
+        self._futures = {}  # (path, size) -> future
+        self._lock = threading.Lock()
+
+    def request(self, path, size, callback=None):
+        """Queue a thumbnail load; callback(path, thumb, error) runs on a worker thread"""
+        key = (os.path.abspath(path), tuple(size))
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None or future.cancelled():
+                future = self.executor.submit(self.cache.get, path, size)
+                self._futures[key] = future
+                future.add_done_callback(lambda f, key=key: self._forget(key, f))
+        if callback:
+            def notify(f):
+                if f.cancelled():
+                    return
+                error = f.exception()
+                callback(path, None if error else f.result(), error)
+            future.add_done_callback(notify)
+        return future
+
+    def cancel_except(self, keep_paths):
+        """Cancel queued loads for any path not in keep_paths (running loads finish)"""
+        keep = {os.path.abspath(path) for path in keep_paths}
+        with self._lock:
+            futures = [(key, future) for key, future in self._futures.items() if key[0] not in keep]
+        for key, future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        """Stop the worker threads, discarding queued loads"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
@@ -0,0 +1,122 @@
+"""Window/level scaling of 16-bit, 32-bit integer and float images.
+
+Pillow's convert() clips I;16, I and F pixels to 0-255 when producing 8-bit
+modes, so a 12-bit microscope frame comes out almost white and float data is
+mostly black or white. Here the pixel range of interest (the window) is mapped
+linearly onto the output range instead: either a manual window, or an
+automatic one taken from percentiles of the image.
+
+NumPy is used when it is installed; otherwise Pillow's point() does the same
+linear scaling in C.
+"""
+import math
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HIGH_BIT_DEPTH_MODES = ('I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F')
+TONE_MAPPING_MODES = ("auto", "window", "none")
+AUTO_CONTRAST_PERCENTILES = (0.5, 99.5)
+
+def is_high_bit_depth(mode):
+    """Return True for modes that hold more than 8 bits per sample"""
+    return mode in HIGH_BIT_DEPTH_MODES
+
+def compute_window(img, percentiles=AUTO_CONTRAST_PERCENTILES, max_side=1024):
+    """Return a (low, high) window covering the given percentiles of the image's values.
+
+    Large images are subsampled with nearest-neighbour sampling first, which keeps
+    the value distribution intact.
+    """
+    if max(img.size) > max_side:
+        ratio = max_side / max(img.size)
+        img = img.resize((max(1, int(img.size[0] * ratio)), max(1, int(img.size[1] * ratio))),
+                         Image.Resampling.NEAREST)
+    if np is not None:
+        values = np.asarray(img).astype(np.float64, copy=False)
+        if np.isnan(values).all():
+            return (0.0, 1.0)
+        low, high = np.nanpercentile(values, percentiles)
+    else:
+        low, high = _histogram_percentiles(img, percentiles)
+    if not high > low:
+        high = low + 1
+    return (float(low), float(high))
+
+def _histogram_percentiles(img, percentiles, bins=256):
+    # Pillow bins I;16, I and F histograms into 256 buckets over the extrema
+    img = img.convert('F') if img.mode != 'F' else img
+    low, high = img.getextrema()
+    if not high > low:
+        return low, low
+    histogram = img.histogram(extrema=(low, high))
+    total = sum(histogram)
+    bin_width = (high - low) / bins
+    results = []
+    for percentile in percentiles:
+        target = total * percentile / 100
+        seen = 0
+        for index, count in enumerate(histogram):
+            if seen + count >= target and count:
+                fraction = (target - seen) / count
+                results.append(low + (index + fraction) * bin_width)
+                break
+            seen += count
+        else:
+            results.append(high)
+    return results
+
+def apply_window(img, window, bits=8):
+    """Map the window linearly onto 0-255 (mode L) or 0-65535 (mode I;16), clipping outside it"""
+    low, high = window
+    max_value = 255 if bits == 8 else 65535
+    scale = max_value / (high - low)
+    if np is not None:
+        return _apply_window_numpy(img, low, scale, max_value)
+    return _apply_window_pillow(img, low, scale, bits)
+
+def _apply_window_numpy(img, low, scale, max_value):
+    values = np.asarray(img)
+    out_type = np.uint8 if max_value == 255 else np.uint16
+    if values.dtype.kind == 'u' and values.dtype.itemsize == 2:
+        # 16-bit input: scale a 65536-entry table once, then index it, with no float copy of the image
+        lut = np.arange(65536, dtype=np.float32)
+        lut -= low
+        lut *= scale
+        np.clip(lut, 0, max_value, out=lut)
+        lut += 0.5
+        return Image.fromarray(lut.astype(out_type)[values])
+    work = values.astype(np.float32)
+    np.nan_to_num(work, copy=False)
+    work -= low
+    work *= scale
+    np.clip(work, 0, max_value, out=work)
+    work += 0.5
+    return Image.fromarray(work.astype(out_type))
+
+def _apply_window_pillow(img, low, scale, bits):
+    if img.mode.startswith('I;16'):
+        img = img.convert('I')
+    offset = -low * scale + 0.5
+    if img.mode == 'I' and (scale != int(scale) or offset != int(offset)):
+        # Integer point() truncates fractional scales, so scale in float
+        img = img.convert('F')
+    scaled = img.point(lambda value: value * scale + offset)
+    if bits == 8:
+        return scaled.convert('L')
+    if scaled.mode == 'F':
+        scaled = scaled.convert('I')
+    return scaled.convert('I;16')
+
+def to_16bit(img):
+    """Widen an 8-bit grayscale image to I;16 (0-255 becomes 0-65535)"""
+    return img.convert('L').convert('I').point(lambda value: value * 257).convert('I;16')
+
+def window_is_valid(window):
+    """Return True for a (low, high) window with low < high"""
+    return (window is not None and len(window) == 2
+            and all(isinstance(v, (int, float)) and math.isfinite(v) for v in window)
+            and window[0] < window[1])
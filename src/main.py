@@ -2,16 +2,27 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
 import os
-from PIL import Image
 import math
 import logging
 import sys
+import multiprocessing
+import queue
+import threading
+import time
 
 from ui.preview_frame import PreviewFrame
 from ui.batch_preview_frame import BatchPreviewFrame
 from ui.settings_frame import SettingsFrame
 from ui.info_frame import InfoFrame
 from core.image_processor import ImageProcessor
+from core.batch_engine import BatchConverter, convert_file, get_page_output_path, get_save_kwargs
+from core.image_cache import ImageCache
+from core.job_queue import JobQueue, JobCancelled
+from core.file_scanner import iter_tiff_files, split_patterns
+from core.manifest import BatchJournal, BatchManifest, settings_fingerprint
+from core.metrics import StageTimer
+from core.preview_pyramid import ImagePyramid
+from core.streaming import get_source_size, load_reduced, open_image, should_stream
 
 class TIFFtoPNGConverter:
     def __init__(self):
@@ -47,7 +58,19 @@ class TIFFtoPNGConverter:
         
         # Initialize components
         self.image_processor = ImageProcessor()
+        self.image_cache = ImageCache()
+        self.preview_proxy = None  # (source image, geometry settings, proxy image)
+        self.preview_pyramid = None  # ImagePyramid of the source the crop box is moved over
+        # Background threads must not call into Tk: they queue callbacks with call_on_ui and
+        # the Tk thread runs them from a recurring poll
+        self.ui_calls = queue.Queue()
+        # Conversions run on a background thread; results come back through call_on_ui
+        self.job_queue = JobQueue(dispatch=self.call_on_ui)
+        # Incremented for every batch folder listing so stale listings can stop early
+        self.batch_listing_id = 0
+        self.batch_scan_options = (True, "", "")
         self.init_components()
+        self.poll_ui_calls()
         
         # Set minimum window size
         self.root.update_idletasks()
@@ -110,8 +133,35 @@ class TIFFtoPNGConverter:
         ttk.Label(self.batch_frame, text="Root Name:").grid(row=1, column=0, sticky=tk.W, pady=2)
         self.batch_root_var = tk.StringVar(value="Batch_01")
         ttk.Entry(self.batch_frame, textvariable=self.batch_root_var, width=20).grid(row=1, column=1, padx=5)
+        # Folder scanning options; subfolders are mirrored in the output folder
+        self.recursive_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            self.batch_frame,
+            text="Include subfolders",
+            variable=self.recursive_var,
+            command=self.on_scan_options_change
+        ).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        ttk.Label(self.batch_frame, text="Include:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.include_patterns_var = tk.StringVar()
+        include_entry = ttk.Entry(self.batch_frame, textvariable=self.include_patterns_var, width=20)
+        include_entry.grid(row=3, column=1, padx=5)
+        ttk.Label(self.batch_frame, text="Exclude:").grid(row=4, column=0, sticky=tk.W, pady=2)
+        self.exclude_patterns_var = tk.StringVar()
+        exclude_entry = ttk.Entry(self.batch_frame, textvariable=self.exclude_patterns_var, width=20)
+        exclude_entry.grid(row=4, column=1, padx=5)
+        for entry in (include_entry, exclude_entry):
+            entry.bind('<Return>', lambda event: self.on_scan_options_change())
+            entry.bind('<FocusOut>', lambda event: self.on_scan_options_change())
+        # Incremental mode skips files the output folder's manifest shows as up to date
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.batch_frame,
+            text="Skip files already converted with these settings",
+            variable=self.incremental_var
+        ).grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=2)
         # Settings frame
-        self.settings_frame = SettingsFrame(self.left_panel, on_settings_change=self.on_settings_change)
+        self.settings_frame = SettingsFrame(self.left_panel, self.image_processor.compression_presets,
+                                            on_settings_change=self.on_settings_change)
         self.settings_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=5)
         
         # Info frame
@@ -119,10 +169,11 @@ class TIFFtoPNGConverter:
         self.info_frame.grid(row=4, column=0, sticky=(tk.W, tk.E), pady=5)
         
         # Preview frames
-        self.preview_frame = PreviewFrame(self.right_panel, on_crop_update=self.on_crop_update)
+        self.preview_frame = PreviewFrame(self.right_panel, on_crop_update=self.on_crop_update,
+                                          on_full_preview=self.show_full_resolution_preview)
         self.preview_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-        self.batch_preview_frame = BatchPreviewFrame(self.right_panel)
+        self.batch_preview_frame = BatchPreviewFrame(self.right_panel, self.call_on_ui)
         self.batch_preview_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # Progress bar
@@ -136,10 +187,22 @@ class TIFFtoPNGConverter:
         self.status_label = ttk.Label(self.left_panel, textvariable=self.status_var)
         self.status_label.grid(row=6, column=0, sticky=(tk.W, tk.E), pady=5)
         
-        # Convert button
-        self.convert_button = ttk.Button(self.left_panel, text="Convert",
+        # Convert, pause and cancel buttons
+        button_frame = ttk.Frame(self.left_panel)
+        button_frame.grid(row=7, column=0, sticky=(tk.W, tk.E), pady=5)
+        button_frame.grid_columnconfigure(0, weight=1)
+        self.convert_button = ttk.Button(button_frame, text="Convert",
                                        command=self.start_conversion)
-        self.convert_button.grid(row=7, column=0, sticky=(tk.W, tk.E), pady=5)
+        self.convert_button.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.pause_button = ttk.Button(button_frame, text="Pause",
+                                     command=self.toggle_pause, state='disabled')
+        self.pause_button.grid(row=0, column=1, padx=(5, 0))
+        self.cancel_button = ttk.Button(button_frame, text="Cancel",
+                                      command=self.cancel_conversion, state='disabled')
+        self.cancel_button.grid(row=0, column=2, padx=(5, 0))
+        self.resume_batch_button = ttk.Button(button_frame, text="Resume Batch",
+                                            command=self.resume_batch, state='disabled')
+        self.resume_batch_button.grid(row=0, column=3, padx=(5, 0))
         
         # Add trace callbacks to input and output path variables
         self.input_path_var.trace_add('write', self.on_path_change)
@@ -151,9 +214,13 @@ class TIFFtoPNGConverter:
         self.settings_frame.fill_mode_var.trace_add('write', self.on_settings_change)
         self.settings_frame.color_mode_var.trace_add('write', self.on_settings_change)
         self.settings_frame.dither_var.trace_add('write', self.on_settings_change)
+        self.settings_frame.tone_mapping_var.trace_add('write', self.on_settings_change)
+        self.settings_frame.quantize_method_var.trace_add('write', self.on_settings_change)
         self.settings_frame.filter_var.trace_add('write', self.on_settings_change)
+        self.settings_frame.resample_var.trace_add('write', self.on_settings_change)
         self.settings_frame.chunk_optimize_var.trace_add('write', self.on_settings_change)
         self.settings_frame.interlace_var.trace_add('write', self.on_settings_change)
+        self.settings_frame.compression_preset_var.trace_add('write', self.on_settings_change)
 
     def on_mode_change(self):
         """Handle mode change between single and batch conversion"""
@@ -167,6 +234,7 @@ class TIFFtoPNGConverter:
             self.batch_frame.grid()
             self.batch_preview_frame.grid()
             self.preview_frame.grid_remove()
+        self.update_resume_state()
 
     def browse_input(self):
         """Browse for input file or folder"""
@@ -201,7 +269,7 @@ class TIFFtoPNGConverter:
                 input_path = self.input_path_var.get()
                 if input_path:
                     try:
-                        img = Image.open(input_path)
+                        img = self.load_image(input_path)
                         file_size = os.path.getsize(input_path)
                         self.update_estimated_size(img, file_size)
                         self.update_live_output_preview(img)
@@ -216,27 +284,54 @@ class TIFFtoPNGConverter:
                 input_path = self.input_path_var.get()
                 if input_path:
                     try:
-                        tiff_files = []
-                        for ext in ('.tif', '.tiff'):
-                            tiff_files.extend(Path(input_path).glob(f'*{ext}'))
-                        if tiff_files:
-                            img = Image.open(tiff_files[0])
-                            file_size = os.path.getsize(tiff_files[0])
+                        # Only the first file is needed, so stop the scan as soon as one is found
+                        first_file = next(self.iter_batch_folder(input_path), None)
+                        if first_file:
+                            img = self.load_image(first_file)
+                            file_size = os.path.getsize(first_file)
                             self.update_estimated_size(img, file_size)
                             self.update_live_output_preview(img)
                     except Exception as e:
                         self.logger.error(f"Failed to update output info: {str(e)}")
 
+    def load_image(self, file_path):
+        """Return the decoded image for file_path from the shared image cache.
+
+        Pages above the streaming threshold are never decoded whole here: a
+        reduced copy stands in for them (see get_source_size and
+        get_preview_settings), and only the conversion reads them in full.
+        """
+        with open_image(file_path) as header:
+            oversized = should_stream(header, self.settings_frame.streaming_threshold_var.get())
+        if oversized:
+            img = self.image_cache.get(file_path, loader=load_reduced, variant="reduced")
+        else:
+            img = self.image_cache.get(file_path)
+        self.settings_frame.update_cache_stats(self.image_cache.stats())
+        return img
+
+    def get_preview_settings(self, img):
+        """Return the conversion settings to preview img with.
+
+        A reduced copy gets a larger scale factor, so its output has the size
+        the full page would give.
+        """
+        settings = self.get_conversion_settings()
+        source_size = get_source_size(img)
+        if source_size != img.size:
+            settings['scale_factor'] *= source_size[0] / img.size[0]
+        return settings
+
     def load_input_file(self, file_path):
         """Load and display input file"""
         try:
             self.logger.debug(f"Loading input file: {file_path}")
             # Load image
-            img = Image.open(file_path)
+            img = self.load_image(file_path)
             
             # Get file info
             file_size = os.path.getsize(file_path)
-            resolution = img.size
+            resolution = get_source_size(img)
             
             self.logger.info(f"Loaded image: {resolution[0]}x{resolution[1]}, {self.image_processor.format_size(file_size)}")
             
@@ -260,34 +355,84 @@ class TIFFtoPNGConverter:
             self.logger.error(f"Failed to load file: {str(e)}")
             messagebox.showerror("Error", f"Failed to load file: {str(e)}")
 
+    def iter_batch_folder(self, folder_path):
+        """Yield the TIFF files in folder_path using the batch scanning options"""
+        return iter_tiff_files(
+            folder_path,
+            recursive=self.recursive_var.get(),
+            include=split_patterns(self.include_patterns_var.get()),
+            exclude=split_patterns(self.exclude_patterns_var.get()),
+            skip_dirs=[self.output_path_var.get()] if self.output_path_var.get() else ()
+        )
+
+    def on_scan_options_change(self):
+        """Rescan the batch folder when the subfolder or pattern options change"""
+        options = (self.recursive_var.get(), self.include_patterns_var.get(), self.exclude_patterns_var.get())
+        if options == self.batch_scan_options:
+            return
+        self.batch_scan_options = options
+        input_path = self.input_path_var.get()
+        if self.mode_var.get() == "batch" and input_path and os.path.isdir(input_path):
+            self.load_batch_files(input_path)
+
     def load_batch_files(self, folder_path):
-        """Load and display batch files"""
+        """Load and display batch files, streaming the folder listing in the background"""
+        self.logger.debug(f"Loading batch files from: {folder_path}")
+        # A newer listing supersedes any that is still running
+        self.batch_listing_id += 1
+        listing_id = self.batch_listing_id
+        self.batch_preview_frame.begin_listing()
+        # The scanner is created here so the listing thread never reads Tk variables
+        files = self.iter_batch_folder(folder_path)
+        threading.Thread(target=self.scan_batch_folder, args=(listing_id, files),
+                         name="BatchListing", daemon=True).start()
+        
+        # Set default output folder
+        if not self.output_path_var.get():
+            output_folder = str(Path(folder_path) / "PNG_Output")
+            self.output_path_var.set(output_folder)
+            self.logger.info(f"Set default output folder: {output_folder}")
+
+    def scan_batch_folder(self, listing_id, files, chunk_size=512, chunk_seconds=0.05):
+        """List TIFF files and hand them to the UI in chunks (runs on a listing thread)"""
+        chunk = []
+        last_flush = time.perf_counter()
+        error = None
         try:
-            self.logger.debug(f"Loading batch files from: {folder_path}")
-            # Get all TIFF files
-            tiff_files = []
-            for ext in ('.tif', '.tiff'):
-                tiff_files.extend(Path(folder_path).glob(f'*{ext}'))
-            
-            if not tiff_files:
-                self.logger.warning("No TIFF files found in selected folder")
-                messagebox.showwarning("Warning", "No TIFF files found in selected folder")
-                return
-            
-            self.logger.info(f"Found {len(tiff_files)} TIFF files")
-            
-            # Update batch preview
-            self.batch_preview_frame.update_preview(tiff_files)
-            
-            # Set default output folder
-            if not self.output_path_var.get():
-                output_folder = str(Path(folder_path) / "PNG_Output")
-                self.output_path_var.set(output_folder)
-                self.logger.info(f"Set default output folder: {output_folder}")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to load batch files: {str(e)}")
-            messagebox.showerror("Error", f"Failed to load batch files: {str(e)}")
+            for path in files:
+                if listing_id != self.batch_listing_id:
+                    return
+                chunk.append(path)
+                # Flush the first chunk quickly so the first page shows straight away
+                if len(chunk) >= chunk_size or time.perf_counter() - last_flush > chunk_seconds:
+                    self.call_on_ui(self.add_batch_files, listing_id, chunk)
+                    chunk = []
+                    last_flush = time.perf_counter()
+        except OSError as e:
+            error = e
+        self.call_on_ui(self.add_batch_files, listing_id, chunk)
+        self.call_on_ui(self.finish_batch_listing, listing_id, error)
+
+    def add_batch_files(self, listing_id, files):
+        """Append a chunk of listed files to the batch preview (runs on the Tk thread)"""
+        if listing_id == self.batch_listing_id:
+            self.batch_preview_frame.add_files(files)
+
+    def finish_batch_listing(self, listing_id, error):
+        """Report the result of a folder listing (runs on the Tk thread)"""
+        if listing_id != self.batch_listing_id:
+            return
+        self.batch_preview_frame.finish_listing()
+        if error:
+            self.logger.error(f"Failed to load batch files: {str(error)}")
+            messagebox.showerror("Error", f"Failed to load batch files: {str(error)}")
+            return
+        file_count = len(self.batch_preview_frame.batch_files)
+        if not file_count:
+            self.logger.warning("No TIFF files found in selected folder")
+            messagebox.showwarning("Warning", "No TIFF files found in selected folder")
+            return
+        self.logger.info(f"Found {file_count} TIFF files")
 
     def update_estimated_size(self, img, input_size):
         """Update estimated output size based on current settings"""
@@ -295,7 +440,7 @@ class TIFFtoPNGConverter:
             # Get current settings
             scale = self.settings_frame.scale_var.get() / 100
             optimize = self.settings_frame.optimize_var.get()
-            resolution = img.size
+            resolution = get_source_size(img)
             # Calculate output resolution
             selected = self.settings_frame.resolution_var.get()
             if selected != "Custom" and self.image_processor.standard_resolutions.get(selected):
@@ -306,18 +451,36 @@ class TIFFtoPNGConverter:
                     output_resolution = f"{int(resolution[0]*scale)} x {int(resolution[1]*scale)} pixels"
             else:
                 output_resolution = f"{int(resolution[0]*scale)} x {int(resolution[1]*scale)} pixels"
-            # Calculate estimated size
-            estimated_size = self.image_processor.estimate_png_size(
-                img, optimize, scale
+            # Calculate estimated size by compressing sampled row bands with the current settings
+            # (from the reduced copy of an oversized page, so only roughly)
+            settings = self.get_preview_settings(img)
+            estimate = self.image_processor.estimate_png_size_range(
+                img, optimize, settings['scale_factor'],
+                target_resolution=settings['target_resolution'],
+                fill_mode=settings['fill_mode'],
+                color_mode=settings['color_mode'],
+                dither_method=settings['dither_method'],
+                tone_mapping=settings['tone_mapping'],
+                window=settings['window'],
+                quantize_method=settings['quantize_method'],
+                interlace=settings['interlace'],
+                filter_method=settings['filter_method'],
+                compression_preset=settings['compression_preset'],
+                resample_method=settings['resample_method']
             )
+            estimated_size = estimate['estimate']
+            estimated_text = self.image_processor.format_size(estimated_size)
+            if estimate['low'] != estimate['high']:
+                estimated_text += (f" ({self.image_processor.format_size(estimate['low'])}"
+                                   f" - {self.image_processor.format_size(estimate['high'])})")
             # Calculate compression ratio
             compression_ratio = estimated_size / input_size
-            self.logger.info(f"Estimated output size: {self.image_processor.format_size(estimated_size)} "
+            self.logger.info(f"Estimated output size: {estimated_text} "
                            f"(Compression ratio: {compression_ratio:.1f}x)")
             # Update info frame
             self.info_frame.update_output_info(
                 self.output_path_var.get(),
-                self.image_processor.format_size(estimated_size),
+                estimated_text,
                 output_resolution,
                 compression_ratio
             )
@@ -326,11 +489,78 @@ class TIFFtoPNGConverter:
 
     def start_conversion(self):
         """Start the conversion process"""
+        if self.job_queue.is_busy():
+            self.logger.warning("A conversion is already running")
+            messagebox.showwarning("Warning", "A conversion is already running")
+            return
         if self.mode_var.get() == "single":
             self.convert_single_file()
         else:
             self.convert_batch_files()
 
+    def set_conversion_running(self, running):
+        """Enable or disable the conversion controls"""
+        self.convert_button.state(['disabled' if running else '!disabled'])
+        self.pause_button.state(['!disabled' if running else 'disabled'])
+        self.cancel_button.state(['!disabled' if running else 'disabled'])
+        self.pause_button.configure(text="Pause")
+        self.update_resume_state()
+
+    def update_resume_state(self):
+        """Enable Resume Batch when the batch output folder holds an interrupted batch"""
+        output_folder = self.output_path_var.get()
+        can_resume = (self.mode_var.get() == "batch" and not self.job_queue.is_busy()
+                      and bool(output_folder) and BatchJournal(output_folder).exists())
+        self.resume_batch_button.state(['!disabled' if can_resume else 'disabled'])
+
+    def resume_batch(self):
+        """Continue the interrupted batch in the output folder, skipping files that finished"""
+        if self.job_queue.is_busy():
+            self.logger.warning("A conversion is already running")
+            messagebox.showwarning("Warning", "A conversion is already running")
+            return
+        output_folder = self.output_path_var.get()
+        interrupted = BatchJournal(output_folder).load() if output_folder else None
+        if not interrupted:
+            self.logger.warning("No interrupted batch found in the output folder")
+            messagebox.showwarning("Warning", "No interrupted batch found in the output folder")
+            self.update_resume_state()
+            return
+        jobs, settings = interrupted
+        self.logger.info(f"Resuming interrupted batch of {len(jobs)} files in {output_folder}")
+        self.logger.debug(f"Conversion settings: {settings}")
+        # The batch keeps the settings it was started with, whatever the UI shows now
+        converter = self.create_batch_converter(hash_inputs=True)
+        self.status_var.set("Resuming...")
+        self.progress_var.set(0)
+        self.set_conversion_running(True)
+        self.job_queue.submit(self.run_batch_conversion, converter, jobs, settings,
+                              BatchManifest(output_folder), True,
+                              on_done=self.on_batch_conversion_done)
+
+    def toggle_pause(self):
+        """Pause or resume the running conversion"""
+        control = self.job_queue.current_control()
+        if not control:
+            return
+        if control.paused:
+            self.job_queue.resume()
+            self.pause_button.configure(text="Pause")
+            self.status_var.set("Resuming...")
+            self.logger.info("Conversion resumed")
+        else:
+            self.job_queue.pause()
+            self.pause_button.configure(text="Resume")
+            self.status_var.set("Paused")
+            self.logger.info("Conversion paused")
+
+    def cancel_conversion(self):
+        """Cancel the running conversion"""
+        if self.job_queue.is_busy():
+            self.job_queue.cancel()
+            self.status_var.set("Cancelling...")
+            self.logger.info("Cancelling conversion")
+
     def convert_single_file(self):
         """Convert a single file"""
         input_path = self.input_path_var.get()
@@ -341,48 +571,112 @@ class TIFFtoPNGConverter:
             messagebox.showwarning("Warning", "Please select input and output files")
             return
         
-        try:
-            # Get settings
-            settings = self.get_conversion_settings()
-            self.logger.info("Starting single file conversion")
-            self.logger.debug(f"Conversion settings: {settings}")
-            
-            # Process image
-            self.status_var.set("Converting...")
-            self.progress_var.set(0)
-            self.root.update()
-            
-            # Load and process image
-            self.logger.debug(f"Loading image: {input_path}")
-            img = Image.open(input_path)
-            processed_img = self.image_processor.process_image(img, **settings)
-            
-            # Save image
-            self.logger.debug(f"Saving image: {output_path}")
-            save_kwargs = {
-                'optimize': settings.get('optimize', True),
-                'interlace': settings.get('interlace', False),
-                'filter_method': settings.get('filter_method', 'auto')
-            }
-            self.image_processor.save_image(processed_img, output_path, **save_kwargs)
-            
-            # Update preview
-            self.preview_frame.update_output_preview(processed_img)
-            
-            # Update status
-            self.status_var.set("Conversion complete")
-            self.progress_var.set(100)
-            
-            self.logger.info("File converted successfully")
-            messagebox.showinfo("Success", "File converted successfully")
-            
-            # Update live output preview after conversion
-            self.update_live_output_preview(img)
-            
-        except Exception as e:
-            self.logger.error(f"Conversion failed: {str(e)}")
-            messagebox.showerror("Error", f"Conversion failed: {str(e)}")
+        # Get settings
+        settings = self.get_conversion_settings()
+        self.logger.info("Starting single file conversion")
+        self.logger.debug(f"Conversion settings: {settings}")
+        
+        self.status_var.set("Converting...")
+        self.progress_var.set(0)
+        self.set_conversion_running(True)
+        # Tk variables are read here: the worker thread must not touch them
+        threshold_mp = self.settings_frame.streaming_threshold_var.get()
+        memory_budget_mb = self.settings_frame.memory_budget_var.get()
+        collect_metrics = self.settings_frame.metrics_var.get()
+        self.job_queue.submit(self.run_single_conversion, input_path, output_path, settings,
+                              threshold_mp, memory_budget_mb, collect_metrics, on_done=self.on_single_conversion_done)
+
+    def run_single_conversion(self, control, input_path, output_path, settings, threshold_mp, memory_budget_mb,
+                              collect_metrics=False):
+        """Load, process and save a single file (runs on the worker thread)"""
+        with open_image(input_path) as header:
+            oversized = should_stream(header, threshold_mp)
+        if oversized:
+            # Too large to decode whole: convert band by band without touching the image cache
+            self.logger.info(f"Streaming large image to {output_path} in bands")
+            result = convert_file(input_path, output_path, settings,
+                                  memory_budget_mb=memory_budget_mb, streaming_threshold_mp=threshold_mp,
+                                  collect_metrics=collect_metrics)
+            self.record_metrics(result)
+            for warning in result['warnings']:
+                self.logger.warning(f"{input_path}: {warning}")
+            if not result['success']:
+                raise Exception(result['error'])
+            self.logger.info(f"Saved with '{result['compression_preset']}' preset: "
+                             f"{self.image_processor.format_size(result['bytes'])} in {result['seconds']:.2f}s")
+            # No output preview: that would mean decoding the result in full
+            return None
+        # The conversion gets its own processor so preview updates are not timed with it
+        processor = ImageProcessor()
+        if collect_metrics:
+            processor.timer = StageTimer()
+        self.logger.debug(f"Loading image: {input_path}")
+        with processor.timer.stage("decode"):
+            img = self.image_cache.get(input_path)
+            img.load()
+        control.checkpoint()
+        page_count = getattr(img, 'n_frames', 1)
+        if page_count > 1:
+            # Multi-page TIFF: stream the pages from a fresh handle so the cached image is not seeked
+            self.logger.info(f"Converting {page_count} pages to {get_page_output_path(output_path, 0).name}, ...")
+            result = convert_file(input_path, output_path, settings, memory_budget_mb=memory_budget_mb,
+                                  streaming_threshold_mp=threshold_mp, collect_metrics=collect_metrics)
+            self.record_metrics(result)
+            for page_error in result['page_errors']:
+                self.logger.error(f"Failed to convert {page_error}")
+            for warning in result['warnings']:
+                self.logger.warning(f"{input_path}: {warning}")
+            if not result['output_paths']:
+                raise Exception(result['error'])
+            self.logger.info(f"Saved {len(result['output_paths'])} of {page_count} pages with "
+                             f"'{result['compression_preset']}' preset: "
+                             f"{self.image_processor.format_size(result['bytes'])} in {result['seconds']:.2f}s")
+            # Preview the first page only
+            return self.image_processor.process_preview(img, **settings)
+        processed_img = processor.process_image(img, **settings)
+        control.checkpoint()
+        self.logger.debug(f"Saving image: {output_path}")
+        save_stats = processor.save_image(processed_img, output_path, **get_save_kwargs(settings))
+        if collect_metrics:
+            processor.timer.add_pixels(img.size[0] * img.size[1], processed_img.size[0] * processed_img.size[1])
+            result = {'input_path': input_path, 'output_path': output_path, 'success': True, 'pages': 1,
+                      'streamed_pages': 0, 'bytes': save_stats['bytes']}
+            self.record_metrics({'metrics': processor.timer.record(result, os.path.getsize(input_path))})
+        self.logger.info(f"Saved with '{save_stats['compression_preset']}' preset: "
+                         f"{self.image_processor.format_size(save_stats['bytes'])} in {save_stats['seconds']:.2f}s")
+        if save_stats['bytes_saved']:
+            self.logger.info(f"Chunk optimization saved {self.image_processor.format_size(save_stats['bytes_saved'])}")
+        return processed_img
+
+    def record_metrics(self, result):
+        """Show a conversion result's stage timings in the Logs tab, if it has any"""
+        if 'metrics' in result:
+            self.call_on_ui(self.settings_frame.add_metrics_row, result['metrics'])
+
+    def on_single_conversion_done(self, processed_img, error):
+        """Report the result of a single file conversion (runs on the Tk thread)"""
+        self.set_conversion_running(False)
+        self.settings_frame.update_cache_stats(self.image_cache.stats())
+        if isinstance(error, JobCancelled):
+            self.logger.info("Conversion cancelled")
+            self.status_var.set("Conversion cancelled")
+            return
+        if error:
+            self.logger.error(f"Conversion failed: {str(error)}")
+            messagebox.showerror("Error", f"Conversion failed: {str(error)}")
             self.status_var.set("Conversion failed")
+            return
+        
+        # Update preview (streamed conversions of very large images have none)
+        if processed_img is not None:
+            self.preview_frame.update_output_preview(processed_img)
+        
+        # Update status
+        self.status_var.set("Conversion complete")
+        self.progress_var.set(100)
+        
+        self.logger.info("File converted successfully")
+        messagebox.showinfo("Success", "File converted successfully")
 
     def convert_batch_files(self):
         """Convert multiple files in batch mode"""
@@ -412,67 +706,141 @@ class TIFFtoPNGConverter:
             self.logger.info(f"Starting batch conversion of {len(tiff_files)} files")
             self.logger.debug(f"Conversion settings: {settings}")
             
-            # Start conversion
+            # Fan the files out over the worker pool; only incremental runs need content hashes
+            converter = self.create_batch_converter(hash_inputs=self.incremental_var.get())
+            # Every batch is recorded in the output folder's manifest so later runs can be incremental
+            manifest = BatchManifest(output_folder)
+            # Files from subfolders go to the matching subfolders of the output folder
+            jobs = converter.build_jobs(tiff_files, output_folder, self.batch_root_var.get(),
+                                        input_root=input_folder if self.recursive_var.get() else None,
+                                        manifest=manifest)
+            self.logger.debug(f"Using {converter.max_workers} worker process(es)")
+            
+            # Start conversion on the worker thread
             self.status_var.set("Converting...")
             self.progress_var.set(0)
-            self.root.update()
-            
-            # Process each file
-            successful = 0
-            failed = 0
-            
-            for i, file_path in enumerate(tiff_files):
-                try:
-                    # Generate output filename
-                    root_name = self.batch_root_var.get()
-                    output_name = f"{root_name}_{i+1:02d}.png"
-                    output_path = Path(output_folder) / output_name
-                    
-                    self.logger.debug(f"Converting file {i+1}/{len(tiff_files)}: {file_path}")
-                    
-                    # Load and process image
-                    img = Image.open(file_path)
-                    processed_img = self.image_processor.process_image(img, **settings)
-                    
-                    # Save image
-                    self.logger.debug(f"Saving image: {output_path}")
-                    save_kwargs = {
-                        'optimize': settings.get('optimize', True),
-                        'interlace': settings.get('interlace', False),
-                        'filter_method': settings.get('filter_method', 'auto')
-                    }
-                    self.image_processor.save_image(processed_img, output_path, **save_kwargs)
-                    
-                    successful += 1
-                    self.logger.debug(f"Successfully converted: {output_path}")
-                    
-                except Exception as e:
-                    self.logger.error(f"Failed to convert {file_path}: {str(e)}")
-                    failed += 1
-                
-                # Update progress
-                progress = (i + 1) / len(tiff_files) * 100
-                self.progress_var.set(progress)
-                self.status_var.set(f"Converting... ({i+1}/{len(tiff_files)})")
-                self.root.update()
-            
-            # Show completion message
-            if failed == 0:
-                self.logger.info(f"Batch conversion completed successfully: {successful} files converted")
-                messagebox.showinfo("Success", f"Successfully converted {successful} files")
-            else:
-                self.logger.warning(f"Batch conversion completed with {failed} failures: {successful} files converted")
-                messagebox.showwarning("Warning",
-                                     f"Conversion complete with {failed} failures\n"
-                                     f"Successfully converted {successful} files")
-            
-            self.status_var.set("Batch conversion complete")
+            self.set_conversion_running(True)
+            self.job_queue.submit(self.run_batch_conversion, converter, jobs, settings,
+                                  manifest, self.incremental_var.get(),
+                                  on_done=self.on_batch_conversion_done)
             
         except Exception as e:
             self.logger.error(f"Batch conversion failed: {str(e)}")
             messagebox.showerror("Error", f"Batch conversion failed: {str(e)}")
             self.status_var.set("Batch conversion failed")
 
+    def create_batch_converter(self, hash_inputs=False):
+        """Create a BatchConverter from the Performance settings"""
+        return BatchConverter(max_workers=self.settings_frame.workers_var.get(), hash_inputs=hash_inputs,
+                              memory_budget_mb=self.settings_frame.memory_budget_var.get(),
+                              streaming_threshold_mp=self.settings_frame.streaming_threshold_var.get(),
+                              collect_metrics=self.settings_frame.metrics_var.get())
+
+    def run_batch_conversion(self, control, converter, jobs, settings, manifest, incremental=False):
+        """Convert batch jobs and stream progress back to the UI (runs on the worker thread).
+
+        The full job list is checkpointed in the output folder's batch journal,
+        and each finished file in the manifest, so an interrupted batch can be
+        resumed. The journal is removed once the batch runs to the end.
+        """
+        if settings['color_mode'] == "P" and settings.get('palette_scope') == "batch" and not settings.get('palette'):
+            self.call_on_ui(self.status_var.set, "Building shared palette...")
+            settings = dict(settings, palette=converter.build_shared_palette([job[0] for job in jobs], settings))
+        fingerprint = settings_fingerprint(settings)
+        journal = BatchJournal(os.path.dirname(manifest.path))
+        journal.save(jobs, settings)
+        if incremental:
+            self.call_on_ui(self.status_var.set, "Checking for changed files...")
+            jobs = list(manifest.pending_jobs(jobs, fingerprint))
+            self.logger.info(f"Incremental mode: {manifest.skipped} up-to-date files skipped, "
+                             f"{len(jobs)} to convert")
+        counts = {'successful': 0, 'failed': 0, 'total': len(jobs), 'cancelled': False,
+                  'skipped': manifest.skipped, 'bytes': 0, 'bytes_saved': 0, 'seconds': 0.0,
+                  'compression_preset': settings['compression_preset']}
+        try:
+            for i, result in enumerate(converter.convert(jobs, settings, control)):
+                self.record_metrics(result)
+                counts['bytes'] += result['bytes']
+                counts['bytes_saved'] += result['bytes_saved']
+                counts['seconds'] += result['seconds']
+                pages = f", {result['pages']} pages" if result['pages'] > 1 else ""
+                if result['streamed_pages']:
+                    pages += ", streamed"
+                if result['bytes_saved']:
+                    pages += f", {self.image_processor.format_size(result['bytes_saved'])} saved by chunk optimization"
+                if result['success']:
+                    counts['successful'] += 1
+                    manifest.record(result, fingerprint)
+                    self.logger.debug(f"Successfully converted: {result['output_path']} "
+                                      f"({self.image_processor.format_size(result['bytes'])}{pages}, "
+                                      f"saved in {result['seconds']:.2f}s)")
+                else:
+                    counts['failed'] += 1
+                    self.logger.error(f"Failed to convert {result['input_path']}: {result['error']}")
+                for warning in result['warnings']:
+                    self.logger.warning(f"{result['input_path']}: {warning}")
+                self.call_on_ui(self.update_batch_progress, i + 1, len(jobs), control.paused)
+        except JobCancelled:
+            counts['cancelled'] = True
+        if not counts['cancelled']:
+            journal.clear()
+        return counts
+
+    def update_batch_progress(self, completed, total, paused=False):
+        """Update the progress bar and status label (runs on the Tk thread)"""
+        self.progress_var.set(completed / total * 100)
+        if paused:
+            self.status_var.set(f"Paused ({completed}/{total})")
+        else:
+            self.status_var.set(f"Converting... ({completed}/{total})")
+
+    def on_batch_conversion_done(self, counts, error):
+        """Report the batch summary (runs on the Tk thread)"""
+        self.set_conversion_running(False)
+        if isinstance(error, JobCancelled):
+            self.logger.info("Batch conversion cancelled before it started")
+            self.status_var.set("Batch conversion cancelled")
+            return
+        if error:
+            self.logger.error(f"Batch conversion failed: {str(error)}")
+            messagebox.showerror("Error", f"Batch conversion failed: {str(error)}")
+            self.status_var.set("Batch conversion failed")
+            return
+        
+        successful = counts['successful']
+        failed = counts['failed']
+        skipped = f", {counts['skipped']} up to date and skipped" if counts['skipped'] else ""
+        if successful:
+            self.logger.info(f"'{counts['compression_preset']}' preset: "
+                             f"{self.image_processor.format_size(counts['bytes'])} written, "
+                             f"{counts['seconds']:.2f}s total save time "
+                             f"({counts['seconds'] / successful:.2f}s per file)")
+            if counts['bytes_saved']:
+                self.logger.info(f"Chunk optimization saved "
+                                 f"{self.image_processor.format_size(counts['bytes_saved'])}")
+        if counts['cancelled']:
+            self.logger.warning(f"Batch conversion cancelled: {successful} of {counts['total']} files converted, "
+                                f"{failed} failures{skipped}")
+            messagebox.showwarning("Cancelled",
+                                   f"Conversion cancelled\n"
+                                   f"Successfully converted {successful} of {counts['total']} files\n"
+                                   f"Use Resume Batch to continue later")
+            self.status_var.set("Batch conversion cancelled")
+            return
+        
+        # Show completion message
+        if failed == 0:
+            self.logger.info(f"Batch conversion completed successfully: {successful} files converted{skipped}")
+            messagebox.showinfo("Success", f"Successfully converted {successful} files{skipped}")
+        else:
+            self.logger.warning(f"Batch conversion completed with {failed} failures: "
+                                f"{successful} files converted{skipped}")
+            messagebox.showwarning("Warning",
+                                 f"Conversion complete with {failed} failures\n"
+                                 f"Successfully converted {successful} files{skipped}")
+        
+        self.status_var.set("Batch conversion complete")
+
     def get_conversion_settings(self):
         selected = self.settings_frame.resolution_var.get()
         standard_res = self.image_processor.standard_resolutions
@@ -493,26 +861,34 @@ class TIFFtoPNGConverter:
             'optimize': self.settings_frame.optimize_var.get(),
             'color_mode': self.settings_frame.color_mode_var.get(),
             'dither_method': self.settings_frame.dither_var.get(),
+            'tone_mapping': self.settings_frame.tone_mapping_var.get(),
+            'window': self.settings_frame.get_window(),
+            'quantize_method': self.settings_frame.quantize_method_var.get(),
+            'palette_scope': "batch" if self.settings_frame.shared_palette_var.get() else "file",
             'filter_method': self.settings_frame.filter_var.get(),
-            'interlace': self.settings_frame.interlace_var.get()
+            'resample_method': self.settings_frame.resample_var.get(),
+            'interlace': self.settings_frame.interlace_var.get(),
+            'chunk_optimize': self.settings_frame.chunk_optimize_var.get(),
+            'compression_preset': self.settings_frame.compression_preset_var.get()
         }
 
     def on_path_change(self, *args):
         """Update info and preview when input or output path changes"""
         input_path = self.input_path_var.get()
         output_path = self.output_path_var.get()
+        self.update_resume_state()
         if input_path:
             try:
-                img = Image.open(input_path)
+                img = self.load_image(input_path)
                 file_size = os.path.getsize(input_path)
                 self.info_frame.update_input_info(
                     input_path,
                     self.image_processor.format_size(file_size),
-                    img.size
+                    get_source_size(img)
                 )
                 # Calculate crop box if fill mode is enabled and target_resolution is set
                 crop_box = None
-                settings = self.get_conversion_settings()
+                settings = self.get_preview_settings(img)
                 if settings['fill_mode'] and settings['target_resolution']:
                     img_w, img_h = img.size
                     target_w, target_h = settings['target_resolution']
@@ -543,12 +919,17 @@ class TIFFtoPNGConverter:
             self.info_frame.update_output_info(None, None, None)
             self.preview_frame.update_output_preview(None)
 
-    def update_live_output_preview(self, img):
+    def update_live_output_preview(self, img, full_resolution=False):
         """Show a live preview of the output image with current settings"""
         try:
-            settings = self.get_conversion_settings()
-            self.logger.debug(f"Processing image for live output preview with settings: {settings}")
-            processed_img = self.image_processor.process_image(img, **settings)
+            settings = self.get_preview_settings(img)
+            if full_resolution:
+                self.logger.debug(f"Processing full-resolution output preview with settings: {settings}")
+                processed_img = self.image_processor.process_image(img, **settings)
+            else:
+                self.logger.debug(f"Processing proxy for live output preview with settings: {settings}")
+                proxy = self.get_preview_proxy(img, settings)
+                processed_img = self.image_processor.process_preview(img, proxy=proxy, **settings)
             if processed_img is None:
                 self.logger.error("Processed image is None in live output preview.")
             self.preview_frame.update_output_preview(processed_img)
@@ -556,17 +937,53 @@ class TIFFtoPNGConverter:
             self.logger.error(f"Error updating live output preview: {str(e)}")
             self.preview_frame.update_output_preview(None)
 
+    def get_preview_proxy(self, img, settings):
+        """Return a downsampled proxy of img for the live preview, reusing the last one if possible"""
+        geometry = (settings['scale_factor'], settings['target_resolution'], settings['fill_mode'])
+        factor = self.image_processor.get_proxy_factor(img.size, *geometry)
+        if factor >= 1.0:
+            return None
+        key = geometry + (settings['resample_method'],)
+        cached = self.preview_proxy
+        if cached and cached[0] is img and cached[1] == key:
+            return cached[2]
+        proxy = self.image_processor.create_proxy(img, *geometry, factor=factor,
+                                                  resample_method=settings['resample_method'])
+        self.preview_proxy = (img, key, proxy)
+        return proxy
+
+    def show_full_resolution_preview(self):
+        """Render the output preview from the full-resolution pipeline on demand"""
+        input_path = self.input_path_var.get()
+        if not input_path:
+            return
+        try:
+            img = self.load_image(input_path)
+            if get_source_size(img) != img.size:
+                # Rendering the full output would mean decoding the page whole
+                self.logger.info("The image is above the streaming threshold; "
+                                 "its preview is rendered from a reduced copy")
+                self.update_live_output_preview(img)
+                return
+            self.status_var.set("Rendering full-resolution preview...")
+            self.root.update()
+            self.update_live_output_preview(img, full_resolution=True)
+            self.status_var.set("Ready")
+        except Exception as e:
+            self.logger.error(f"Error rendering full-resolution preview: {str(e)}")
+            self.status_var.set("Ready")
+
     def on_settings_change(self, *args):
         """Update info and preview when any settings variable changes"""
         input_path = self.input_path_var.get()
         output_path = self.output_path_var.get()
         if input_path and output_path:
             try:
-                img = Image.open(input_path)
+                img = self.load_image(input_path)
                 file_size = os.path.getsize(input_path)
                 # Calculate crop box if fill mode is enabled and target_resolution is set
                 crop_box = None
-                settings = self.get_conversion_settings()
+                settings = self.get_preview_settings(img)
                 if settings['fill_mode'] and settings['target_resolution']:
                     img_w, img_h = img.size
                     target_w, target_h = settings['target_resolution']
@@ -615,18 +1032,45 @@ class TIFFtoPNGConverter:
         """Callback when the crop box is moved. Update the output preview live."""
         try:
             if self.preview_frame.last_image and crop_box:
-                # Crop the image to the new box and update output preview
-                cropped = self.preview_frame.last_image.crop(tuple(map(int, crop_box)))
-                # Optionally, apply any scaling or processing as in live preview
-                self.preview_frame.update_output_preview(cropped)
+                # Render only the crop region at preview size; the full-resolution
+                # result is computed when the file is converted
+                start = time.perf_counter()
+                pyramid = self.get_preview_pyramid(self.preview_frame.last_image)
+                processed_img = self.image_processor.process_crop_preview(
+                    pyramid, crop_box, **self.get_preview_settings(self.preview_frame.last_image))
+                self.preview_frame.update_output_preview(processed_img)
+                self.logger.debug(f"Crop preview rendered in {(time.perf_counter() - start) * 1000:.1f} ms")
         except Exception as e:
             self.logger.error(f"Error updating output preview on crop: {str(e)}")
             self.preview_frame.update_output_preview(None)
 
+    def get_preview_pyramid(self, img):
+        """Return the resolution pyramid for img, reusing the last one if it is for the same image"""
+        if self.preview_pyramid is None or self.preview_pyramid.source is not img:
+            self.preview_pyramid = ImagePyramid(img)
+        return self.preview_pyramid
+
+    def call_on_ui(self, func, *args):
+        """Run func(*args) on the Tk thread (safe to call from any thread)"""
+        self.ui_calls.put((func, args))
+
+    def poll_ui_calls(self, interval_ms=20):
+        """Run the callbacks queued by background threads (runs on the Tk thread)"""
+        # Schedule the next poll first so a failing callback does not stop the polling
+        self.root.after(interval_ms, self.poll_ui_calls)
+        while True:
+            try:
+                func, args = self.ui_calls.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
+
     def run(self):
         """Start the application"""
         self.root.mainloop()
 
 if __name__ == "__main__":
+    # Required for worker processes in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
     app = TIFFtoPNGConverter()
     app.run() 
\ No newline at end of file
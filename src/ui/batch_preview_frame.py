@@ -1,11 +1,23 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
+from pathlib import Path
+import os
+from PIL import ImageTk
+
+from core.file_selection import FileSelection
+from core.thumbnail_cache import ThumbnailCache, ThumbnailLoader
 
 class BatchPreviewFrame(ttk.Frame):
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, call_on_ui, thumbnail_cache=None, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.parent = parent
+        # call_on_ui(func, *args) runs func on the Tk thread; thumbnails load on other threads
+        self.call_on_ui = call_on_ui
+        self.thumbnail_cache = thumbnail_cache or ThumbnailCache()
+        self.thumbnail_loader = ThumbnailLoader(self.thumbnail_cache)
+        self.thumbnail_size = (140, 105)
+        self.grid_generation = 0
+        self.preview_slots = {}  # file index -> (canvas, label, canvas window id)
         
         # Configure grid
         self.grid_columnconfigure(0, weight=1)
@@ -44,40 +56,75 @@ class BatchPreviewFrame(ttk.Frame):
         self.preview_images = []
         self.current_page = 0
         self.images_per_page = 12  # 2x6 grid
-        self.batch_files = []
-        self.checkbox_vars = []  # Store BooleanVars for checkboxes
+        self.batch_files = []  # Path strings; Path objects are only built for visible files
+        self.selection = FileSelection()
+        self.checkbox_vars = []  # BooleanVars for the visible checkboxes only
+        self.listing = False  # True while files are still being streamed in
 
     def update_preview(self, batch_files):
         """Update the batch preview with new files"""
-        self.batch_files = batch_files
+        self.begin_listing()
+        self.add_files(batch_files)
+        self.finish_listing()
+
+    def begin_listing(self):
+        """Clear the preview before files are streamed in with add_files"""
+        self.batch_files = []
+        self.selection = FileSelection()
         self.current_page = 0
-        # Reset checkbox vars for new batch
-        self.checkbox_vars = [tk.BooleanVar(value=True) for _ in batch_files]
+        self.listing = True
+        # Re-validate thumbnails against the files on disk for the new batch
+        self.thumbnail_cache.clear_memory()
         self.update_grid()
 
+    def add_files(self, files):
+        """Append files to the batch, redrawing the grid only if the current page changes"""
+        if not files:
+            return
+        page_end = (self.current_page + 1) * self.images_per_page
+        page_was_full = len(self.batch_files) >= page_end
+        self.batch_files.extend(str(f) for f in files)
+        self.selection.extend(len(files))
+        if page_was_full:
+            self.update_navigation()
+        else:
+            self.update_grid()
+
+    def finish_listing(self):
+        """Mark the listing as complete"""
+        self.listing = False
+        self.update_navigation()
+
+    def update_navigation(self):
+        """Update the page label and navigation buttons"""
+        total_pages = max(1, (len(self.batch_files) + self.images_per_page - 1) // self.images_per_page)
+        suffix = "+" if self.listing else ""
+        self.page_info_var.set(f"Page {self.current_page + 1} of {total_pages}{suffix}")
+        self.prev_page_btn.state(['!disabled' if self.current_page > 0 else 'disabled'])
+        self.next_page_btn.state(['!disabled' if self.current_page < total_pages - 1 else 'disabled'])
+
     def update_grid(self):
         """Update the preview grid"""
+        self.update_navigation()
         # Clear existing preview labels
         for widget in self.grid_frame.winfo_children():
             widget.destroy()
         self.preview_images = []  # Clear previous image references
+        self.preview_slots = {}
+        self.checkbox_vars = []
+        # Thumbnails that arrive for an older page are ignored
+        self.grid_generation += 1
         if not self.batch_files:
             return
         
         # Set tighter preview size
-        preview_width, preview_height = 140, 105
+        preview_width, preview_height = self.thumbnail_size
         cols = 2
         rows = 6
         # Calculate start and end indices for current page
         start_idx = self.current_page * self.images_per_page
         end_idx = min(start_idx + self.images_per_page, len(self.batch_files))
-        # Update page info
-        total_pages = (len(self.batch_files) + self.images_per_page - 1) // self.images_per_page
-        self.page_info_var.set(f"Page {self.current_page + 1} of {total_pages}")
-        # Enable/disable navigation buttons
-        self.prev_page_btn.state(['!disabled' if self.current_page > 0 else 'disabled'])
-        self.next_page_btn.state(['!disabled' if self.current_page < total_pages - 1 else 'disabled'])
-        # Create grid of previews
+        # Create grid of previews; only the visible page gets widgets
         for i, tiff_file in enumerate(self.batch_files[start_idx:end_idx]):
             row = i % rows
             col = i // rows
@@ -89,32 +136,73 @@ class BatchPreviewFrame(ttk.Frame):
             # Create canvas for preview and checkbox overlay
             canvas = tk.Canvas(preview_frame, width=preview_width, height=preview_height, highlightthickness=0)
             canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-            # Create label for preview
-            preview_label = ttk.Label(canvas)
-            canvas.create_window(0, 0, anchor=tk.NW, window=preview_label)
+            # Create label for preview, showing a placeholder until the thumbnail arrives
+            preview_label = ttk.Label(canvas, text="Loading...")
+            window_id = canvas.create_window(preview_width // 2, preview_height // 2,
+                                             anchor=tk.CENTER, window=preview_label)
             # Add checkbox for selection (positioned in top-left corner)
             file_idx = start_idx + i
-            cb_var = self.checkbox_vars[file_idx]
+            cb_var = tk.BooleanVar(value=self.selection[file_idx])
+            cb_var.trace_add('write', lambda *args, idx=file_idx, var=cb_var: self.selection.__setitem__(idx, var.get()))
+            self.checkbox_vars.append(cb_var)
             checkbox = ttk.Checkbutton(canvas, variable=cb_var)
             canvas.create_window(5, 5, anchor=tk.NW, window=checkbox)
             # Add filename label
-            filename_label = ttk.Label(preview_frame, text=tiff_file.name, wraplength=preview_width)
+            filename_label = ttk.Label(preview_frame, text=os.path.basename(tiff_file), wraplength=preview_width)
             filename_label.grid(row=1, column=0, pady=(2, 0))
-            try:
-                # Load and resize image for preview
-                with Image.open(tiff_file) as img:
-                    # Fit image inside preview box, maintaining aspect ratio
-                    img.thumbnail((preview_width, preview_height), Image.Resampling.LANCZOS)
-                    # Center image in the canvas
-                    img_w, img_h = img.size
-                    x = (preview_width - img_w) // 2
-                    y = (preview_height - img_h) // 2
-                    photo = ImageTk.PhotoImage(img)
-                    self.preview_images.append(photo)  # Keep reference
-                    preview_label.configure(image=photo)
-                    canvas.coords(canvas.create_window(x, y, anchor=tk.NW, window=preview_label), x, y)
-            except Exception as e:
-                preview_label.configure(text=f"Error loading preview:\n{str(e)}")
+            self.preview_slots[file_idx] = (canvas, preview_label, window_id)
+            
+            # Paint immediately if the thumbnail is in memory, otherwise load it in the background
+            if self.thumbnail_cache.contains(tiff_file, self.thumbnail_size):
+                self._paint_thumbnail(self.grid_generation, file_idx,
+                                      self.thumbnail_cache.get(tiff_file, self.thumbnail_size), None)
+            else:
+                self._request_thumbnail(file_idx, tiff_file)
+        
+        self._prefetch_neighbours(start_idx, end_idx)
+
+    def _request_thumbnail(self, file_idx, tiff_file):
+        """Load a thumbnail on the loader pool and paint it on the Tk thread when ready"""
+        generation = self.grid_generation
+        def on_loaded(path, thumb, error):
+            self.call_on_ui(self._paint_thumbnail, generation, file_idx, thumb, error)
+        self.thumbnail_loader.request(tiff_file, self.thumbnail_size, on_loaded)
+
+    def _paint_thumbnail(self, generation, file_idx, thumb, error):
+        """Show a loaded thumbnail (or its error) in its canvas if it is still visible"""
+        if generation != self.grid_generation or file_idx not in self.preview_slots:
+            return
+        canvas, preview_label, window_id = self.preview_slots[file_idx]
+        try:
+            if error:
+                raise error
+            preview_width, preview_height = self.thumbnail_size
+            # Center image in the canvas
+            img_w, img_h = thumb.size
+            x = (preview_width - img_w) // 2
+            y = (preview_height - img_h) // 2
+            photo = ImageTk.PhotoImage(thumb)
+            self.preview_images.append(photo)  # Keep reference
+            preview_label.configure(image=photo, text="")
+            canvas.itemconfigure(window_id, anchor=tk.NW)
+            canvas.coords(window_id, x, y)
+        except Exception as e:
+            preview_label.configure(text=f"Error loading preview:\n{str(e)}", wraplength=self.thumbnail_size[0])
+
+    def _prefetch_neighbours(self, start_idx, end_idx):
+        """Warm the cache for the previous and next pages and cancel everything else"""
+        prefetch_start = max(0, start_idx - self.images_per_page)
+        prefetch_end = min(len(self.batch_files), end_idx + self.images_per_page)
+        wanted = self.batch_files[prefetch_start:prefetch_end]
+        self.thumbnail_loader.cancel_except(wanted)
+        # Next page first, since paging forward is the common case
+        for tiff_file in self.batch_files[end_idx:prefetch_end] + self.batch_files[prefetch_start:start_idx]:
+            if not self.thumbnail_cache.contains(tiff_file, self.thumbnail_size):
+                self.thumbnail_loader.request(tiff_file, self.thumbnail_size)
+
+    def destroy(self):
+        self.thumbnail_loader.shutdown()
+        super().destroy()
 
     def prev_page(self):
         """Go to previous page of previews"""
@@ -124,21 +212,23 @@ class BatchPreviewFrame(ttk.Frame):
 
     def next_page(self):
         """Go to next page of previews"""
-        total_pages = (len(self.batch_files) + self.images_per_page - 1) // self.images_per_page
+        total_pages = max(1, (len(self.batch_files) + self.images_per_page - 1) // self.images_per_page)
         if self.current_page < total_pages - 1:
             self.current_page += 1
             self.update_grid()
 
     def get_selected_files(self):
         """Return a list of batch_files that are checked for conversion"""
-        return [f for f, var in zip(self.batch_files, self.checkbox_vars) if var.get()]
+        return [Path(f) for f in self.selection.filter(self.batch_files)]
 
     def select_all(self):
         """Check all checkboxes"""
+        self.selection.set_all(True)
         for var in self.checkbox_vars:
             var.set(True)
 
     def deselect_all(self):
         """Uncheck all checkboxes"""
+        self.selection.set_all(False)
         for var in self.checkbox_vars:
-            var.set(False) 
\ No newline at end of file
+            var.set(False)
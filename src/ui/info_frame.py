@@ -49,7 +49,9 @@ class InfoFrame(ttk.LabelFrame):
                           "Format: Width x Height pixels")
         self.create_tooltip(self.estimated_size_label,
                           "Estimated size of the output PNG file\n"
-                          "based on current settings")
+                          "based on current settings.\n"
+                          "Sampled tiles are compressed with the chosen\n"
+                          "settings; the range in brackets is the likely band.")
         self.create_tooltip(self.compression_ratio_label,
                           "Ratio of output size to input size\n"
                           "Lower numbers indicate better compression")
@@ -1,20 +1,26 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
+
+# Shade drawn over the image outside the crop box
+SHADE_COLOR = 'black'
+SHADE_STIPPLE = 'gray50'
 
 class PreviewFrame(ttk.Frame):
-    def __init__(self, parent, on_crop_update=None, *args, **kwargs):
+    def __init__(self, parent, on_crop_update=None, on_full_preview=None, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.parent = parent
         self.on_crop_update = on_crop_update
+        self.on_full_preview = on_full_preview
         self.crop_box = None  # (left, top, right, bottom) in original image coordinates
         self.dragging = False
         self.drag_offset = (0, 0)
         self.image_size = None
         self.last_image = None
         self.preview_image = None  # Store the base preview image without crop box
+        self._preview_scale = 1.0  # Preview pixels per original image pixel
         self.resize_handle = None  # Current handle being dragged (None, 'nw', 'ne', 'sw', 'se')
-        self.handle_size = 8  # Size of resize handles in pixels
+        self.handle_size = 8  # Size of resize handles in screen pixels
         self.move_step = 5  # Pixels to move with arrow keys
         
         # Configure grid for vertical stacking
@@ -23,14 +29,17 @@ class PreviewFrame(ttk.Frame):
         self.grid_rowconfigure(1, weight=1)
         self.grid_rowconfigure(2, weight=0)
         self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(4, weight=0)
         
         # Input preview label
         self.input_label = ttk.Label(self, text="Input Preview")
         self.input_label.grid(row=0, column=0, pady=(5, 0))
         
-        # Input preview image
-        self.input_preview_label = ttk.Label(self, text="No image selected")
-        self.input_preview_label.grid(row=1, column=0, padx=5, pady=5, sticky=(tk.W, tk.E, tk.N, tk.S))
+        # Input preview canvas: the preview is one image item and the crop overlay is vector
+        # items on top of it, so moving the crop box only moves items and never redraws pixels
+        self.input_canvas = tk.Canvas(self, width=400, height=40, highlightthickness=0, takefocus=1)
+        self.input_canvas.grid(row=1, column=0, padx=5, pady=5)
+        self._create_canvas_items()
         
         # Output preview label
         self.output_label = ttk.Label(self, text="Output Preview")
@@ -40,63 +49,79 @@ class PreviewFrame(ttk.Frame):
         self.output_preview_label = ttk.Label(self, text="No output yet")
         self.output_preview_label.grid(row=3, column=0, padx=5, pady=5, sticky=(tk.W, tk.E, tk.N, tk.S))
         
+        # Live output preview uses a reduced-resolution proxy; allow a full render on demand
+        self.full_preview_button = ttk.Button(self, text="Full Resolution Preview",
+                                              command=self._on_full_preview)
+        self.full_preview_button.grid(row=4, column=0, pady=(0, 5))
+        
         # Store PhotoImage objects
         self.input_photo = None
         self.output_photo = None
         
         # Mouse event bindings for crop box
-        self.input_preview_label.bind('<Button-1>', self._on_mouse_down)
-        self.input_preview_label.bind('<B1-Motion>', self._on_mouse_drag)
-        self.input_preview_label.bind('<ButtonRelease-1>', self._on_mouse_up)
+        self.input_canvas.bind('<Button-1>', self._on_mouse_down)
+        self.input_canvas.bind('<B1-Motion>', self._on_mouse_drag)
+        self.input_canvas.bind('<ButtonRelease-1>', self._on_mouse_up)
         
         # Keyboard bindings for fine control
-        self.input_preview_label.bind('<Key>', self._on_key_press)
-        self.input_preview_label.focus_set()  # Enable keyboard focus
+        self.input_canvas.bind('<Key>', self._on_key_press)
+        self.input_canvas.focus_set()  # Enable keyboard focus
+
+    def _create_canvas_items(self):
+        """Create the preview image item and the (hidden) crop overlay items once"""
+        canvas = self.input_canvas
+        self._message_item = canvas.create_text(200, 20, text="No image selected")
+        self._image_item = canvas.create_image(0, 0, anchor=tk.NW, state=tk.HIDDEN)
+        # Stippled rectangles shade the four regions around the box; Tk on macOS ignores
+        # stipples and would paint them solid, so the shade is left off there
+        shade_state = tk.HIDDEN if self.tk.call('tk', 'windowingsystem') == 'aqua' else tk.NORMAL
+        self._shade_enabled = shade_state == tk.NORMAL
+        self._shade_items = [
+            canvas.create_rectangle(0, 0, 0, 0, fill=SHADE_COLOR, stipple=SHADE_STIPPLE, width=0,
+                                    state=tk.HIDDEN)
+            for _ in range(4)
+        ]
+        self._box_item = canvas.create_rectangle(0, 0, 0, 0, outline='red', width=2, state=tk.HIDDEN)
+        self._handle_items = {
+            handle: canvas.create_rectangle(0, 0, 0, 0, fill='white', outline='red', state=tk.HIDDEN)
+            for handle in ('nw', 'ne', 'sw', 'se')
+        }
 
     def _get_handle_at(self, x, y):
-        """Return which resize handle is at the given coordinates, or None"""
+        """Return which resize handle is at the given canvas coordinates, or None"""
         if not self.crop_box:
             return None
             
-        # Convert to preview coordinates
-        px = int(x / self._preview_scale)
-        py = int(y / self._preview_scale)
-        l, t, r, b = self.crop_box
+        # Compare in preview pixels, so the handles are as easy to grab at any zoom
+        l, t, r, b = (value * self._preview_scale for value in self.crop_box)
         
         # Check each corner
-        if abs(px - l) <= self.handle_size and abs(py - t) <= self.handle_size:
+        if abs(x - l) <= self.handle_size and abs(y - t) <= self.handle_size:
             return 'nw'
-        if abs(px - r) <= self.handle_size and abs(py - t) <= self.handle_size:
+        if abs(x - r) <= self.handle_size and abs(y - t) <= self.handle_size:
             return 'ne'
-        if abs(px - l) <= self.handle_size and abs(py - b) <= self.handle_size:
+        if abs(x - l) <= self.handle_size and abs(y - b) <= self.handle_size:
             return 'sw'
-        if abs(px - r) <= self.handle_size and abs(py - b) <= self.handle_size:
+        if abs(x - r) <= self.handle_size and abs(y - b) <= self.handle_size:
             return 'se'
         return None
 
     def _on_mouse_down(self, event):
+        self.input_canvas.focus_set()
         if not self.crop_box or not self.image_size:
             return
             
-        # Get the label's position relative to the window
-        label_x = self.input_preview_label.winfo_x()
-        label_y = self.input_preview_label.winfo_y()
-        
-        # Adjust event coordinates relative to the label
-        x = event.x - label_x
-        y = event.y - label_y
-        
-        # Convert to image coordinates
-        x = int(x / self._preview_scale)
-        y = int(y / self._preview_scale)
-        l, t, r, b = self.crop_box
-        
         # Check for resize handles first
-        self.resize_handle = self._get_handle_at(event.x - label_x, event.y - label_y)
+        self.resize_handle = self._get_handle_at(event.x, event.y)
         if self.resize_handle:
             self.dragging = True
             return
             
+        # Convert to image coordinates
+        x = int(event.x / self._preview_scale)
+        y = int(event.y / self._preview_scale)
+        l, t, r, b = self.crop_box
+            
         # Check if inside crop box
         if l <= x <= r and t <= y <= b:
             self.dragging = True
@@ -106,17 +131,9 @@ class PreviewFrame(ttk.Frame):
         if not self.dragging or not self.crop_box or not self.image_size:
             return
             
-        # Get the label's position relative to the window
-        label_x = self.input_preview_label.winfo_x()
-        label_y = self.input_preview_label.winfo_y()
-        
-        # Adjust event coordinates relative to the label
-        x = event.x - label_x
-        y = event.y - label_y
-        
         img_w, img_h = self.image_size
-        x = int(x / self._preview_scale)
-        y = int(y / self._preview_scale)
+        x = int(event.x / self._preview_scale)
+        y = int(event.y / self._preview_scale)
         
         if self.resize_handle:
             # Handle resizing
@@ -151,6 +168,10 @@ class PreviewFrame(ttk.Frame):
             if self.on_crop_update:
                 self.on_crop_update(self.crop_box)
 
+    def _on_full_preview(self):
+        if self.on_full_preview:
+            self.on_full_preview()
+
     def _on_key_press(self, event):
         """Handle keyboard controls for fine-tuning crop box position"""
         if not self.crop_box or not self.image_size:
@@ -180,84 +201,84 @@ class PreviewFrame(ttk.Frame):
             new_r = min(img_w, r + step)
             new_l = new_r - box_w
             self.crop_box = (new_l, t, new_r, b)
+        else:
+            return
             
         self._draw_crop_box()
         if self.on_crop_update:
             self.on_crop_update(self.crop_box)
 
     def _draw_crop_box(self):
-        """Draw the crop box overlay on the preview image"""
+        """Move the crop box, shade and handle items to the current crop box"""
+        canvas = self.input_canvas
         if not self.preview_image or not self.crop_box:
+            for item in self._overlay_items():
+                canvas.itemconfigure(item, state=tk.HIDDEN)
             return
             
-        # Create a copy of the preview image for drawing
-        preview_copy = self.preview_image.copy()
-        from PIL import ImageDraw
-        draw = ImageDraw.Draw(preview_copy)
-        
         # Scale crop box coordinates to preview size
-        left, top, right, bottom = self.crop_box
-        left = int(left * self._preview_scale)
-        top = int(top * self._preview_scale)
-        right = int(right * self._preview_scale)
-        bottom = int(bottom * self._preview_scale)
+        width, height = self.preview_image.size
+        left, top, right, bottom = (value * self._preview_scale for value in self.crop_box)
         
-        # Draw semi-transparent overlay
-        overlay = Image.new('RGBA', preview_copy.size, (0, 0, 0, 128))
-        draw_overlay = ImageDraw.Draw(overlay)
-        draw_overlay.rectangle([0, 0, preview_copy.size[0], preview_copy.size[1]], fill=(0, 0, 0, 128))
-        draw_overlay.rectangle([left, top, right, bottom], fill=(0, 0, 0, 0))
-        preview_copy = Image.alpha_composite(preview_copy.convert('RGBA'), overlay)
+        # Shade above, below, left of and right of the box
+        shade_boxes = [
+            (0, 0, width, top),
+            (0, bottom, width, height),
+            (0, top, left, bottom),
+            (right, top, width, bottom)
+        ]
+        for item, box in zip(self._shade_items, shade_boxes):
+            canvas.coords(item, *box)
+        canvas.coords(self._box_item, left, top, right, bottom)
         
-        # Draw the crop box
-        draw = ImageDraw.Draw(preview_copy)
-        draw.rectangle([left, top, right, bottom], outline='red', width=2)
+        # Handles at the corners
+        half = self.handle_size // 2
+        corners = {'nw': (left, top), 'ne': (right, top), 'sw': (left, bottom), 'se': (right, bottom)}
+        for handle, (x, y) in corners.items():
+            canvas.coords(self._handle_items[handle], x - half, y - half, x + half, y + half)
         
-        # Draw resize handles
-        handle_color = 'white'
-        handle_outline = 'red'
-        handle_size = int(self.handle_size * self._preview_scale)
-        
-        # Draw handles at corners
-        for x, y in [(left, top), (right, top), (left, bottom), (right, bottom)]:
-            draw.rectangle(
-                [x - handle_size//2, y - handle_size//2,
-                 x + handle_size//2, y + handle_size//2],
-                fill=handle_color, outline=handle_outline
-            )
-        
-        # Update the preview
-        photo = ImageTk.PhotoImage(preview_copy)
-        self.input_preview_label.configure(image=photo, text="")
-        self.input_photo = photo
+        for item in self._overlay_items():
+            canvas.itemconfigure(item, state=tk.NORMAL)
+
+    def _overlay_items(self):
+        shades = self._shade_items if self._shade_enabled else []
+        return shades + [self._box_item] + list(self._handle_items.values())
+
+    def _show_input_message(self, text):
+        """Replace the input preview with a text message"""
+        canvas = self.input_canvas
+        canvas.configure(width=400, height=40)
+        canvas.itemconfigure(self._image_item, image='', state=tk.HIDDEN)
+        canvas.itemconfigure(self._message_item, text=text, state=tk.NORMAL)
+        self.input_photo = None
+        self.preview_image = None
+        self._draw_crop_box()
 
     def update_input_preview(self, image, crop_box=None):
         """Update the input preview with a new image and optional crop box overlay"""
         try:
-            self.last_image = image
             if image:
+                # The preview PhotoImage is built once per source image; settings changes
+                # that only move the crop box reuse it
+                if image is not self.last_image or self.input_photo is None:
+                    self.preview_image = self.resize_image(image)
+                    self._preview_scale = min(400 / image.size[0], 400 / image.size[1])
+                    self.input_photo = ImageTk.PhotoImage(self.preview_image)
+                    canvas = self.input_canvas
+                    canvas.configure(width=self.preview_image.size[0], height=self.preview_image.size[1])
+                    canvas.itemconfigure(self._image_item, image=self.input_photo, state=tk.NORMAL)
+                    canvas.itemconfigure(self._message_item, state=tk.HIDDEN)
+                self.last_image = image
                 self.image_size = image.size
-                # Create and store the base preview image
-                self.preview_image = self.resize_image(image)
-                self._preview_scale = min(400 / image.size[0], 400 / image.size[1])
-                
-                # Draw crop box if provided
-                if crop_box:
-                    self.crop_box = crop_box
-                    self._draw_crop_box()
-                else:
-                    self.crop_box = None
-                    photo = ImageTk.PhotoImage(self.preview_image)
-                    self.input_preview_label.configure(image=photo, text="")
-                    self.input_photo = photo
+                self.crop_box = crop_box
+                self._draw_crop_box()
             else:
-                self.input_preview_label.configure(image=None, text="No image selected")
-                self.input_photo = None
-                self.preview_image = None
+                self.last_image = None
+                self.crop_box = None
+                self._show_input_message("No image selected")
         except Exception as e:
-            self.input_preview_label.configure(image=None, text=f"Error loading preview: {str(e)}")
-            self.input_photo = None
-            self.preview_image = None
+            self.last_image = None
+            self._show_input_message(f"Error loading preview: {str(e)}")
 
     def update_output_preview(self, image):
         """Update the output preview with a new image"""
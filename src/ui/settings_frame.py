@@ -1,15 +1,41 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog, ttk
+import atexit
 import logging
+import logging.handlers
+import queue
+from collections import deque
 from datetime import date
+from pathlib import Path
 import sys
 import os
 
+from core.batch_engine import default_worker_count
+from core.image_processor import DEFAULT_RESAMPLE_METHOD, RESAMPLE_METHODS
+from core.metrics import STAGES, export_metrics
+from core.png_optimizer import FILTER_STRATEGIES
+from core.streaming import DEFAULT_MEMORY_BUDGET_MB, DEFAULT_STREAMING_THRESHOLD_MP
+from core.quantization import DEFAULT_QUANTIZE_METHOD, available_methods
+from core.tone_mapping import window_is_valid
+
+MAX_METRICS_ROWS = 500
+MAX_LOG_LINES = 5000
+LOG_FLUSH_INTERVAL_MS = 100
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+def default_log_path():
+    """Return the per-user path of the rotating log file"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_STATE_HOME') or os.path.join(Path.home(), '.local', 'state')
+    return os.path.join(base, 'tiff2png', 'logs', 'tiff2png.log')
+
 class SettingsFrame(ttk.Frame):
-    def __init__(self, parent, on_settings_change=None, *args, **kwargs):
+    def __init__(self, parent, compression_presets, on_settings_change=None, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.parent = parent
         self.on_settings_change = on_settings_change
+        # Preset names offered in the Compression combobox (ImageProcessor.compression_presets)
+        self.compression_presets = list(compression_presets)
         # Add standard resolutions
         self.standard_resolutions = {
             "Custom": None,
@@ -69,6 +95,49 @@ class SettingsFrame(ttk.Frame):
         
         # Add handler to logger
         self.logger.addHandler(self.console_handler)
+        self.file_log = None  # (QueueHandler, QueueListener) while logging to a file
+
+    def on_log_file_toggle(self):
+        """Start or stop copying log records to the rotating log file"""
+        if self.log_file_var.get():
+            try:
+                self.start_file_logging(default_log_path())
+                self.logger.info(f"Writing log to {default_log_path()}")
+            except OSError as e:
+                self.log_file_var.set(False)
+                self.logger.error(f"Cannot write log file: {str(e)}")
+        else:
+            self.stop_file_logging()
+
+    def start_file_logging(self, path):
+        """Copy log records to a rotating file, written by a background thread"""
+        if self.file_log:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_FILE_MAX_BYTES,
+                                                            backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+        file_handler.setFormatter(self.console_handler.formatter)
+        # The logging call only enqueues the record; the listener thread formats and writes it
+        records = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        listener = logging.handlers.QueueListener(records, file_handler)
+        listener.start()
+        self.logger.addHandler(queue_handler)
+        self.file_log = (queue_handler, listener)
+        # The listener thread is a daemon; flush what is queued when the application exits
+        atexit.register(self.stop_file_logging)
+
+    def stop_file_logging(self):
+        """Stop writing the log file, after writing any queued records"""
+        if not self.file_log:
+            return
+        queue_handler, listener = self.file_log
+        self.file_log = None
+        self.logger.removeHandler(queue_handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        atexit.unregister(self.stop_file_logging)
 
     def init_logs_tab(self):
         """Initialize the logs tab with console"""
@@ -84,10 +153,49 @@ class SettingsFrame(ttk.Frame):
         # Configure grid weights
         self.logs_tab.grid_columnconfigure(0, weight=1)
         self.logs_tab.grid_rowconfigure(0, weight=1)
+        self.logs_tab.grid_rowconfigure(3, weight=1)
+        
+        # Clear button and log file switch
+        log_buttons = ttk.Frame(self.logs_tab)
+        log_buttons.grid(row=1, column=0, columnspan=2, pady=5)
+        clear_button = ttk.Button(log_buttons, text="Clear Logs", command=self.clear_logs)
+        clear_button.grid(row=0, column=0, padx=5)
+        log_file_check = ttk.Checkbutton(log_buttons, text="Save log to file", variable=self.log_file_var,
+                                         command=self.on_log_file_toggle)
+        log_file_check.grid(row=0, column=1, padx=5)
+        self.create_tooltip(log_file_check,
+                          f"Also write the log to {default_log_path()}\n"
+                          f"The file rotates at {LOG_FILE_MAX_BYTES // (1024 * 1024)} MB, "
+                          f"keeping {LOG_FILE_BACKUPS} old files.")
         
-        # Add clear button
-        clear_button = ttk.Button(self.logs_tab, text="Clear Logs", command=self.clear_logs)
-        clear_button.grid(row=1, column=0, columnspan=2, pady=5)
+        # Image cache statistics
+        self.cache_stats_var = tk.StringVar(value="Image cache: 0 hits, 0 misses")
+        ttk.Label(self.logs_tab, textvariable=self.cache_stats_var).grid(row=2, column=0, columnspan=2, sticky=tk.W)
+        
+        # Per-file stage timings
+        metrics_frame = ttk.LabelFrame(self.logs_tab, text="Stage Timings (seconds)", padding="5")
+        metrics_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
+        metrics_check = ttk.Checkbutton(metrics_frame, text="Record stage timings", variable=self.metrics_var)
+        metrics_check.grid(row=0, column=0, sticky=tk.W)
+        self.create_tooltip(metrics_check,
+                          "Time decode, resize, color conversion, encode, optimization and disk write\n"
+                          "for every converted file and list them below.\n"
+                          "Export writes the recorded files as CSV or JSON lines.")
+        ttk.Button(metrics_frame, text="Export...", command=self.export_metrics).grid(row=0, column=1, padx=5)
+        ttk.Button(metrics_frame, text="Clear", command=self.clear_metrics).grid(row=0, column=2)
+        columns = ("file", "pages", "mp_in", "mp_out") + STAGES + ("total", "size")
+        self.metrics_table = ttk.Treeview(metrics_frame, columns=columns, show="headings", height=6)
+        for column in columns:
+            self.metrics_table.heading(column, text=column.replace("_", " "))
+            self.metrics_table.column(column, width=140 if column == "file" else 60,
+                                      anchor=tk.W if column == "file" else tk.E, stretch=column == "file")
+        self.metrics_table.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
+        metrics_scrollbar = ttk.Scrollbar(metrics_frame, orient=tk.VERTICAL, command=self.metrics_table.yview)
+        metrics_scrollbar.grid(row=1, column=3, sticky=(tk.N, tk.S))
+        self.metrics_table.configure(yscrollcommand=metrics_scrollbar.set)
+        metrics_frame.grid_columnconfigure(0, weight=1)
+        metrics_frame.grid_rowconfigure(1, weight=1)
+        self.metrics_records = []
         
         # Add initial log message
         self.log_text.insert(tk.END, f"Log started at {date.today().strftime('%Y-%m-%d %H:%M:%S')}\n")
@@ -100,6 +208,49 @@ class SettingsFrame(ttk.Frame):
         self.log_text.insert(tk.END, f"Log cleared at {date.today().strftime('%Y-%m-%d %H:%M:%S')}\n")
         self.log_text.configure(state='disabled')
 
+    def add_metrics_row(self, record):
+        """Add one file's stage timings to the table (runs on the Tk thread)"""
+        self.metrics_records.append(record)
+        values = (os.path.basename(record['input_path']), record['pages'],
+                  f"{record['pixels_in'] / 1e6:.1f}", f"{record['pixels_out'] / 1e6:.1f}")
+        values += tuple(f"{record[f'{stage}_seconds']:.2f}" for stage in STAGES)
+        values += (f"{record['seconds']:.2f}", f"{record['bytes_out'] / 1024:.0f} KB")
+        item = self.metrics_table.insert('', tk.END, values=values)
+        # Only the latest rows stay in the table; export includes every recorded file
+        rows = self.metrics_table.get_children()
+        if len(rows) > MAX_METRICS_ROWS:
+            self.metrics_table.delete(*rows[:len(rows) - MAX_METRICS_ROWS])
+        self.metrics_table.see(item)
+
+    def clear_metrics(self):
+        """Clear the recorded stage timings"""
+        self.metrics_records = []
+        self.metrics_table.delete(*self.metrics_table.get_children())
+
+    def export_metrics(self):
+        """Save the recorded stage timings as CSV or JSON lines"""
+        if not self.metrics_records:
+            self.logger.warning("No stage timings recorded yet; enable 'Record stage timings' and convert")
+            return
+        path = filedialog.asksaveasfilename(title="Export Stage Timings", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON lines", "*.jsonl")])
+        if not path:
+            return
+        try:
+            export_metrics(self.metrics_records, path)
+            self.logger.info(f"Exported stage timings for {len(self.metrics_records)} files to {path}")
+        except Exception as e:
+            self.logger.error(f"Error exporting stage timings: {str(e)}")
+
+    def update_cache_stats(self, stats):
+        """Show image cache hit/miss counters in the logs tab"""
+        used_mb = stats['bytes'] / (1024 * 1024)
+        max_mb = stats['max_bytes'] / (1024 * 1024)
+        self.cache_stats_var.set(
+            f"Image cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['entries']} images ({used_mb:.0f}/{max_mb:.0f} MB)"
+        )
+
     def create_variables(self):
         """Create all setting variables"""
         # Basic settings
@@ -111,9 +262,22 @@ class SettingsFrame(ttk.Frame):
         # Advanced settings
         self.color_mode_var = tk.StringVar(value="auto")
         self.dither_var = tk.StringVar(value="auto")
+        self.tone_mapping_var = tk.StringVar(value="auto")
+        self.window_low_var = tk.StringVar(value="")
+        self.window_high_var = tk.StringVar(value="")
+        self.quantize_method_var = tk.StringVar(value=DEFAULT_QUANTIZE_METHOD)
+        self.shared_palette_var = tk.BooleanVar(value=False)
         self.filter_var = tk.StringVar(value="auto")
-        self.chunk_optimize_var = tk.BooleanVar(value=True)
+        self.resample_var = tk.StringVar(value=DEFAULT_RESAMPLE_METHOD)
+        self.chunk_optimize_var = tk.BooleanVar(value=False)
+        self.compression_preset_var = tk.StringVar(value="smallest")
         self.interlace_var = tk.BooleanVar(value=False)
+        # Performance settings
+        self.workers_var = tk.IntVar(value=default_worker_count())
+        self.memory_budget_var = tk.IntVar(value=DEFAULT_MEMORY_BUDGET_MB)
+        self.streaming_threshold_var = tk.IntVar(value=DEFAULT_STREAMING_THRESHOLD_MP)
+        self.metrics_var = tk.BooleanVar(value=False)
+        self.log_file_var = tk.BooleanVar(value=False)
         # Manual resolution
         self.manual_width_var = tk.IntVar(value=0)
         self.manual_height_var = tk.IntVar(value=0)
@@ -184,7 +348,7 @@ class SettingsFrame(ttk.Frame):
         
         ttk.Label(color_frame, text="Color Mode:").grid(row=0, column=0, sticky=tk.W, pady=2)
         color_mode_combo = ttk.Combobox(color_frame, textvariable=self.color_mode_var,
-                                      values=["auto", "RGB", "RGBA", "L", "P"],
+                                      values=["auto", "RGB", "RGBA", "L", "I;16", "P"],
                                       state="readonly", width=10)
         color_mode_combo.grid(row=0, column=1, padx=5, pady=2)
         color_mode_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
@@ -197,6 +361,36 @@ class SettingsFrame(ttk.Frame):
         dither_combo.grid(row=1, column=1, padx=5, pady=2)
         dither_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
         
+        # Tone mapping for 16-bit and float images
+        ttk.Label(color_frame, text="Tone Mapping:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        tone_combo = ttk.Combobox(color_frame, textvariable=self.tone_mapping_var,
+                                  values=["auto", "window", "none"],
+                                  state="readonly", width=10)
+        tone_combo.grid(row=2, column=1, padx=5, pady=2)
+        tone_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
+        ttk.Label(color_frame, text="Window:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        window_frame = ttk.Frame(color_frame)
+        window_frame.grid(row=3, column=1, sticky=tk.W, padx=5, pady=2)
+        window_low_entry = ttk.Entry(window_frame, textvariable=self.window_low_var, width=8)
+        window_low_entry.grid(row=0, column=0)
+        ttk.Label(window_frame, text="to").grid(row=0, column=1, padx=3)
+        window_high_entry = ttk.Entry(window_frame, textvariable=self.window_high_var, width=8)
+        window_high_entry.grid(row=0, column=2)
+        for entry in (window_low_entry, window_high_entry):
+            entry.bind('<Return>', lambda e: self.notify_change())
+            entry.bind('<FocusOut>', lambda e: self.notify_change())
+        
+        # Palette quantization
+        ttk.Label(color_frame, text="Quantization:").grid(row=4, column=0, sticky=tk.W, pady=2)
+        quantize_combo = ttk.Combobox(color_frame, textvariable=self.quantize_method_var,
+                                      values=list(available_methods()),
+                                      state="readonly", width=15)
+        quantize_combo.grid(row=4, column=1, padx=5, pady=2)
+        quantize_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
+        shared_palette_check = ttk.Checkbutton(color_frame, text="One palette for the whole batch",
+                                               variable=self.shared_palette_var)
+        shared_palette_check.grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
         # Compression settings
         comp_frame = ttk.LabelFrame(self.advanced_tab, text="Compression Settings", padding="5")
         comp_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
@@ -204,20 +398,55 @@ class SettingsFrame(ttk.Frame):
         # Filter method
         ttk.Label(comp_frame, text="Filter Method:").grid(row=0, column=0, sticky=tk.W, pady=2)
         filter_combo = ttk.Combobox(comp_frame, textvariable=self.filter_var,
-                                  values=["auto", "NEAREST", "BOX", "BILINEAR", "HAMMING", "BICUBIC", "LANCZOS"],
+                                  values=list(FILTER_STRATEGIES),
                                   state="readonly", width=10)
         filter_combo.grid(row=0, column=1, padx=5, pady=2)
         filter_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
         
+        # Compression preset
+        ttk.Label(comp_frame, text="Compression:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        preset_combo = ttk.Combobox(comp_frame, textvariable=self.compression_preset_var,
+                                  values=self.compression_presets,
+                                  state="readonly", width=10)
+        preset_combo.grid(row=1, column=1, padx=5, pady=2)
+        preset_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
+        
         # Chunk optimization
         chunk_check = ttk.Checkbutton(comp_frame, text="Optimize PNG Chunks",
                                     variable=self.chunk_optimize_var)
-        chunk_check.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=2)
+        chunk_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
         
         # Interlacing
         interlace_check = ttk.Checkbutton(comp_frame, text="Interlaced PNG",
                                         variable=self.interlace_var)
-        interlace_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        interlace_check.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # Performance settings
+        perf_frame = ttk.LabelFrame(self.advanced_tab, text="Performance", padding="5")
+        perf_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        ttk.Label(perf_frame, text="Worker Processes:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        workers_spin = ttk.Spinbox(perf_frame, from_=1, to=max(64, default_worker_count()),
+                                   textvariable=self.workers_var, width=5)
+        workers_spin.grid(row=0, column=1, padx=5, pady=2)
+        self.create_tooltip(workers_spin,
+                          "Number of processes used for batch conversion.\n"
+                          "Defaults to the number of CPU cores.\n"
+                          "Set to 1 to convert files one at a time.")
+        ttk.Label(perf_frame, text="Memory Budget (MB):").grid(row=1, column=0, sticky=tk.W, pady=2)
+        budget_spin = ttk.Spinbox(perf_frame, from_=64, to=65536, increment=64,
+                                  textvariable=self.memory_budget_var, width=7)
+        budget_spin.grid(row=1, column=1, padx=5, pady=2)
+        self.create_tooltip(budget_spin,
+                          "Approximate peak memory per worker when streaming very large images.\n"
+                          "Lower it if workers run out of memory.")
+        ttk.Label(perf_frame, text="Stream Above (MP):").grid(row=2, column=0, sticky=tk.W, pady=2)
+        threshold_spin = ttk.Spinbox(perf_frame, from_=1, to=100000, increment=10,
+                                     textvariable=self.streaming_threshold_var, width=7)
+        threshold_spin.grid(row=2, column=1, padx=5, pady=2)
+        self.create_tooltip(threshold_spin,
+                          "Pages with more megapixels than this are converted band by band\n"
+                          "instead of being decoded whole. Interlacing is not applied to them.\n"
+                          "Works with uncompressed, PackBits and Deflate TIFFs.")
         
         # Manual resolution entry fields
         manual_res_frame = ttk.LabelFrame(self.advanced_tab, text="Manual Output Resolution", padding="5")
@@ -239,6 +468,17 @@ class SettingsFrame(ttk.Frame):
                           "the selected or manual resolution. When disabled, the image will be\n"
                           "scaled to fit within the resolution while maintaining\n"
                           "its aspect ratio.")
+        # Resampling kernel used when scaling
+        ttk.Label(manual_res_frame, text="Resampling:").grid(row=2, column=0, sticky=tk.W, padx=5)
+        resample_combo = ttk.Combobox(manual_res_frame, textvariable=self.resample_var,
+                                      values=list(RESAMPLE_METHODS), state="readonly", width=10)
+        resample_combo.grid(row=2, column=1, columnspan=3, sticky=tk.W, padx=5, pady=2)
+        resample_combo.bind('<<ComboboxSelected>>', lambda e: self.notify_change())
+        self.create_tooltip(resample_combo,
+                          "Resampling kernel used to scale the image:\n"
+                          "NEAREST: fastest, blocky; keeps exact pixel values\n"
+                          "BILINEAR / HAMMING / BICUBIC: progressively sharper\n"
+                          "LANCZOS: sharpest downscaling (default)")
         # Tooltips
         self.create_tooltip(width_entry, "Type the desired output width in pixels.")
         self.create_tooltip(height_entry, "Type the desired output height in pixels.")
@@ -274,13 +514,44 @@ class SettingsFrame(ttk.Frame):
         
         # Add tooltips
         self.create_tooltip(color_mode_combo, 
-                          "Color mode for output PNG:\nauto: Automatically choose best mode\nRGB: Full color (24-bit)\nRGBA: Full color with transparency\nP: Palette mode (8-bit)\nL: Grayscale\nLA: Grayscale with transparency")
+                          "Color mode for output PNG:\nauto: Automatically choose best mode\nRGB: Full color (24-bit)\nRGBA: Full color with transparency\nP: Palette mode (8-bit)\nL: Grayscale\nLA: Grayscale with transparency\nI;16: 16-bit grayscale")
         self.create_tooltip(dither_combo,
                           "Dithering method for color reduction:\nauto: Automatically choose best method\nnone: No dithering\nfloyd-steinberg: Error diffusion dithering\nordered: Ordered dithering")
+        self.create_tooltip(tone_combo,
+                          "How 16-bit, 32-bit and float TIFFs are mapped to the output range:\n"
+                          "auto: keep 16-bit data, otherwise stretch the 0.5-99.5 percentiles\n"
+                          "window: map the Window values to black and white\n"
+                          "none: clip like a plain conversion")
+        window_tooltip = ("Input values shown as black and white with 'window' tone mapping.\n"
+                          "Values outside the window are clipped.")
+        self.create_tooltip(window_low_entry, window_tooltip)
+        self.create_tooltip(window_high_entry, window_tooltip)
+        self.create_tooltip(quantize_combo,
+                          "How the 256-color palette for P mode is built:\n"
+                          "median-cut: fast, splits the color space by population\n"
+                          "k-means: refines median cut, slower, usually smoother gradients\n"
+                          "libimagequant: highest quality (only if Pillow was built with it)")
+        self.create_tooltip(shared_palette_check,
+                          "P mode: build one palette from a sample of the batch's files\n"
+                          "and use it for every file. Pages of a multi-page TIFF\n"
+                          "always share one palette.")
         self.create_tooltip(filter_combo,
-                          "PNG filter method:\nauto: Automatically choose best filter\nnone: No filtering\nsub: Subtract left pixel\nup: Subtract above pixel\naverage: Average of left and above\npaeth: Paeth predictor")
+                          "PNG row filter strategy:\n"
+                          "auto: Pillow's choice (adaptive; none for palette images)\n"
+                          "none / sub / up / average / paeth: one filter for every row\n"
+                          "minsum: per row, the filter with the smallest byte sum\n"
+                          "brute-force: per row, the filter that compresses smallest (slow)")
+        self.create_tooltip(preset_combo,
+                          "Compression speed/size trade-off:\n"
+                          "fastest: zlib level 1, RLE strategy\n"
+                          "balanced: zlib level 6, filtered strategy\n"
+                          "smallest: zlib level 9 with optimization (default)\n"
+                          "archival: tries several zlib strategies, keeps the smallest")
         self.create_tooltip(chunk_check,
-                          "Optimize PNG chunk structure:\nRemoves unnecessary chunks\nReorders chunks for better compression\nMay slightly increase processing time")
+                          "Post-process each PNG without changing its pixels:\n"
+                          "Removes metadata chunks and merges the image data chunks\n"
+                          "Tries other row filter strategies and keeps the smallest\n"
+                          "Adds up to 2 seconds per image; very large streamed images are skipped")
         self.create_tooltip(interlace_check,
                           "Create interlaced PNG:\nAllows progressive loading\nSlightly larger file size\nBetter for web use")
 
@@ -288,12 +559,30 @@ class SettingsFrame(ttk.Frame):
         """Reset advanced settings to their default values"""
         self.color_mode_var.set("auto")
         self.dither_var.set("auto")
+        self.tone_mapping_var.set("auto")
+        self.window_low_var.set("")
+        self.window_high_var.set("")
+        self.quantize_method_var.set(DEFAULT_QUANTIZE_METHOD)
+        self.shared_palette_var.set(False)
         self.filter_var.set("auto")
-        self.chunk_optimize_var.set(True)
+        self.resample_var.set(DEFAULT_RESAMPLE_METHOD)
+        self.chunk_optimize_var.set(False)
+        self.compression_preset_var.set("smallest")
         self.interlace_var.set(False)
+        self.workers_var.set(default_worker_count())
+        self.memory_budget_var.set(DEFAULT_MEMORY_BUDGET_MB)
+        self.streaming_threshold_var.set(DEFAULT_STREAMING_THRESHOLD_MP)
         self.manual_width_var.set(0)
         self.manual_height_var.set(0)
 
+    def get_window(self):
+        """Return the manual (low, high) window, or None if it is empty or invalid"""
+        try:
+            window = (float(self.window_low_var.get()), float(self.window_high_var.get()))
+        except ValueError:
+            return None
+        return window if window_is_valid(window) else None
+
     def create_tooltip(self, widget, text):
         """Create a tooltip for a given widget"""
         def show_tooltip(event):
@@ -356,17 +645,61 @@ class SettingsFrame(ttk.Frame):
         desc_label.grid(row=4, column=0, pady=(0, 10), padx=10)
 
 class ConsoleHandler(logging.Handler):
-    """Custom logging handler that writes to a tkinter Text widget"""
-    def __init__(self, text_widget):
+    """Logging handler that shows records in a tkinter Text widget.
+
+    emit() only formats the record and appends it to a bounded queue, so it is
+    cheap and safe to call from any thread. A timer on the Tk thread drains the
+    queue every flush_interval_ms and inserts the pending lines with a single
+    insert. The widget keeps the newest max_lines lines; if more than that
+    arrive between two flushes, only the newest are shown, with a note of how
+    many were skipped.
+    """
+    def __init__(self, text_widget, max_lines=MAX_LOG_LINES, flush_interval_ms=LOG_FLUSH_INTERVAL_MS):
         super().__init__()
         self.text_widget = text_widget
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self.pending = deque(maxlen=max_lines)
+        self.dropped = 0
+        self._flush_id = text_widget.after(flush_interval_ms, self.flush_to_widget)
 
     def emit(self, record):
-        msg = self.format(record)
-        def append():
-            self.text_widget.configure(state='normal')
-            self.text_widget.insert(tk.END, msg + '\n')
-            self.text_widget.see(tk.END)
-            self.text_widget.configure(state='disabled')
-        # Schedule the update on the main thread
-        self.text_widget.after(0, append) 
\ No newline at end of file
+        try:
+            msg = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.pending) == self.max_lines:
+            self.dropped += 1
+        self.pending.append(msg)
+
+    def flush_to_widget(self):
+        """Insert the queued lines and trim the widget to max_lines (runs on the Tk thread)"""
+        lines = []
+        while self.pending:
+            lines.append(self.pending.popleft())
+        if lines:
+            if self.dropped:
+                lines = [f"... {self.dropped} log lines skipped"] + lines[-(self.max_lines - 1):]
+                self.dropped = 0
+            widget = self.text_widget
+            # Follow new lines only if the view is already at the end, so reading older lines is not interrupted
+            follow = widget.yview()[1] >= 1.0
+            widget.configure(state='normal')
+            widget.insert(tk.END, '\n'.join(lines) + '\n')
+            excess = int(widget.index('end-1c').split('.')[0]) - 1 - self.max_lines
+            if excess > 0:
+                widget.delete('1.0', f'{excess + 1}.0')
+            widget.configure(state='disabled')
+            if follow:
+                widget.see(tk.END)
+        self._flush_id = self.text_widget.after(self.flush_interval_ms, self.flush_to_widget)
+
+    def close(self):
+        if self._flush_id:
+            try:
+                self.text_widget.after_cancel(self._flush_id)
+            except tk.TclError:
+                pass
+            self._flush_id = None
+        super().close()